@@ -182,6 +182,21 @@ class InputFilter:
             deflection_response=deflection,
         )
 
+    def deflection_for_categories(self, categories: List[str]) -> str:
+        """
+        Pick a deflection for categories flagged by provider moderation.
+
+        Moderation APIs name categories differently (e.g. "self_harm_intent",
+        "sexual_minors"), so match on prefixes.
+        """
+        if any(cat.startswith("self_harm") for cat in categories):
+            return self.DEFLECTION_RESPONSES["self_harm"]
+        if any(cat.startswith("sexual") for cat in categories):
+            return self.DEFLECTION_RESPONSES["explicit"]
+        if categories:
+            return self.DEFLECTION_RESPONSES["dangerous"]
+        return self.DEFLECTION_RESPONSES["default"]
+
     def contains_concerning_content(self, content: str) -> bool:
         """Quick check if content might be concerning (for flagging)."""
         result = self.filter(content)
@@ -1,14 +1,53 @@
-"""AI Providers for KidsGPT."""
+"""
+AI Providers for KidsGPT.
+
+Provider classes are loaded on first access (PEP 562 module __getattr__):
+`from ai.providers import OpenAIProvider` still works, but importing the
+package does not pull in the openai and anthropic SDKs.
+"""
+
+import importlib
+from typing import TYPE_CHECKING
+
+from ai.providers.base import (
+    AIProvider,
+    ChatMessage,
+    ChatResponse,
+    ModerationResult,
+    StreamDelta,
+    StreamEvent,
+    StreamUsage,
+)
+from ai.providers.router import ProviderRouter
+
+if TYPE_CHECKING:
+    from ai.providers.anthropic_provider import AnthropicProvider
+    from ai.providers.mock_provider import MockProvider
+    from ai.providers.openai_provider import OpenAIProvider
+
+_LAZY_PROVIDERS = {
+    "OpenAIProvider": "ai.providers.openai_provider",
+    "AnthropicProvider": "ai.providers.anthropic_provider",
+    "MockProvider": "ai.providers.mock_provider",
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_PROVIDERS:
+        return getattr(importlib.import_module(_LAZY_PROVIDERS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-from ai.providers.base import AIProvider, ChatMessage, ChatResponse, ModerationResult
-from ai.providers.openai_provider import OpenAIProvider
-from ai.providers.anthropic_provider import AnthropicProvider
 
 __all__ = [
     "AIProvider",
     "ChatMessage",
     "ChatResponse",
     "ModerationResult",
+    "StreamDelta",
+    "StreamEvent",
+    "StreamUsage",
     "OpenAIProvider",
     "AnthropicProvider",
+    "MockProvider",
+    "ProviderRouter",
 ]
@@ -1,9 +1,26 @@
 """Anthropic Claude provider implementation."""
 
-from typing import AsyncGenerator, List, Dict
+from typing import AsyncGenerator, List, Dict, Optional
+
+import httpx
 from anthropic import AsyncAnthropic
 
-from ai.providers.base import AIProvider, ChatMessage, ChatResponse, ModerationResult
+from ai.providers.base import (
+    AIProvider,
+    ChatMessage,
+    ChatResponse,
+    ModerationResult,
+    StreamDelta,
+    StreamEvent,
+    StreamUsage,
+)
+from ai.providers.retry import (
+    RetryPolicy,
+    call_with_retry,
+    default_retry_policy,
+    retry_stream,
+    timeout_kwargs,
+)
 from app.core.config import settings
 
 
@@ -13,7 +30,9 @@ class AnthropicProvider(AIProvider):
     def __init__(
         self,
         api_key: str = None,
-        model: str = None
+        model: str = None,
+        http_client: httpx.AsyncClient = None,
+        retry_policy: RetryPolicy = None,
     ):
         """
         Initialize Anthropic provider.
@@ -21,10 +40,14 @@ class AnthropicProvider(AIProvider):
         Args:
             api_key: Anthropic API key (defaults to settings)
             model: Model to use (defaults to settings)
+            http_client: Custom HTTP client (e.g. a mock transport in tests)
+            retry_policy: Backoff policy (defaults to settings)
         """
         self._api_key = api_key or settings.ANTHROPIC_API_KEY
         self._model = model or settings.ANTHROPIC_MODEL
-        self.client = AsyncAnthropic(api_key=self._api_key)
+        # Retries are ours (deadline-aware), not the SDK's
+        self.client = AsyncAnthropic(api_key=self._api_key, max_retries=0, http_client=http_client)
+        self._retry = retry_policy or default_retry_policy()
 
     @property
     def name(self) -> str:
@@ -60,12 +83,16 @@ class AnthropicProvider(AIProvider):
         """Generate a chat completion response."""
         system, formatted_messages = self.format_messages_for_api(messages, system_prompt)
 
-        response = await self.client.messages.create(
-            model=self._model,
-            system=system,
-            messages=formatted_messages,
-            max_tokens=max_tokens,
-            temperature=temperature,
+        response = await call_with_retry(
+            lambda timeout: self.client.messages.create(
+                model=self._model,
+                system=system,
+                messages=formatted_messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                **timeout_kwargs(timeout),
+            ),
+            self._retry,
         )
 
         content = ""
@@ -77,27 +104,49 @@ class AnthropicProvider(AIProvider):
             model=response.model,
             tokens_used=response.usage.input_tokens + response.usage.output_tokens,
             finish_reason=response.stop_reason or "unknown",
+            input_tokens=response.usage.input_tokens,
+            output_tokens=response.usage.output_tokens,
+            cached_tokens=response.usage.cache_read_input_tokens or 0,
         )
 
-    async def chat_stream(
+    async def chat_stream_events(
         self,
         messages: List[ChatMessage],
         system_prompt: str,
         max_tokens: int = 500,
         temperature: float = 0.7,
-    ) -> AsyncGenerator[str, None]:
-        """Generate a streaming chat completion response."""
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """Generate a streaming chat completion, ending with its usage."""
         system, formatted_messages = self.format_messages_for_api(messages, system_prompt)
 
-        async with self.client.messages.stream(
-            model=self._model,
-            system=system,
-            messages=formatted_messages,
-            max_tokens=max_tokens,
-            temperature=temperature,
-        ) as stream:
-            async for text in stream.text_stream:
-                yield text
+        async def open_stream(timeout: Optional[float]) -> AsyncGenerator[StreamEvent, None]:
+            stream = await self.client.messages.create(
+                model=self._model,
+                system=system,
+                messages=formatted_messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+                **timeout_kwargs(timeout),
+            )
+            usage = StreamUsage(model=self._model)
+            async with stream:
+                async for event in stream:
+                    if event.type == "content_block_delta" and event.delta.type == "text_delta":
+                        yield StreamDelta(event.delta.text)
+                    elif event.type == "message_start":
+                        # Input usage comes first, output usage with message_delta at the end
+                        usage.model = event.message.model
+                        usage.input_tokens = event.message.usage.input_tokens
+                        usage.cached_tokens = event.message.usage.cache_read_input_tokens or 0
+                    elif event.type == "message_delta":
+                        usage.output_tokens = event.usage.output_tokens
+                        if event.delta.stop_reason:
+                            usage.finish_reason = event.delta.stop_reason
+            yield usage
+
+        async for event in retry_stream(open_stream, self._retry):
+            yield event
 
     async def moderate(self, text: str) -> ModerationResult:
         """
@@ -1,8 +1,8 @@
 """Abstract base class for AI providers - enables model switching."""
 
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import AsyncGenerator, List, Dict, Optional
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, List, Dict, Optional, Union
 
 
 @dataclass
@@ -21,6 +21,15 @@ class ModerationResult:
     flagged_categories: List[str]  # List of categories that were flagged
 
 
+class ProviderUnavailableError(Exception):
+    """Raised when a provider refuses a call without contacting the upstream."""
+
+    def __init__(self, provider: str, reason: str):
+        self.provider = provider
+        self.reason = reason
+        super().__init__(f"Provider {provider} unavailable: {reason}")
+
+
 @dataclass
 class ChatResponse:
     """Response from AI chat completion."""
@@ -28,6 +37,34 @@ class ChatResponse:
     model: str
     tokens_used: int
     finish_reason: str
+    input_tokens: int = 0  # Prompt side of tokens_used, when the provider reports it
+    output_tokens: int = 0  # Completion side of tokens_used
+    cached_tokens: int = 0  # Input tokens served from the provider's prompt cache
+    flags: List[str] = field(default_factory=list)  # Safety filter hits as "stage:category" (set by AIService)
+
+
+@dataclass
+class StreamDelta:
+    """A piece of streamed answer text."""
+    text: str
+
+
+@dataclass
+class StreamUsage:
+    """Final event of a stream: who answered, what it cost and why it stopped."""
+    model: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0  # Input tokens served from the provider's prompt cache
+    finish_reason: str = "unknown"
+    flags: List[str] = field(default_factory=list)  # Safety filter hits as "stage:category" (set by AIService)
+
+    @property
+    def tokens_used(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+
+StreamEvent = Union[StreamDelta, StreamUsage]
 
 
 class AIProvider(ABC):
@@ -68,13 +105,13 @@ class AIProvider(ABC):
         pass
 
     @abstractmethod
-    async def chat_stream(
+    async def chat_stream_events(
         self,
         messages: List[ChatMessage],
         system_prompt: str,
         max_tokens: int = 500,
         temperature: float = 0.7,
-    ) -> AsyncGenerator[str, None]:
+    ) -> AsyncGenerator[StreamEvent, None]:
         """
         Generate a streaming chat completion response.
 
@@ -85,10 +122,26 @@ class AIProvider(ABC):
             temperature: Creativity/randomness (0-1)
 
         Yields:
-            String chunks of the response as they arrive
+            StreamDelta events as text arrives, then one StreamUsage
         """
         pass
 
+    async def chat_stream(
+        self,
+        messages: List[ChatMessage],
+        system_prompt: str,
+        max_tokens: int = 500,
+        temperature: float = 0.7,
+    ) -> AsyncGenerator[str, None]:
+        """Text-only view of chat_stream_events, for consumers that don't need usage."""
+        async for text in text_deltas(self.chat_stream_events(
+            messages=messages,
+            system_prompt=system_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )):
+            yield text
+
     @abstractmethod
     async def moderate(self, text: str) -> ModerationResult:
         """
@@ -115,3 +168,13 @@ class AIProvider(ABC):
         for msg in messages:
             formatted.append({"role": msg.role, "content": msg.content})
         return formatted
+
+
+async def text_deltas(events: AsyncGenerator[StreamEvent, None]) -> AsyncGenerator[str, None]:
+    """Adapt a stream of events to the plain text chunks."""
+    try:
+        async for event in events:
+            if isinstance(event, StreamDelta):
+                yield event.text
+    finally:
+        await events.aclose()
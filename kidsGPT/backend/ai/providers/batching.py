@@ -0,0 +1,92 @@
+"""Async micro-batching - coalesce concurrent calls into one batched call."""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Generic, List, Optional, Set, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Gathers items submitted by concurrent callers into batches.
+
+    A batch is sent when it reaches max_batch_size or max_wait seconds
+    after its first item, whichever comes first. The handler gets the
+    items in order and must return one result per item; each caller gets
+    its own result back (or the handler's exception).
+
+    Usage:
+        batcher = MicroBatcher(moderate_many, max_batch_size=32, max_wait=0.005)
+        result = await batcher.submit(text)
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[T]], Awaitable[List[R]]],
+        max_batch_size: int = 32,
+        max_wait: float = 0.005,
+    ):
+        self._handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._in_flight: Set[asyncio.Task] = set()
+        self.batches_sent = 0
+
+    def submit_nowait(self, item: T) -> asyncio.Future:
+        """Queue an item and return a future for its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._send()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._send)
+        return future
+
+    async def submit(self, item: T) -> R:
+        """Queue an item and wait for its result."""
+        return await self.submit_nowait(item)
+
+    def _send(self) -> None:
+        """Hand the pending items to the handler as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._run(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        """Call the handler and fan results out to the waiting callers."""
+        self.batches_sent += 1
+        try:
+            results = await self._handler([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Batch handler returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            logger.warning(f"Batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def flush(self) -> None:
+        """Send anything pending now and wait for all in-flight batches."""
+        self._send()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
@@ -1,9 +1,22 @@
 """Mock AI Provider for MVP testing without external API dependencies."""
 
+import asyncio
+import math
 import random
-from typing import AsyncGenerator, List
+from dataclasses import dataclass
+from typing import AsyncGenerator, List, Optional
 
-from ai.providers.base import AIProvider, ChatMessage, ChatResponse, ModerationResult
+from ai.providers.base import (
+    AIProvider,
+    ChatMessage,
+    ChatResponse,
+    ModerationResult,
+    StreamDelta,
+    StreamEvent,
+    StreamUsage,
+)
+from ai.providers.retry import RetryPolicy, call_with_retry, default_retry_policy, retry_stream
+from app.core.config import settings
 
 
 # Pre-defined fun facts and responses for MVP testing
@@ -51,11 +64,73 @@ GREETING_RESPONSES = [
 ]
 
 
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English)."""
+    return max(1, round(len(text) / 4))
+
+
+class MockProviderError(Exception):
+    """Simulated upstream error, shaped like the SDK errors (status code, retry-after)."""
+
+    def __init__(self, status_code: int, message: str, retry_after: Optional[float] = None):
+        self.status_code = status_code
+        self.retry_after = retry_after
+        super().__init__(f"{status_code}: {message}")
+
+
+@dataclass
+class MockSimulation:
+    """Latency and failure profile for a simulated upstream."""
+    enabled: bool = False
+    ttft_ms: float = 400.0  # Median time to first token
+    ttft_sigma: float = 0.5  # Lognormal spread (0 = fixed)
+    tokens_per_second: float = 60.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after_seconds: float = 1.0
+    timeout_rate: float = 0.0
+    timeout_seconds: float = 30.0
+    seed: Optional[int] = None
+
+    @classmethod
+    def from_settings(cls) -> "MockSimulation":
+        """Simulation profile from MOCK_* settings."""
+        return cls(
+            enabled=settings.MOCK_SIMULATE,
+            ttft_ms=settings.MOCK_TTFT_MS,
+            ttft_sigma=settings.MOCK_TTFT_SIGMA,
+            tokens_per_second=settings.MOCK_TOKENS_PER_SECOND,
+            error_rate=settings.MOCK_ERROR_RATE,
+            rate_limit_rate=settings.MOCK_RATE_LIMIT_RATE,
+            retry_after_seconds=settings.MOCK_RETRY_AFTER_SECONDS,
+            timeout_rate=settings.MOCK_TIMEOUT_RATE,
+            timeout_seconds=settings.MOCK_TIMEOUT_SECONDS,
+            seed=settings.MOCK_SEED,
+        )
+
+
 class MockProvider(AIProvider):
     """Mock AI provider for MVP testing - returns pre-defined friendly responses."""
 
-    def __init__(self):
-        self._model = "mock-sparky-v1"
+    def __init__(
+        self,
+        model: str = None,
+        simulation: MockSimulation = None,
+        retry_policy: RetryPolicy = None,
+    ):
+        """
+        Initialize mock provider.
+
+        Args:
+            model: Model name to report (defaults to mock-sparky-v1)
+            simulation: Latency/failure profile (defaults to settings; off unless MOCK_SIMULATE)
+            retry_policy: Backoff policy for simulated failures (defaults to settings)
+        """
+        self._model = model or "mock-sparky-v1"
+        self.simulation = simulation or MockSimulation.from_settings()
+        self._retry = retry_policy or default_retry_policy()
+        # One seeded generator drives both the response picks and the simulation
+        self._rng = random.Random(self.simulation.seed)
 
     @property
     def name(self) -> str:
@@ -68,33 +143,33 @@ class MockProvider(AIProvider):
     def _generate_response(self, messages: List[ChatMessage]) -> str:
         """Generate a context-aware mock response."""
         if not messages:
-            return random.choice(GREETING_RESPONSES)
+            return self._rng.choice(GREETING_RESPONSES)
 
         last_message = messages[-1].content.lower()
 
         # Check for greetings
         if any(word in last_message for word in ["hi", "hello", "hey", "howdy"]):
-            return random.choice(GREETING_RESPONSES)
+            return self._rng.choice(GREETING_RESPONSES)
 
         # Check for fun facts
         if "fun fact" in last_message or "tell me something" in last_message:
-            return f"{random.choice(FUN_FACTS)} What else would you like to know?"
+            return f"{self._rng.choice(FUN_FACTS)} What else would you like to know?"
 
         # Check for dinosaurs
         if "dinosaur" in last_message or "dino" in last_message:
-            return f"{random.choice(DINOSAUR_FACTS)} Dinosaurs are so cool, right? What else do you want to know about them?"
+            return f"{self._rng.choice(DINOSAUR_FACTS)} Dinosaurs are so cool, right? What else do you want to know about them?"
 
         # Check for space
         if any(word in last_message for word in ["space", "star", "planet", "moon", "sun", "rocket", "astronaut"]):
-            return f"{random.choice(SPACE_FACTS)} Space is amazing! What else would you like to explore?"
+            return f"{self._rng.choice(SPACE_FACTS)} Space is amazing! What else would you like to explore?"
 
         # Check for math
         if any(word in last_message for word in ["math", "number", "add", "subtract", "count", "calculate"]):
-            return random.choice(MATH_RESPONSES)
+            return self._rng.choice(MATH_RESPONSES)
 
         # Check for story
         if "story" in last_message or "tell me a" in last_message:
-            return f"{random.choice(STORY_STARTERS)} Would you like me to continue this story?"
+            return f"{self._rng.choice(STORY_STARTERS)} Would you like me to continue this story?"
 
         # Check for questions about Sheldon
         if "who are you" in last_message or "your name" in last_message:
@@ -102,11 +177,51 @@ class MockProvider(AIProvider):
 
         # Default curious response
         responses = [
-            f"That's a really interesting question! Let me think... {random.choice(FUN_FACTS)} What do you think about that?",
-            f"Ooh, I love when you ask things like that! Here's something cool to think about: {random.choice(FUN_FACTS)} Want to know more?",
-            f"Great question! You know what's fun? {random.choice(FUN_FACTS)} Is there anything else you're curious about?",
+            f"That's a really interesting question! Let me think... {self._rng.choice(FUN_FACTS)} What do you think about that?",
+            f"Ooh, I love when you ask things like that! Here's something cool to think about: {self._rng.choice(FUN_FACTS)} Want to know more?",
+            f"Great question! You know what's fun? {self._rng.choice(FUN_FACTS)} Is there anything else you're curious about?",
         ]
-        return random.choice(responses)
+        return self._rng.choice(responses)
+
+    def _time_to_first_token(self) -> float:
+        """Sample a time to first token, in seconds."""
+        sim = self.simulation
+        if sim.ttft_ms <= 0:
+            return 0.0
+        if sim.ttft_sigma <= 0:
+            return sim.ttft_ms / 1000
+        return self._rng.lognormvariate(math.log(sim.ttft_ms / 1000), sim.ttft_sigma)
+
+    async def _simulate_upstream(self, timeout: Optional[float]) -> None:
+        """Wait out the time to first token, or fail like a real upstream would."""
+        sim = self.simulation
+        if not sim.enabled:
+            return
+
+        roll = self._rng.random()
+        if roll < sim.timeout_rate:
+            hang = sim.timeout_seconds if timeout is None else min(timeout, sim.timeout_seconds)
+            await asyncio.sleep(hang)
+            raise asyncio.TimeoutError("Simulated upstream timeout")
+        roll -= sim.timeout_rate
+
+        await asyncio.sleep(self._time_to_first_token())
+        if roll < sim.rate_limit_rate:
+            raise MockProviderError(429, "Simulated rate limit", retry_after=sim.retry_after_seconds)
+        roll -= sim.rate_limit_rate
+        if roll < sim.error_rate:
+            raise MockProviderError(500, "Simulated server error")
+
+    def _token_delay(self, tokens: int) -> float:
+        """Time to generate `tokens` output tokens, in seconds."""
+        if not self.simulation.enabled or self.simulation.tokens_per_second <= 0:
+            return 0.0
+        return tokens / self.simulation.tokens_per_second
+
+    @staticmethod
+    def _prompt_tokens(messages: List[ChatMessage], system_prompt: str) -> int:
+        """Estimated prompt size, including per-message overhead."""
+        return estimate_tokens(system_prompt) + sum(estimate_tokens(msg.content) + 4 for msg in messages)
 
     async def chat(
         self,
@@ -116,30 +231,54 @@ class MockProvider(AIProvider):
         temperature: float = 0.7,
     ) -> ChatResponse:
         """Generate a mock chat completion response."""
-        response = self._generate_response(messages)
-        return ChatResponse(
-            content=response,
-            model=self._model,
-            tokens_used=len(response.split()),
-            finish_reason="stop",
-        )
+        async def attempt(timeout: Optional[float]) -> ChatResponse:
+            await self._simulate_upstream(timeout)
+            response = self._generate_response(messages)
+            prompt_tokens = self._prompt_tokens(messages, system_prompt)
+            completion_tokens = estimate_tokens(response)
+            await asyncio.sleep(self._token_delay(completion_tokens))
+            return ChatResponse(
+                content=response,
+                model=self._model,
+                tokens_used=prompt_tokens + completion_tokens,
+                finish_reason="stop",
+                input_tokens=prompt_tokens,
+                output_tokens=completion_tokens,
+            )
 
-    async def chat_stream(
+        return await call_with_retry(attempt, self._retry)
+
+    async def chat_stream_events(
         self,
         messages: List[ChatMessage],
         system_prompt: str,
         max_tokens: int = 500,
         temperature: float = 0.7,
-    ) -> AsyncGenerator[str, None]:
-        """Generate a streaming mock response."""
-        response = self._generate_response(messages)
-        # Stream word by word for realistic effect
-        words = response.split()
-        for i, word in enumerate(words):
-            yield word + (" " if i < len(words) - 1 else "")
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """Generate a streaming mock response, ending with estimated usage."""
+        async def open_stream(timeout: Optional[float]) -> AsyncGenerator[StreamEvent, None]:
+            await self._simulate_upstream(timeout)
+            response = self._generate_response(messages)
+            # Stream word by word for realistic effect
+            words = response.split()
+            for i, word in enumerate(words):
+                chunk = word + (" " if i < len(words) - 1 else "")
+                if i:
+                    await asyncio.sleep(self._token_delay(estimate_tokens(chunk)))
+                yield StreamDelta(chunk)
+            yield StreamUsage(
+                model=self._model,
+                input_tokens=self._prompt_tokens(messages, system_prompt),
+                output_tokens=estimate_tokens(response),
+                finish_reason="stop",
+            )
+
+        async for event in retry_stream(open_stream, self._retry):
+            yield event
 
     async def moderate(self, text: str) -> ModerationResult:
         """Mock moderation - always returns safe."""
+        await call_with_retry(self._simulate_upstream, self._retry)
         return ModerationResult(
             is_safe=True,
             categories={},
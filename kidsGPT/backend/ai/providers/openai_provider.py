@@ -1,19 +1,45 @@
 """OpenAI provider implementation."""
 
-from typing import AsyncGenerator, List, Dict
+from typing import AsyncGenerator, List, Dict, Optional
+
+import httpx
 from openai import AsyncOpenAI
 
-from ai.providers.base import AIProvider, ChatMessage, ChatResponse, ModerationResult
+from ai.providers.base import (
+    AIProvider,
+    ChatMessage,
+    ChatResponse,
+    ModerationResult,
+    StreamDelta,
+    StreamEvent,
+    StreamUsage,
+)
+from ai.providers.batching import MicroBatcher
+from ai.providers.retry import (
+    RetryPolicy,
+    call_with_retry,
+    default_retry_policy,
+    retry_stream,
+    timeout_kwargs,
+)
 from app.core.config import settings
 
 
+def _cached_tokens(usage) -> int:
+    """Prompt tokens served from OpenAI's prompt cache (0 when not reported)."""
+    details = getattr(usage, "prompt_tokens_details", None) if usage else None
+    return (details.cached_tokens or 0) if details else 0
+
+
 class OpenAIProvider(AIProvider):
     """OpenAI GPT provider implementation."""
 
     def __init__(
         self,
         api_key: str = None,
-        model: str = None
+        model: str = None,
+        http_client: httpx.AsyncClient = None,
+        retry_policy: RetryPolicy = None,
     ):
         """
         Initialize OpenAI provider.
@@ -21,10 +47,20 @@ class OpenAIProvider(AIProvider):
         Args:
             api_key: OpenAI API key (defaults to settings)
             model: Model to use (defaults to settings)
+            http_client: Custom HTTP client (e.g. a mock transport in tests)
+            retry_policy: Backoff policy (defaults to settings)
         """
         self._api_key = api_key or settings.OPENAI_API_KEY
         self._model = model or settings.OPENAI_MODEL
-        self.client = AsyncOpenAI(api_key=self._api_key)
+        # Retries are ours (deadline-aware), not the SDK's
+        self.client = AsyncOpenAI(api_key=self._api_key, max_retries=0, http_client=http_client)
+        self._retry = retry_policy or default_retry_policy()
+        # Concurrent moderation calls share one request (the endpoint takes a list)
+        self._moderation_batcher = MicroBatcher(
+            self._moderate_batch,
+            max_batch_size=settings.MODERATION_BATCH_MAX_SIZE,
+            max_wait=settings.MODERATION_BATCH_WINDOW_MS / 1000,
+        )
 
     @property
     def name(self) -> str:
@@ -44,11 +80,15 @@ class OpenAIProvider(AIProvider):
         """Generate a chat completion response."""
         formatted_messages = self.format_messages_for_api(messages, system_prompt)
 
-        response = await self.client.chat.completions.create(
-            model=self._model,
-            messages=formatted_messages,
-            max_tokens=max_tokens,
-            temperature=temperature,
+        response = await call_with_retry(
+            lambda timeout: self.client.chat.completions.create(
+                model=self._model,
+                messages=formatted_messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                **timeout_kwargs(timeout),
+            ),
+            self._retry,
         )
 
         choice = response.choices[0]
@@ -57,35 +97,67 @@ class OpenAIProvider(AIProvider):
             model=response.model,
             tokens_used=response.usage.total_tokens if response.usage else 0,
             finish_reason=choice.finish_reason or "unknown",
+            input_tokens=response.usage.prompt_tokens if response.usage else 0,
+            output_tokens=response.usage.completion_tokens if response.usage else 0,
+            cached_tokens=_cached_tokens(response.usage),
         )
 
-    async def chat_stream(
+    async def chat_stream_events(
         self,
         messages: List[ChatMessage],
         system_prompt: str,
         max_tokens: int = 500,
         temperature: float = 0.7,
-    ) -> AsyncGenerator[str, None]:
-        """Generate a streaming chat completion response."""
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """Generate a streaming chat completion, ending with its usage."""
         formatted_messages = self.format_messages_for_api(messages, system_prompt)
 
-        stream = await self.client.chat.completions.create(
-            model=self._model,
-            messages=formatted_messages,
-            max_tokens=max_tokens,
-            temperature=temperature,
-            stream=True,
-        )
-
-        async for chunk in stream:
-            if chunk.choices and chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
+        async def open_stream(timeout: Optional[float]) -> AsyncGenerator[StreamEvent, None]:
+            stream = await self.client.chat.completions.create(
+                model=self._model,
+                messages=formatted_messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+                # Usage arrives in one extra chunk (with no choices) at the end
+                stream_options={"include_usage": True},
+                **timeout_kwargs(timeout),
+            )
+            usage = StreamUsage(model=self._model)
+            async with stream:
+                async for chunk in stream:
+                    if chunk.model:
+                        usage.model = chunk.model
+                    if chunk.choices:
+                        choice = chunk.choices[0]
+                        if choice.delta.content:
+                            yield StreamDelta(choice.delta.content)
+                        if choice.finish_reason:
+                            usage.finish_reason = choice.finish_reason
+                    if chunk.usage:
+                        usage.input_tokens = chunk.usage.prompt_tokens
+                        usage.output_tokens = chunk.usage.completion_tokens
+                        usage.cached_tokens = _cached_tokens(chunk.usage)
+            yield usage
+
+        async for event in retry_stream(open_stream, self._retry):
+            yield event
 
     async def moderate(self, text: str) -> ModerationResult:
-        """Check content using OpenAI's moderation API."""
-        response = await self.client.moderations.create(input=text)
+        """Check content using OpenAI's moderation API (micro-batched)."""
+        return await self._moderation_batcher.submit(text)
+
+    async def _moderate_batch(self, texts: List[str]) -> List[ModerationResult]:
+        """Moderate several texts in one API call."""
+        response = await call_with_retry(
+            lambda timeout: self.client.moderations.create(input=texts, **timeout_kwargs(timeout)),
+            self._retry,
+        )
+        return [self._to_moderation_result(result) for result in response.results]
 
-        result = response.results[0]
+    @staticmethod
+    def _to_moderation_result(result) -> ModerationResult:
+        """Convert one API moderation result."""
         categories = {
             "harassment": result.categories.harassment,
             "harassment_threatening": result.categories.harassment_threatening,
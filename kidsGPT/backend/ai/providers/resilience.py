@@ -0,0 +1,298 @@
+"""Circuit breaker and adaptive concurrency limit around AI providers."""
+
+import logging
+import time
+from enum import Enum
+from typing import AsyncGenerator, Callable, Dict, List
+
+from ai.providers.base import (
+    AIProvider,
+    ChatMessage,
+    ChatResponse,
+    ModerationResult,
+    ProviderUnavailableError,
+    StreamEvent,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    Check if an error says the upstream is unhealthy.
+
+    Client errors (bad request, auth) are our fault, not the provider's,
+    so they don't count - except timeouts and rate limits.
+    """
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int) and 400 <= status_code < 500:
+        return status_code in (408, 429)
+    return True
+
+
+class CircuitState(str, Enum):
+    """Circuit breaker states."""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Classic three-state circuit breaker.
+
+    CLOSED: calls flow; consecutive failures are counted.
+    OPEN: calls are refused until the recovery timeout passes.
+    HALF_OPEN: a few trial calls go through; success closes, failure re-opens.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_calls = 0
+
+    @property
+    def state(self) -> CircuitState:
+        """Current state, moving OPEN to HALF_OPEN once the timeout passes."""
+        if (
+            self._state == CircuitState.OPEN
+            and self._clock() - self._opened_at >= self.recovery_timeout
+        ):
+            self._state = CircuitState.HALF_OPEN
+            self._trial_calls = 0
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Check if a call may go through, reserving a trial slot if half-open."""
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return True
+        if state == CircuitState.HALF_OPEN and self._trial_calls < self.half_open_max_calls:
+            self._trial_calls += 1
+            return True
+        return False
+
+    def record_success(self) -> None:
+        """Record a successful call."""
+        self._failures = 0
+        if self._state != CircuitState.CLOSED:
+            logger.info("Circuit closed")
+        self._state = CircuitState.CLOSED
+
+    def record_failure(self) -> None:
+        """Record a failed call, opening the circuit if needed."""
+        self._failures += 1
+        if self._state == CircuitState.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != CircuitState.OPEN:
+                logger.warning(f"Circuit opened after {self._failures} failures")
+            self._state = CircuitState.OPEN
+            self._opened_at = self._clock()
+
+    def release_trial(self) -> None:
+        """Give back a half-open trial slot for a call that never finished."""
+        if self._state == CircuitState.HALF_OPEN and self._trial_calls > 0:
+            self._trial_calls -= 1
+
+    def snapshot(self) -> Dict:
+        """Breaker state for monitoring."""
+        return {
+            "state": self.state.value,
+            "consecutive_failures": self._failures,
+        }
+
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limit - additive increase, multiplicative decrease.
+
+    Each good call grows the limit by roughly one per limit's worth of
+    calls; a failure or an over-threshold latency cuts it by backoff_ratio.
+    Calls over the limit are refused at once instead of queueing.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 20,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        backoff_ratio: float = 0.5,
+        latency_threshold: float = 0.0,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_threshold = latency_threshold
+        self._limit = float(initial_limit)
+        self.in_flight = 0
+
+    @property
+    def limit(self) -> int:
+        """Current concurrency limit."""
+        return int(self._limit)
+
+    def try_acquire(self) -> bool:
+        """Take a slot if one is free."""
+        if self.in_flight >= self.limit:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, success: bool = True, latency: float = 0.0) -> None:
+        """Return a slot and adjust the limit from the call's outcome."""
+        self.in_flight = max(0, self.in_flight - 1)
+        slow = self.latency_threshold and latency > self.latency_threshold
+        if not success or slow:
+            self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+        else:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+    def release_neutral(self) -> None:
+        """Return a slot without judging the call (e.g. it was cancelled)."""
+        self.in_flight = max(0, self.in_flight - 1)
+
+    def snapshot(self) -> Dict:
+        """Limiter state for monitoring."""
+        return {"limit": self.limit, "in_flight": self.in_flight}
+
+
+class GuardedProvider(AIProvider):
+    """
+    Wraps a provider with a circuit breaker and an AIMD concurrency limit.
+
+    Calls refused by either raise ProviderUnavailableError immediately,
+    so a sick upstream costs nothing instead of a full SDK timeout.
+    """
+
+    def __init__(
+        self,
+        provider: AIProvider,
+        breaker: CircuitBreaker = None,
+        limiter: AIMDLimiter = None,
+    ):
+        self._inner = provider
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter or AIMDLimiter()
+
+    @property
+    def name(self) -> str:
+        return self._inner.name
+
+    @property
+    def model(self) -> str:
+        return self._inner.model
+
+    @property
+    def inner(self) -> AIProvider:
+        """The wrapped provider."""
+        return self._inner
+
+    def _admit(self) -> None:
+        """Reserve a breaker trial and a concurrency slot, or fail fast."""
+        if not self.breaker.allow_request():
+            raise ProviderUnavailableError(self.name, "circuit open")
+        if not self.limiter.try_acquire():
+            self.breaker.release_trial()
+            raise ProviderUnavailableError(self.name, "concurrency limit reached")
+
+    def _finish(self, error: BaseException = None, latency: float = 0.0) -> None:
+        """Report a finished call to the breaker and limiter."""
+        if error is None:
+            self.breaker.record_success()
+            self.limiter.release(success=True, latency=latency)
+        elif is_upstream_failure(error):
+            self.breaker.record_failure()
+            self.limiter.release(success=False)
+        else:
+            self.breaker.release_trial()
+            self.limiter.release_neutral()
+
+    async def _guard(self, call):
+        """Run one guarded call."""
+        self._admit()
+        started = time.monotonic()
+        finished = False
+        try:
+            result = await call()
+        except Exception as e:
+            finished = True
+            self._finish(e)
+            raise
+        else:
+            finished = True
+            self._finish(latency=time.monotonic() - started)
+            return result
+        finally:
+            if not finished:
+                # Cancelled - say nothing about the upstream's health
+                self.breaker.release_trial()
+                self.limiter.release_neutral()
+
+    async def chat(
+        self,
+        messages: List[ChatMessage],
+        system_prompt: str,
+        max_tokens: int = 500,
+        temperature: float = 0.7,
+    ) -> ChatResponse:
+        """Generate a chat completion through the guard."""
+        return await self._guard(lambda: self._inner.chat(
+            messages=messages,
+            system_prompt=system_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        ))
+
+    async def chat_stream_events(
+        self,
+        messages: List[ChatMessage],
+        system_prompt: str,
+        max_tokens: int = 500,
+        temperature: float = 0.7,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """Stream a chat completion, holding a slot until the stream ends."""
+        self._admit()
+        finished = False
+        try:
+            async for event in self._inner.chat_stream_events(
+                messages=messages,
+                system_prompt=system_prompt,
+                max_tokens=max_tokens,
+                temperature=temperature,
+            ):
+                yield event
+        except Exception as e:
+            finished = True
+            self._finish(e)
+            raise
+        else:
+            # Stream length depends on the answer, so its duration isn't judged
+            finished = True
+            self._finish()
+        finally:
+            if not finished:
+                self.breaker.release_trial()
+                self.limiter.release_neutral()
+
+    async def moderate(self, text: str) -> ModerationResult:
+        """Check content through the guard."""
+        return await self._guard(lambda: self._inner.moderate(text))
+
+    def health(self) -> Dict:
+        """Breaker and limiter state for monitoring."""
+        return {
+            "provider": self.name,
+            "model": self.model,
+            **self.breaker.snapshot(),
+            **self.limiter.snapshot(),
+        }
@@ -0,0 +1,256 @@
+"""Deadline-aware retries with jittered exponential backoff for AI providers."""
+
+import asyncio
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, Iterator, Optional, TypeVar
+
+import httpx
+
+from app.core.config import settings
+from app.core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a request's time budget runs out before it can be served."""
+    pass
+
+
+class Deadline:
+    """Absolute point in time by which a request must finish."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left in the budget (never negative)."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("ai_request_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Get the deadline of the request being served, if any."""
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[Deadline]:
+    """
+    Set the request deadline for calls made inside the block.
+
+    A tighter deadline that is already set wins. Tasks created inside the
+    block (e.g. hedge requests) inherit it through the context.
+    """
+    deadline = Deadline(seconds)
+    existing = _current_deadline.get()
+    if existing is not None and existing.expires_at < deadline.expires_at:
+        deadline = existing
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+async def iterate_with_deadline(
+    stream: AsyncIterator[T],
+    deadline: Deadline,
+) -> AsyncGenerator[T, None]:
+    """
+    Iterate a stream with the deadline set around each step.
+
+    Generators run in their consumer's context, so the deadline is set
+    per step rather than held across yields.
+    """
+    try:
+        while True:
+            token = _current_deadline.set(deadline)
+            try:
+                item = await stream.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                _current_deadline.reset(token)
+            yield item
+    finally:
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter."""
+    max_attempts: int = 3
+    base_delay: float = 0.25  # seconds
+    max_delay: float = 8.0  # seconds
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number `attempt` (0-based): uniform in [0, cap]."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+def default_retry_policy() -> RetryPolicy:
+    """Retry policy from settings."""
+    return RetryPolicy(
+        max_attempts=settings.AI_RETRY_MAX_ATTEMPTS,
+        base_delay=settings.AI_RETRY_BASE_DELAY_MS / 1000,
+        max_delay=settings.AI_RETRY_MAX_DELAY_MS / 1000,
+    )
+
+
+def timeout_kwargs(timeout: Optional[float]) -> dict:
+    """SDK keyword arguments for an attempt timeout (SDK default when None)."""
+    return {} if timeout is None else {"timeout": timeout}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Check if an error is transient: timeouts, connection drops, 408/409/429/5xx."""
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code in (408, 409, 429) or status_code >= 500
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    # SDK connection errors (openai/anthropic) don't carry a status code
+    return any(cls.__name__ in ("APIConnectionError", "APITimeoutError") for cls in type(error).__mro__)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Get the server's requested wait from an error, in seconds."""
+    explicit = getattr(error, "retry_after", None)
+    if explicit is not None:
+        return float(explicit)
+
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def _next_delay(
+    error: BaseException,
+    attempt: int,
+    policy: RetryPolicy,
+    deadline: Optional[Deadline],
+) -> Optional[float]:
+    """Delay before the next attempt, or None if the call shouldn't be retried."""
+    if attempt + 1 >= policy.max_attempts or not is_retryable(error):
+        return None
+    delay = retry_after(error)
+    if delay is None:
+        delay = policy.backoff(attempt)
+    if deadline is not None and delay >= deadline.remaining():
+        # Waiting would blow the budget - give up now instead of at the deadline
+        return None
+    return delay
+
+
+def _attempt_timeout(deadline: Optional[Deadline]) -> Optional[float]:
+    """Timeout for one attempt, raising if the budget is already spent."""
+    if deadline is None:
+        return None
+    if deadline.expired:
+        raise DeadlineExceededError("Request deadline exceeded")
+    return deadline.remaining()
+
+
+async def call_with_retry(
+    call: Callable[[Optional[float]], Awaitable[T]],
+    policy: RetryPolicy,
+    deadline: Optional[Deadline] = None,
+) -> T:
+    """
+    Run a call, retrying transient failures within the request deadline.
+
+    Args:
+        call: Makes one attempt; receives the attempt timeout in seconds (or None)
+        policy: Backoff policy
+        deadline: Time budget (defaults to the current request deadline)
+
+    Returns:
+        The first successful result
+    """
+    deadline = deadline or current_deadline()
+    attempt = 0
+    while True:
+        timeout = _attempt_timeout(deadline)
+        try:
+            with span("provider.attempt", attempt=attempt):
+                return await call(timeout)
+        except Exception as e:
+            delay = _next_delay(e, attempt, policy, deadline)
+            if delay is None:
+                raise
+            logger.info(f"Retrying after {type(e).__name__} in {delay:.2f}s (attempt {attempt + 1})")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+async def retry_stream(
+    open_stream: Callable[[Optional[float]], AsyncIterator[T]],
+    policy: RetryPolicy,
+    deadline: Optional[Deadline] = None,
+) -> AsyncGenerator[T, None]:
+    """
+    Stream with retries - but only until the first item is yielded.
+
+    Once output has reached the consumer a retry would duplicate it, so
+    later failures are raised as-is.
+    """
+    deadline = deadline or current_deadline()
+    attempt = 0
+    while True:
+        timeout = _attempt_timeout(deadline)
+        started = False
+        stream = open_stream(timeout)
+        try:
+            async for item in stream:
+                started = True
+                yield item
+            return
+        except Exception as e:
+            delay = None if started else _next_delay(e, attempt, policy, deadline)
+            if delay is None:
+                raise
+            logger.info(f"Retrying stream after {type(e).__name__} in {delay:.2f}s (attempt {attempt + 1})")
+        finally:
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        await asyncio.sleep(delay)
+        attempt += 1
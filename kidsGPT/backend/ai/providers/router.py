@@ -0,0 +1,264 @@
+"""Provider router - hedged requests and failover across AI providers."""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import AsyncGenerator, Deque, Dict, List, Optional
+
+from ai.providers.base import AIProvider, ChatMessage, ChatResponse, ModerationResult, StreamEvent
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies for one provider."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._min_samples = min_samples
+
+    def record(self, seconds: float) -> None:
+        """Record a call latency in seconds."""
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """
+        Get the latency at the given percentile (0-100).
+
+        Returns None until enough samples have been collected.
+        """
+        if len(self._samples) < self._min_samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+        return ordered[index]
+
+
+class ProviderRouter(AIProvider):
+    """
+    Routes calls across an ordered list of providers.
+
+    The first provider is the primary. If it has not answered once its
+    latency percentile is exceeded, a hedge request goes to the next
+    provider; the first good answer wins and the loser is cancelled.
+    Errors fail over to the next provider in line.
+
+    Usage:
+        router = ProviderRouter([OpenAIProvider(), AnthropicProvider()])
+        response = await router.chat(messages, system_prompt)
+    """
+
+    def __init__(
+        self,
+        providers: List[AIProvider],
+        hedge_percentile: float = 95.0,
+        hedge_min_delay: float = 0.05,
+        hedge_default_delay: float = 2.0,
+    ):
+        """
+        Initialize the router.
+
+        Args:
+            providers: Providers in priority order (primary first)
+            hedge_percentile: Primary latency percentile that triggers a hedge
+            hedge_min_delay: Lower bound on the hedge delay, in seconds
+            hedge_default_delay: Hedge delay used until enough samples exist
+        """
+        if not providers:
+            raise ValueError("ProviderRouter needs at least one provider")
+        self._providers = providers
+        self._hedge_percentile = hedge_percentile
+        self._hedge_min_delay = hedge_min_delay
+        self._hedge_default_delay = hedge_default_delay
+        self._latency: Dict[int, LatencyTracker] = {
+            id(provider): LatencyTracker() for provider in providers
+        }
+
+    @property
+    def name(self) -> str:
+        return "router"
+
+    @property
+    def model(self) -> str:
+        return self._providers[0].model
+
+    @property
+    def providers(self) -> List[AIProvider]:
+        """Providers in priority order."""
+        return list(self._providers)
+
+    def hedge_delay(self, provider: AIProvider) -> float:
+        """Seconds to wait on a provider before sending a hedge request."""
+        observed = self._latency[id(provider)].percentile(self._hedge_percentile)
+        if observed is None:
+            return self._hedge_default_delay
+        return max(self._hedge_min_delay, observed)
+
+    async def _timed_chat(self, provider: AIProvider, **kwargs) -> ChatResponse:
+        """Call a provider and record its latency on success."""
+        started = time.monotonic()
+        response = await provider.chat(**kwargs)
+        self._latency[id(provider)].record(time.monotonic() - started)
+        return response
+
+    async def chat(
+        self,
+        messages: List[ChatMessage],
+        system_prompt: str,
+        max_tokens: int = 500,
+        temperature: float = 0.7,
+    ) -> ChatResponse:
+        """Generate a chat response, hedging and failing over as needed."""
+        kwargs = dict(
+            messages=messages,
+            system_prompt=system_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+        waiting = list(self._providers)
+        pending: Dict[asyncio.Task, AIProvider] = {}
+        last_error: Optional[BaseException] = None
+        hedged = False
+
+        def launch() -> AIProvider:
+            provider = waiting.pop(0)
+            task = asyncio.create_task(self._timed_chat(provider, **kwargs))
+            pending[task] = provider
+            return provider
+
+        primary = launch()
+        try:
+            while pending:
+                timeout = None
+                if waiting and not hedged:
+                    timeout = self.hedge_delay(primary)
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    # Primary is slower than usual - race the next provider
+                    hedged = True
+                    secondary = launch()
+                    logger.info(f"Hedging {primary.name} with {secondary.name}")
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        return task.result()
+                    last_error = error
+                    logger.warning(f"Provider {provider.name} failed: {error}")
+                    if waiting and not pending:
+                        launch()
+
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def chat_stream_events(
+        self,
+        messages: List[ChatMessage],
+        system_prompt: str,
+        max_tokens: int = 500,
+        temperature: float = 0.7,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """
+        Stream a chat response.
+
+        Hedging and failover apply until the first event arrives; once a
+        provider has produced output the stream is committed to it.
+        """
+        kwargs = dict(
+            messages=messages,
+            system_prompt=system_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+        waiting = list(self._providers)
+        pending: Dict[asyncio.Task, tuple] = {}
+        last_error: Optional[BaseException] = None
+        hedged = False
+        winner = None
+        first_event = None
+
+        async def first(provider: AIProvider, stream) -> Optional[StreamEvent]:
+            started = time.monotonic()
+            try:
+                event = await stream.__anext__()
+            except StopAsyncIteration:
+                # Provider finished without output - an empty answer
+                event = None
+            self._latency[id(provider)].record(time.monotonic() - started)
+            return event
+
+        def launch() -> AIProvider:
+            provider = waiting.pop(0)
+            stream = provider.chat_stream_events(**kwargs)
+            task = asyncio.create_task(first(provider, stream))
+            pending[task] = (provider, stream)
+            return provider
+
+        primary = launch()
+        try:
+            while pending and winner is None:
+                timeout = None
+                if waiting and not hedged:
+                    timeout = self.hedge_delay(primary)
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    hedged = True
+                    secondary = launch()
+                    logger.info(f"Hedging stream from {primary.name} with {secondary.name}")
+                    continue
+
+                for task in done:
+                    provider, stream = pending.pop(task)
+                    error = task.exception()
+                    if error is None and winner is None:
+                        winner, first_event = stream, task.result()
+                        continue
+                    if error is not None:
+                        last_error = error
+                        logger.warning(f"Provider {provider.name} stream failed: {error}")
+                    await stream.aclose()
+                    if winner is None and waiting and not pending:
+                        launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+                for _, stream in pending.values():
+                    await stream.aclose()
+
+        if winner is None:
+            raise last_error
+
+        if first_event is None:
+            return
+        try:
+            yield first_event
+            async for event in winner:
+                yield event
+        finally:
+            await winner.aclose()
+
+    async def moderate(self, text: str) -> ModerationResult:
+        """Check content with the first provider that answers."""
+        last_error: Optional[BaseException] = None
+        for provider in self._providers:
+            try:
+                return await provider.moderate(text)
+            except Exception as e:
+                last_error = e
+                logger.warning(f"Provider {provider.name} moderation failed: {e}")
+        raise last_error
@@ -2,7 +2,7 @@
 
 from functools import lru_cache
 from pydantic_settings import BaseSettings
-from typing import Literal
+from typing import Dict, List, Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -30,6 +30,108 @@ class Settings(BaseSettings):
     ANTHROPIC_API_KEY: str = ""
     ANTHROPIC_MODEL: str = "claude-3-5-sonnet-20241022"
 
+    # Provider routing - fallbacks are tried in order, as "provider" or "provider:model"
+    AI_FALLBACK_PROVIDERS: List[str] = []
+    AI_HEDGE_PERCENTILE: float = 95.0
+    AI_HEDGE_MIN_DELAY_MS: int = 50
+    AI_HEDGE_DEFAULT_DELAY_MS: int = 2000
+
+    # Provider circuit breaker and adaptive concurrency limit
+    AI_CIRCUIT_BREAKER_ENABLED: bool = True
+    AI_BREAKER_FAILURE_THRESHOLD: int = 5
+    AI_BREAKER_RECOVERY_SECONDS: float = 30.0
+    AI_CONCURRENCY_INITIAL_LIMIT: int = 20
+    AI_CONCURRENCY_MAX_LIMIT: int = 200
+    AI_CONCURRENCY_LATENCY_THRESHOLD_MS: int = 0  # 0 = only failures shrink the limit
+
+    # Provider retries - bounded by the per-request deadline
+    AI_REQUEST_DEADLINE_SECONDS: float = 30.0
+    AI_RETRY_MAX_ATTEMPTS: int = 3
+    AI_RETRY_BASE_DELAY_MS: int = 250
+    AI_RETRY_MAX_DELAY_MS: int = 8000
+
+    # Moderation micro-batching (OpenAI moderation accepts a list of inputs)
+    MODERATION_BATCH_WINDOW_MS: float = 5.0
+    MODERATION_BATCH_MAX_SIZE: int = 32
+
+    # Input moderation via the provider, with generation started speculatively alongside it
+    AI_INPUT_MODERATION: bool = False
+    AI_SPECULATIVE_GENERATION: bool = True
+
+    # Mock provider simulation - realistic latency and failures for load/resilience tests
+    MOCK_SIMULATE: bool = False
+    MOCK_TTFT_MS: float = 400.0  # Median time to first token
+    MOCK_TTFT_SIGMA: float = 0.5  # Lognormal spread of time to first token
+    MOCK_TOKENS_PER_SECOND: float = 60.0
+    MOCK_ERROR_RATE: float = 0.0  # Fraction of calls failing with a 500
+    MOCK_RATE_LIMIT_RATE: float = 0.0  # Fraction of calls failing with a 429
+    MOCK_RETRY_AFTER_SECONDS: float = 1.0
+    MOCK_TIMEOUT_RATE: float = 0.0  # Fraction of calls that hang until timeout
+    MOCK_TIMEOUT_SECONDS: float = 30.0
+    MOCK_SEED: Optional[int] = None
+
+    # SSE streaming - chunks are coalesced into fewer frames (fewer radio wake-ups on mobile)
+    SSE_COALESCE_BYTES: int = 256  # Flush once this much text is pending
+    SSE_COALESCE_MS: float = 50.0  # ...or once the oldest pending chunk is this old
+    SSE_HEARTBEAT_SECONDS: float = 15.0  # Comment frame when idle, keeps proxies from closing the stream
+    SSE_MAX_PENDING_CHUNKS: int = 64  # Provider reads pause when a slow client falls this far behind
+
+    # WebSocket chat
+    WS_AUTH_TIMEOUT_SECONDS: float = 10.0  # Close sockets that don't send the PIN in time
+
+    # Write-behind chat persistence - turns are queued and written in group-committed batches
+    WRITE_BEHIND_ENABLED: bool = False
+    WRITE_BEHIND_MAX_ROWS: int = 500  # Flush once this many message rows are queued
+    WRITE_BEHIND_MAX_DELAY_MS: float = 5.0  # ...or once the oldest queued turn is this old
+    WRITE_BEHIND_MAX_PENDING: int = 10000  # Turns queued before callers wait (database stalled)
+    WRITE_BEHIND_RETRY_MAX_SECONDS: float = 30.0  # Cap on the backoff between retries of a failed batch
+    WRITE_BEHIND_DEAD_LETTER_PATH: str = "write_behind_dead_letter.jsonl"  # Turns that could not be written, for replay
+    ID_BLOCK_SIZE: int = 1000  # Message ids reserved per allocator round trip
+
+    # Background jobs - in-process runner for post-response work
+    JOBS_WORKERS: int = 4  # Jobs run concurrently
+    JOBS_MAX_QUEUE: int = 1000  # Queued jobs before enqueue refuses (memory) or defers to the poller (durable)
+    JOBS_MAX_ATTEMPTS: int = 5
+    JOBS_BACKOFF_SECONDS: float = 1.0  # First retry delay; doubles per attempt
+    JOBS_BACKOFF_MAX_SECONDS: float = 300.0
+    JOBS_POLL_SECONDS: float = 5.0  # How often durable jobs are picked up from the table
+    JOBS_LEASE_SECONDS: float = 300.0  # A claimed durable job is retried if not finished by then
+    JOBS_DRAIN_SECONDS: float = 10.0  # Shutdown waits this long for queued jobs
+
+    # Safety flags - filter verdicts are persisted in background batches
+    FLAG_BATCH_SIZE: int = 100  # Verdicts per write job
+    FLAG_BATCH_DELAY_MS: float = 250.0  # Longest a verdict waits for its batch
+
+    # Parent dashboard stats - daily rollup maintained on write
+    STATS_IDLE_MINUTES: int = 5  # Longer gaps between turns don't count as active time
+
+    # Token usage ledger - USD per million tokens as [input, output, cached input], by model
+    AI_TOKEN_PRICES: Dict[str, List[float]] = {}
+
+    # Transcript export - rows read per keyset batch (memory stays constant whatever the history size)
+    EXPORT_BATCH_SIZE: int = 500
+
+    # Message content compression - deflate with a dictionary trained on our own messages
+    CONTENT_COMPRESSION_ENABLED: bool = False  # Off = new rows stored as is (existing rows still decode)
+    CONTENT_COMPRESSION_MIN_BYTES: int = 128  # Shorter text is not worth compressing
+    CONTENT_COMPRESSION_LEVEL: int = 6
+    CONTENT_DICTIONARY_ID: int = 0  # Dictionary for new rows (0 = none); train with app.services.content_dictionary
+
+    # Message archival - inactive conversations move to compressed per-conversation blobs
+    ARCHIVE_ENABLED: bool = False  # Run the background mover
+    ARCHIVE_AFTER_DAYS: int = 90  # Inactivity before a conversation is archived
+    ARCHIVE_CHUNK_SIZE: int = 50  # Conversations per transaction
+    ARCHIVE_PAUSE_SECONDS: float = 1.0  # Sleep between chunks, so the mover never hogs the database
+    ARCHIVE_INTERVAL_SECONDS: float = 3600.0  # Time between mover runs
+
+    # Tracing - per-request spans in a Server-Timing header, optionally exported as JSON lines
+    TRACING_ENABLED: bool = False
+    TRACING_EXPORT_PATH: str = ""  # Empty = no export
+
+    # SQL instrumentation
+    SQL_SLOW_QUERY_MS: float = 200.0  # Log statements slower than this
+    SQL_REPEATED_QUERY_THRESHOLD: int = 10  # Log a possible N+1 when one statement repeats more per request
+
     # Firebase (for auth)
     FIREBASE_PROJECT_ID: str = ""
     FIREBASE_PRIVATE_KEY_ID: str = ""
@@ -0,0 +1,207 @@
+"""
+Compressed storage for message content.
+
+Assistant replies repeat the same phrases ("Great question!", "What else
+would you like to know?") across millions of rows, but each one is too
+short for a general-purpose compressor to find much to work with. A preset
+dictionary trained on our own messages gives the compressor that shared
+context up front, so even a two-sentence reply compresses well.
+
+The column stays TEXT, and stored values are self-describing, so rows
+written under different settings or dictionaries, or before the codec,
+can be read side by side:
+
+    <text>                                        stored as is (short text, or compression off)
+    ESC "z" <dictionary id> ":" <base64 deflate>  dictionary id 0 = no dictionary
+    ESC <text>                                    text that itself starts with ESC... "z"
+
+Plain rows stay readable (and searchable) by anything that reads the
+table. Base64 costs a third of the compressed size, so a value is only
+compressed when it still comes out smaller. Existing rows are rewritten
+under the current settings with
+`python -m app.services.content_dictionary recode`.
+
+Dictionaries are immutable once created, and every dictionary ever used
+must stay registered (see app.services.content_dictionary) so old rows
+can still be decoded. The codec is zlib with a preset dictionary (zdict),
+from the standard library, so there is nothing extra to install.
+"""
+
+import base64
+import logging
+import re
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import Text
+from sqlalchemy.types import TypeDecorator
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ESCAPE = "\x1b"
+COMPRESSED = ESCAPE + "z"
+_COMPRESSED_VALUE = re.compile(r"\x1bz(\d+):([A-Za-z0-9+/]*={0,2})\Z")
+MAX_DICTIONARY_BYTES = 32 * 1024  # Deflate's window; a longer dictionary is never referenced
+
+_dictionaries: Dict[int, bytes] = {}
+_primed: Dict[Tuple[int, int], Any] = {}  # Compressors with the dictionary already loaded
+_warned_missing: set = set()
+
+
+class UnknownDictionary(LookupError):
+    """A stored value references a dictionary that has not been registered."""
+
+
+def register_dictionary(dictionary_id: int, data: bytes) -> None:
+    """Make a dictionary available for encoding and decoding."""
+    if dictionary_id <= 0:
+        raise ValueError("Dictionary ids start at 1 (0 means no dictionary)")
+    _dictionaries[dictionary_id] = data
+    _primed.clear()
+
+
+def registered_dictionaries() -> Dict[int, bytes]:
+    return dict(_dictionaries)
+
+
+def _active_dictionary() -> Tuple[int, Optional[bytes]]:
+    """(id, data) of the dictionary new values are compressed with."""
+    dictionary_id = settings.CONTENT_DICTIONARY_ID
+    if not dictionary_id:
+        return 0, None
+    data = _dictionaries.get(dictionary_id)
+    if data is None:
+        if dictionary_id not in _warned_missing:
+            _warned_missing.add(dictionary_id)
+            logger.warning(f"Content dictionary {dictionary_id} is not loaded; compressing without a dictionary")
+        return 0, None
+    return dictionary_id, data
+
+
+def _compressor(dictionary_id: int, data: Optional[bytes], level: int):
+    """A fresh compressor; copying a primed one skips loading the dictionary each time."""
+    key = (dictionary_id, level)
+    prototype = _primed.get(key)
+    if prototype is None:
+        if data is not None:
+            prototype = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=data)
+        else:
+            prototype = zlib.compressobj(level, zlib.DEFLATED, -15)
+        _primed[key] = prototype
+    return prototype.copy()
+
+
+def encode_content(text: str, enabled: Optional[bool] = None) -> str:
+    """
+    Encode message text for storage.
+
+    Text shorter than CONTENT_COMPRESSION_MIN_BYTES, or that does not get
+    smaller, is stored as is.
+    """
+    plain = ESCAPE + text if _reserved(text) else text
+    enabled = settings.CONTENT_COMPRESSION_ENABLED if enabled is None else enabled
+    raw = text.encode("utf-8")
+    if not enabled or len(raw) < settings.CONTENT_COMPRESSION_MIN_BYTES:
+        return plain
+
+    dictionary_id, data = _active_dictionary()
+    compressor = _compressor(dictionary_id, data, settings.CONTENT_COMPRESSION_LEVEL)
+    compressed = compressor.compress(raw) + compressor.flush()
+    value = f"{COMPRESSED}{dictionary_id}:{base64.b64encode(compressed).decode('ascii')}"
+    if len(value) >= len(raw):
+        return plain
+    return value
+
+
+def _reserved(value: str) -> bool:
+    """Whether plain text could be taken for a compressed value (ESC..."z"), and so is escaped."""
+    return value.startswith(ESCAPE) and value.lstrip(ESCAPE).startswith("z")
+
+
+def _decompress(dictionary_id: int, compressed: bytes) -> str:
+    if dictionary_id:
+        data = _dictionaries.get(dictionary_id)
+        if data is None:
+            raise UnknownDictionary(f"Content dictionary {dictionary_id} is not loaded")
+        decompressor = zlib.decompressobj(-15, zdict=data)
+    else:
+        decompressor = zlib.decompressobj(-15)
+    return (decompressor.decompress(compressed) + decompressor.flush()).decode("utf-8")
+
+
+def decode_content(value: str) -> str:
+    """
+    Decode a stored value.
+
+    Anything that is not a compressed or escaped value is plain text,
+    including rows written before the codec that happen to start with ESC.
+    """
+    if not value.startswith(ESCAPE):
+        return value
+    match = _COMPRESSED_VALUE.match(value)
+    if match is not None:
+        return _decompress(int(match.group(1)), base64.b64decode(match.group(2)))
+    if _reserved(value[1:]):
+        return value[1:]
+    return value
+
+
+def content_dictionary_id(value: str) -> Optional[int]:
+    """Dictionary id a stored value was compressed with (None = not compressed)."""
+    match = _COMPRESSED_VALUE.match(value)
+    return None if match is None else int(match.group(1))
+
+
+class CompressedText(TypeDecorator):
+    """Text column stored through the content codec; reads and writes are plain str."""
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[str], dialect) -> Optional[str]:
+        return None if value is None else encode_content(value)
+
+    def process_result_value(self, value, dialect) -> Optional[str]:
+        return None if value is None else decode_content(value)
+
+
+_WORD = re.compile(r"\S+\s*")
+
+
+def train_dictionary(samples: Iterable[str], size: int = MAX_DICTIONARY_BYTES, max_words: int = 8) -> bytes:
+    """
+    Build a preset dictionary from sample messages.
+
+    Counts word n-grams (2..max_words words) across the samples, scores
+    each by how many bytes it would save (occurrences x length), and packs
+    the best into `size` bytes. Deflate finds nearer matches more cheaply,
+    so the most valuable phrases go at the end.
+    """
+    counts: Counter = Counter()
+    for sample in samples:
+        words = _WORD.findall(sample)
+        for n in range(2, max_words + 1):
+            for i in range(len(words) - n + 1):
+                counts["".join(words[i:i + n])] += 1
+
+    scored = sorted(
+        ((count * len(phrase.encode("utf-8")), phrase) for phrase, count in counts.items() if count > 1),
+        reverse=True,
+    )
+    chosen = []
+    joined = ""
+    total = 0
+    for _, phrase in scored:
+        if total >= size:
+            break
+        if phrase in joined:
+            continue  # Already covered by a longer phrase
+        chosen.append(phrase)
+        joined += "\x00" + phrase
+        total += len(phrase.encode("utf-8"))
+
+    data = "".join(reversed(chosen)).encode("utf-8")
+    return data[-size:]
@@ -1,9 +1,12 @@
 """Database configuration and session management."""
 
+import importlib
+
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 
 from app.core.config import settings
+from app.core.tracing import span
 
 
 # Create async engine
@@ -28,12 +31,24 @@ class Base(DeclarativeBase):
     pass
 
 
+def upsert_insert(dialect_name: str):
+    """
+    The dialect's insert() construct, which supports ON CONFLICT DO UPDATE (counter rollups).
+
+    Imported on first use, so SQLite deployments never load the PostgreSQL dialect.
+    """
+    if dialect_name not in ("sqlite", "postgresql"):
+        raise ValueError(f"No upsert support for dialect: {dialect_name}")
+    return importlib.import_module(f"sqlalchemy.dialects.{dialect_name}").insert
+
+
 async def get_db() -> AsyncSession:
     """Dependency to get database session."""
     async with async_session_maker() as session:
         try:
             yield session
-            await session.commit()
+            with span("db.commit"):
+                await session.commit()
         except Exception:
             await session.rollback()
             raise
@@ -41,10 +56,21 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
+def get_session_factory() -> async_sessionmaker:
+    """
+    Dependency for long-lived connections (WebSockets) that open a short
+    session per unit of work instead of holding one for their whole life.
+    """
+    return async_session_maker
+
+
 async def init_db() -> None:
-    """Initialize database tables."""
+    """Initialize database tables, and backfill counters missing from rows older than them."""
+    from app.models.conversation import backfill_conversation_counts  # The models import Base from here
+
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(backfill_conversation_counts)
 
 
 async def close_db() -> None:
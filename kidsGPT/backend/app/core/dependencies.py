@@ -9,6 +9,7 @@ from sqlalchemy import select
 
 from app.core.database import get_db
 from app.core.firebase import verify_id_token, is_firebase_configured, FirebaseUser
+from app.core.tracing import span
 from app.models import User
 
 
@@ -34,7 +35,8 @@ async def get_firebase_user(
             detail="Authentication service not configured"
         )
 
-    firebase_user = verify_id_token(credentials.credentials)
+    with span("auth.verify_token"):
+        firebase_user = verify_id_token(credentials.credentials)
 
     if firebase_user is None:
         raise HTTPException(
@@ -72,10 +74,11 @@ async def get_current_user(
         )
 
     # Look up user by Firebase UID
-    result = await db.execute(
-        select(User).where(User.firebase_uid == firebase_user.uid)
-    )
-    user = result.scalar_one_or_none()
+    with span("auth.current_user"):
+        result = await db.execute(
+            select(User).where(User.firebase_uid == firebase_user.uid)
+        )
+        user = result.scalar_one_or_none()
 
     if user is None:
         raise HTTPException(
@@ -1,14 +1,19 @@
-"""Firebase Admin SDK initialization and token verification."""
+"""
+Firebase Admin SDK initialization and token verification.
+
+The SDK (firebase_admin and google-auth) is imported on first use, not at
+startup: workers in mock mode or without FIREBASE_PROJECT_ID never load it.
+"""
 
 import logging
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 from dataclasses import dataclass
 
-import firebase_admin
-from firebase_admin import auth, credentials
-
 from app.core.config import settings
 
+if TYPE_CHECKING:
+    import firebase_admin
+
 logger = logging.getLogger(__name__)
 
 
@@ -23,7 +28,7 @@ class FirebaseUser:
 
 
 # Global Firebase app instance
-_firebase_app: Optional[firebase_admin.App] = None
+_firebase_app: Optional["firebase_admin.App"] = None
 
 
 def init_firebase() -> bool:
@@ -43,6 +48,9 @@ def init_firebase() -> bool:
         return False
 
     try:
+        import firebase_admin
+        from firebase_admin import credentials
+
         # Build credentials from environment variables
         if settings.FIREBASE_PRIVATE_KEY and settings.FIREBASE_CLIENT_EMAIL:
             # Use service account credentials from env vars
@@ -92,6 +100,8 @@ def verify_id_token(id_token: str) -> Optional[FirebaseUser]:
             logger.error("Cannot verify token - Firebase not initialized")
             return None
 
+    from firebase_admin import auth
+
     try:
         decoded_token = auth.verify_id_token(id_token)
 
@@ -0,0 +1,424 @@
+"""
+In-process background jobs.
+
+Work that need not hold up a response (flag evaluation, titles, rollups,
+summaries) is queued here and run by a fixed pool of worker tasks that
+starts and stops with the app (lifespan).
+
+    @job("generate_title")
+    async def generate_title(conversation_id: int) -> None:
+        ...
+
+    @router.post(...)
+    async def endpoint(background_tasks: BackgroundTasks, jobs: JobRunner = Depends(get_job_runner)):
+        background_tasks.add_task(jobs.enqueue, "generate_title", {"conversation_id": 1})
+
+Scheduling the enqueue as a background task keeps even the queue write
+off the request path: it runs after the response is sent.
+
+Jobs are in-memory by default: fast, but lost on restart. Pass
+durable=True to also record the job in the jobs table; durable jobs are
+claimed with a lease, renewed when the job starts and while it runs, so a
+job whose process died is picked up again by the poller. Delivery is at
+least once, so handlers must be idempotent.
+
+Failed jobs are retried with exponential backoff up to JOBS_MAX_ATTEMPTS.
+The queue is bounded (JOBS_MAX_QUEUE): enqueue_nowait refuses when it is
+full, and durable jobs wait in the table until there is room.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.metrics import JOB_DURATION, JOBS
+from app.models import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[..., Awaitable[None]]
+
+_handlers: Dict[str, JobHandler] = {}
+
+
+def job(name: str) -> Callable[[JobHandler], JobHandler]:
+    """Register an async function as the handler for jobs called `name`; the payload is its kwargs."""
+    def register(handler: JobHandler) -> JobHandler:
+        _handlers[name] = handler
+        return handler
+    return register
+
+
+class QueueFull(Exception):
+    """The in-memory job queue is at JOBS_MAX_QUEUE."""
+
+
+@dataclass
+class _QueuedJob:
+    name: str
+    payload: Dict[str, Any] = field(default_factory=dict)
+    attempts: int = 0
+    max_attempts: int = 1
+    job_id: Optional[int] = None  # Row in the jobs table, for durable jobs
+    lease: Optional[datetime] = None  # locked_until of our claim; renewals check it is still ours
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before retry number `attempts` (1-based): base, 2x base, 4x base... capped."""
+    return min(settings.JOBS_BACKOFF_SECONDS * 2 ** (attempts - 1), settings.JOBS_BACKOFF_MAX_SECONDS)
+
+
+class JobRunner:
+    """
+    Bounded job queue, worker pool and (with a session factory) durable job poller.
+
+    Args:
+        session_factory: Factory for short database sessions (None = in-memory jobs only)
+        workers: Jobs run concurrently (defaults to settings)
+        max_queue: Queue bound (defaults to settings)
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[async_sessionmaker] = None,
+        workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+    ):
+        self.session_factory = session_factory
+        self.workers = workers or settings.JOBS_WORKERS
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue or settings.JOBS_MAX_QUEUE)
+        self._tasks: List[asyncio.Task] = []
+        self._retries: Set[asyncio.Task] = set()
+        self._inflight: Set[int] = set()  # Durable job ids queued or running here
+        self._accepting = True
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        """Start the workers (and the durable job poller)."""
+        if self._tasks:
+            return
+        self._accepting = True
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.session_factory is not None:
+            self._tasks.append(asyncio.create_task(self._poll_loop()))
+
+    def enqueue_nowait(self, name: str, payload: Optional[Dict[str, Any]] = None,
+                       max_attempts: Optional[int] = None) -> None:
+        """
+        Queue an in-memory job without waiting.
+
+        Raises:
+            ValueError: No handler is registered under `name`
+            QueueFull: The queue is full (the caller decides whether to drop or retry)
+        """
+        self._check(name)
+        try:
+            self._queue.put_nowait(_QueuedJob(name, payload or {}, 0, max_attempts or settings.JOBS_MAX_ATTEMPTS))
+        except asyncio.QueueFull:
+            JOBS.inc((name, "rejected"))
+            raise QueueFull(f"Job queue full ({self._queue.maxsize}); '{name}' not queued")
+
+    async def enqueue(
+        self,
+        name: str,
+        payload: Optional[Dict[str, Any]] = None,
+        durable: bool = False,
+        max_attempts: Optional[int] = None,
+        delay: float = 0.0,
+    ) -> Optional[int]:
+        """
+        Queue a job.
+
+        In-memory jobs wait for room if the queue is full. Durable jobs are
+        written to the jobs table first and never wait: if the queue is full
+        (or `delay` is set) the poller picks them up later.
+
+        Args:
+            name: Registered job name
+            payload: Keyword arguments for the handler (JSON-serializable if durable)
+            durable: Record the job so it survives a restart
+            max_attempts: Runs before giving up (defaults to settings)
+            delay: Seconds before the job may run
+
+        Returns:
+            The jobs table id for durable jobs, else None
+        """
+        self._check(name)
+        payload = payload or {}
+        max_attempts = max_attempts or settings.JOBS_MAX_ATTEMPTS
+        if not durable:
+            if delay:
+                self._later(delay, _QueuedJob(name, payload, 0, max_attempts))
+            else:
+                await self._queue.put(_QueuedJob(name, payload, 0, max_attempts))
+            return None
+
+        if self.session_factory is None:
+            raise RuntimeError("Durable jobs need a JobRunner with a session factory")
+        now = datetime.utcnow()
+        claim = self.running and not delay and not self._queue.full()
+        lease = now + timedelta(seconds=settings.JOBS_LEASE_SECONDS) if claim else None
+        async with self.session_factory() as db:
+            row = Job(
+                name=name,
+                payload=payload,
+                max_attempts=max_attempts,
+                run_at=now + timedelta(seconds=delay),
+                status=JobStatus.RUNNING if claim else JobStatus.PENDING,
+                locked_until=lease,
+            )
+            db.add(row)
+            await db.commit()
+        if claim:
+            try:
+                self._queue.put_nowait(_QueuedJob(name, payload, 0, max_attempts, row.id, lease))
+                self._inflight.add(row.id)
+            except asyncio.QueueFull:
+                await self._release([row.id])
+        return row.id
+
+    def _check(self, name: str) -> None:
+        if not self._accepting:
+            raise RuntimeError("Job runner is shutting down")
+        if name not in _handlers:
+            raise ValueError(f"No job handler registered for '{name}'")
+
+    def _later(self, delay: float, item: _QueuedJob) -> None:
+        async def requeue():
+            await asyncio.sleep(delay)
+            await self._queue.put(item)
+
+        task = asyncio.create_task(requeue())
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    async def join(self) -> None:
+        """Wait until the queue is empty and nothing is running (retries still pending are not waited for)."""
+        await self._queue.join()
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop taking jobs, give queued ones up to `timeout` seconds to finish, then stop the workers.
+
+        Unfinished durable jobs are released back to the table for the next
+        start; unfinished in-memory jobs are dropped (and logged).
+        """
+        self._accepting = False
+        if not self._tasks:
+            return
+        timeout = settings.JOBS_DRAIN_SECONDS if timeout is None else timeout
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Job runner stopping with {self._queue.qsize()} jobs still queued")
+
+        tasks = [*self._tasks, *self._retries]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+
+        dropped = 0
+        while not self._queue.empty():
+            if self._queue.get_nowait().job_id is None:
+                dropped += 1
+        if dropped:
+            logger.warning(f"Dropped {dropped} in-memory jobs at shutdown")
+        if self._inflight and self.session_factory is not None:
+            await self._release(list(self._inflight))
+        self._inflight.clear()
+
+    async def _worker(self) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._run(item)
+            except Exception as e:
+                logger.error(f"Job bookkeeping failed for '{item.name}': {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, item: _QueuedJob) -> None:
+        heartbeat = None
+        if item.job_id is not None:
+            # The job may have waited in the queue for most of its lease
+            try:
+                renewed = await self._renew_lease(item)
+            except Exception as e:
+                logger.error(f"Renewing the lease on durable job {item.job_id} failed, running it anyway: {e}")
+                renewed = True
+            if not renewed:
+                self._inflight.discard(item.job_id)
+                logger.warning(f"Durable job {item.job_id} ('{item.name}') lost its lease while queued; not running it")
+                return
+            heartbeat = asyncio.create_task(self._keep_lease(item))
+
+        item.attempts += 1
+        started = time.perf_counter()
+        try:
+            await _handlers[item.name](**item.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            JOB_DURATION.observe(time.perf_counter() - started, (item.name,))
+            await self._failed(item, e)
+            return
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+        JOB_DURATION.observe(time.perf_counter() - started, (item.name,))
+        JOBS.inc((item.name, "ok"))
+        if item.job_id is not None:
+            await self._finish(item, JobStatus.DONE)
+
+    async def _renew_lease(self, item: _QueuedJob) -> bool:
+        """Extend our claim on a durable job. False if it is no longer ours (it expired and was claimed again)."""
+        lease = datetime.utcnow() + timedelta(seconds=settings.JOBS_LEASE_SECONDS)
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(Job)
+                .where(Job.id == item.job_id, Job.status == JobStatus.RUNNING, Job.locked_until == item.lease)
+                .values(locked_until=lease)
+            )
+            await db.commit()
+        if result.rowcount != 1:
+            return False
+        item.lease = lease
+        return True
+
+    async def _keep_lease(self, item: _QueuedJob) -> None:
+        """Renew a running durable job's lease every half lease, so no poller hands it out again."""
+        while True:
+            await asyncio.sleep(settings.JOBS_LEASE_SECONDS / 2)
+            try:
+                if not await self._renew_lease(item):
+                    logger.warning(f"Durable job {item.job_id} ('{item.name}') lost its lease while running")
+                    return
+            except Exception as e:
+                logger.error(f"Renewing the lease on durable job {item.job_id} failed: {e}")
+
+    async def _failed(self, item: _QueuedJob, error: Exception) -> None:
+        if item.attempts >= item.max_attempts:
+            JOBS.inc((item.name, "failed"))
+            logger.error(f"Job '{item.name}' failed after {item.attempts} attempts: {error}")
+            if item.job_id is not None:
+                await self._finish(item, JobStatus.FAILED, str(error))
+            return
+
+        delay = backoff_seconds(item.attempts)
+        JOBS.inc((item.name, "retry"))
+        logger.warning(f"Job '{item.name}' attempt {item.attempts} failed, retrying in {delay:.1f}s: {error}")
+        if item.job_id is None:
+            self._later(delay, item)
+            return
+        # Durable retries go back to the table, so they survive a restart during the backoff
+        self._inflight.discard(item.job_id)
+        async with self.session_factory() as db:
+            await db.execute(
+                update(Job).where(Job.id == item.job_id).values(
+                    status=JobStatus.PENDING,
+                    attempts=item.attempts,
+                    run_at=datetime.utcnow() + timedelta(seconds=delay),
+                    locked_until=None,
+                    last_error=str(error),
+                )
+            )
+            await db.commit()
+
+    async def _finish(self, item: _QueuedJob, status: JobStatus, error: Optional[str] = None) -> None:
+        self._inflight.discard(item.job_id)
+        async with self.session_factory() as db:
+            await db.execute(
+                update(Job).where(Job.id == item.job_id).values(
+                    status=status, attempts=item.attempts, locked_until=None,
+                    last_error=error, finished_at=datetime.utcnow(),
+                )
+            )
+            await db.commit()
+
+    async def _release(self, job_ids: List[int]) -> None:
+        async with self.session_factory() as db:
+            await db.execute(
+                update(Job)
+                .where(Job.id.in_(job_ids), Job.status == JobStatus.RUNNING)
+                .values(status=JobStatus.PENDING, locked_until=None)
+            )
+            await db.commit()
+
+    async def poll_once(self) -> int:
+        """
+        Claim due durable jobs (new, retrying, or with an expired lease) while there is room. Returns how many.
+
+        Jobs already queued or running here are skipped, even if their lease
+        has run out: they are not handed to a second worker.
+        """
+        room = self._queue.maxsize - self._queue.qsize()
+        if room <= 0:
+            return 0
+        now = datetime.utcnow()
+        lease = now + timedelta(seconds=settings.JOBS_LEASE_SECONDS)
+        due = or_(
+            and_(Job.status == JobStatus.PENDING, Job.run_at <= now),
+            and_(Job.status == JobStatus.RUNNING, Job.locked_until < now),
+        )
+        claimed = []
+        async with self.session_factory() as db:
+            candidates = (await db.execute(
+                select(Job.id, Job.name, Job.payload, Job.attempts, Job.max_attempts)
+                .where(due, Job.id.not_in(self._inflight))
+                .order_by(Job.run_at)
+                .limit(room)
+            )).all()
+            for candidate in candidates:
+                # Claim atomically: another process may be polling the same rows
+                result = await db.execute(
+                    update(Job)
+                    .where(Job.id == candidate.id, due)
+                    .values(status=JobStatus.RUNNING, locked_until=lease)
+                )
+                if result.rowcount == 1:
+                    claimed.append(candidate)
+            await db.commit()
+
+        for candidate in claimed:
+            if candidate.name not in _handlers:
+                logger.error(f"Durable job {candidate.id} has no handler for '{candidate.name}'")
+            self._inflight.add(candidate.id)
+            self._queue.put_nowait(_QueuedJob(
+                candidate.name, candidate.payload, candidate.attempts, candidate.max_attempts, candidate.id, lease,
+            ))
+        return len(claimed)
+
+    async def _poll_loop(self) -> None:
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.error(f"Job poll failed: {e}")
+            await asyncio.sleep(settings.JOBS_POLL_SECONDS)
+
+
+_runner: Optional[JobRunner] = None
+
+
+def get_job_runner() -> JobRunner:
+    """The process-wide job runner (also a FastAPI dependency). Started and stopped by lifespan."""
+    global _runner
+    if _runner is None:
+        _runner = JobRunner(async_session_maker)
+    return _runner
@@ -0,0 +1,285 @@
+"""
+Prometheus-compatible metrics - counters, gauges and histograms.
+
+Metrics live in a per-process registry and are only touched from the
+event loop thread, so recording is a dict update with no locks. Each
+uvicorn worker exposes its own numbers on /metrics; Prometheus scrapes
+and sums them per worker.
+"""
+
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.sql_instrumentation import report_repeated_queries, track_queries
+
+LabelValues = Tuple[str, ...]
+
+# Latency buckets in seconds, from sub-millisecond filter checks to slow model responses
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Common name/help/labels handling."""
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, labels: LabelValues = (), amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, labels: LabelValues = ()) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Point-in-time value per label set, optionally read by a callback at scrape time."""
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        collect: Optional[Callable[[], Dict[LabelValues, float]]] = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self.collect = collect
+
+    def set(self, value: float, labels: LabelValues = ()) -> None:
+        self._values[labels] = value
+
+    def value(self, labels: LabelValues = ()) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        if self.collect is not None:
+            try:
+                self._values = dict(self.collect())
+            except Exception:
+                pass  # A broken collector must not take /metrics down
+        lines = self._header()
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+@dataclass
+class _HistogramSeries:
+    bucket_counts: List[int]  # Per bucket, not cumulative (the last one is +Inf)
+    total: float = 0.0
+    count: int = 0
+
+
+class Histogram(_Metric):
+    """Bucketed distribution per label set; cumulative counts are built at scrape time."""
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def observe(self, value: float, labels: LabelValues = ()) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = _HistogramSeries([0] * (len(self.buckets) + 1))
+        series.bucket_counts[bisect_left(self.buckets, value)] += 1
+        series.total += value
+        series.count += 1
+
+    def count(self, labels: LabelValues = ()) -> int:
+        series = self._series.get(labels)
+        return series.count if series else 0
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), series.bucket_counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(series.total)}")
+            lines.append(f"{self.name}_count{label_str} {series.count}")
+        return lines
+
+
+class Registry:
+    """Set of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), collect=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# HTTP
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_LATENCY = REGISTRY.histogram("http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+
+# AI providers
+AI_TTFT = REGISTRY.histogram("ai_time_to_first_token_seconds", "Streaming time to first chunk by model", ("model",))
+AI_LATENCY = REGISTRY.histogram("ai_request_duration_seconds", "AI response total latency by model", ("model", "mode"))
+AI_TOKENS = REGISTRY.counter("ai_tokens_total", "Tokens used by model and direction", ("model", "direction"))
+AI_ERRORS = REGISTRY.counter("ai_errors_total", "AI calls that failed, by error type", ("error",))
+
+# Safety filters
+FILTER_LATENCY = REGISTRY.histogram("filter_duration_seconds", "Safety filter check time", ("filter",))
+FILTER_HITS = REGISTRY.counter("filter_hits_total", "Safety filter hits by category", ("filter", "category"))
+
+# Database
+DB_STATEMENTS = REGISTRY.histogram(
+    "db_statements_per_request", "SQL statements executed per HTTP request", ("route",), buckets=COUNT_BUCKETS
+)
+DB_TIME = REGISTRY.histogram("db_time_per_request_seconds", "Time spent in SQL per HTTP request", ("route",))
+DB_POOL = REGISTRY.gauge("db_pool_connections", "Database pool connections by state", ("state",))
+
+# Quotas
+QUOTA_REJECTIONS = REGISTRY.counter("quota_rejections_total", "Requests rejected by a usage quota", ("quota",))
+
+# Write-behind chat persistence
+WRITE_BEHIND_TURNS = REGISTRY.counter(
+    "write_behind_turns_total", "Queued chat turns by outcome (written, dead_lettered, dropped)", ("outcome",)
+)
+
+# Background jobs
+JOBS = REGISTRY.counter("jobs_total", "Background job runs by job and outcome", ("job", "outcome"))
+JOB_DURATION = REGISTRY.histogram("job_duration_seconds", "Background job run time", ("job",))
+
+
+def track_pool(engine: AsyncEngine) -> None:
+    """Expose the engine's connection pool usage as a gauge."""
+    pool = engine.sync_engine.pool
+
+    def collect_pool() -> Dict[LabelValues, float]:
+        values = {}
+        for state, method in (("checked_out", "checkedout"), ("idle", "checkedin"), ("size", "size")):
+            reader = getattr(pool, method, None)
+            if reader is not None:
+                values[(state,)] = reader()
+        return values
+
+    DB_POOL.collect = collect_pool
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency, status and DB work per route.
+
+    Routes are labelled by their path template ('/api/chat/today/{child_id}'),
+    never the raw path, to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        with track_queries() as db_stats:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                route_label = getattr(route, "path", None) or "unmatched"
+                method = scope["method"]
+                HTTP_LATENCY.observe(time.perf_counter() - started, (method, route_label))
+                HTTP_REQUESTS.inc((method, route_label, str(status_code)))
+                DB_STATEMENTS.observe(db_stats.statements, (route_label,))
+                DB_TIME.observe(db_stats.seconds, (route_label,))
+                report_repeated_queries(route_label, db_stats)
+
+
+def render_metrics() -> str:
+    """Current metrics in Prometheus text format."""
+    return REGISTRY.render()
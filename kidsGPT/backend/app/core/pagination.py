@@ -0,0 +1,45 @@
+"""
+Opaque keyset cursors for paginated listings.
+
+A cursor holds the sort key of the last row on a page; the next page is
+everything strictly after it. Unlike OFFSET, the database seeks straight
+to the key through the index instead of reading and discarding the
+skipped rows, and pages do not shift when new rows arrive.
+"""
+
+import base64
+import binascii
+from datetime import datetime
+from typing import Tuple
+
+import orjson
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+class InvalidCursor(ValueError):
+    """The cursor was not produced by encode_cursor (or has been tampered with)."""
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    """Encode a (timestamp, id) sort key as a URL-safe opaque string."""
+    payload = orjson.dumps([sort_value.isoformat(), row_id])
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor from encode_cursor.
+
+    Raises:
+        InvalidCursor: The cursor is malformed
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = orjson.loads(payload)
+        if not isinstance(row_id, int):
+            raise TypeError("id must be an integer")
+        return datetime.fromisoformat(sort_value), row_id
+    except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
@@ -0,0 +1,30 @@
+"""Fast JSON responses - orjson by default, and a no-revalidation path for Pydantic models."""
+
+from typing import Any, Sequence, Union
+
+import orjson
+from pydantic import BaseModel
+from starlette.responses import Response
+
+
+class PydanticResponse(Response):
+    """
+    Serialize already-validated Pydantic models straight to JSON bytes.
+
+    Returning a Response from an endpoint makes FastAPI skip its
+    response_model step, which would otherwise validate the models a second
+    time and run them through jsonable_encoder. Serialization happens in
+    pydantic-core, once. Keep response_model on the route for the OpenAPI docs.
+
+    Usage:
+        return PydanticResponse([ChildWithStats(...), ...])
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Union[BaseModel, Sequence[BaseModel], Any]) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.__pydantic_serializer__.to_json(content)
+        if isinstance(content, (list, tuple)) and all(isinstance(item, BaseModel) for item in content):
+            return b"[" + b",".join(item.__pydantic_serializer__.to_json(item) for item in content) + b"]"
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
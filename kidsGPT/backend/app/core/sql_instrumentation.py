@@ -0,0 +1,153 @@
+"""
+SQL statement instrumentation - per-request query stats, slow-query log, N+1 detection.
+
+One pair of SQLAlchemy cursor events feeds every consumer: the per-request
+QueryStats (used by metrics and the N+1 warning), tracing spans and the
+slow-query log. Tests use query_budget() to pin how many statements an
+endpoint may issue.
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+from app.core.tracing import current_trace
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_POSTCOMPILE = re.compile(r"__\[POSTCOMPILE_\w+\]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """
+    Normalize a statement so repeats of the same query compare equal.
+
+    Literals become '?', IN-lists collapse to '(?+)' and whitespace is folded.
+    """
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _POSTCOMPILE.sub("(?+)", normalized)
+    normalized = _PLACEHOLDER_LIST.sub("(?+)", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+@dataclass
+class QueryStats:
+    """Statements run inside a tracking scope (usually one HTTP request)."""
+    statements: int = 0
+    seconds: float = 0.0
+    fingerprints: Counter = field(default_factory=Counter)
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Fingerprints executed more than `threshold` times, most repeated first."""
+        return [(fp, count) for fp, count in self.fingerprints.most_common() if count > threshold]
+
+
+_active_stats: ContextVar[Tuple[QueryStats, ...]] = ContextVar("active_query_stats", default=())
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """
+    Count statements executed inside the block (including in tasks it spawns).
+
+    Scopes nest: a statement counts towards every enclosing scope.
+    """
+    stats = QueryStats()
+    token = _active_stats.set(_active_stats.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _active_stats.reset(token)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Attach the statement hooks to an engine."""
+    sync_engine = engine.sync_engine
+
+    # The start time lives on the statement's execution context, not the pooled connection:
+    # a statement that raises never reaches _after, and its context is simply discarded
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_started_ns = time.perf_counter_ns()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_started_ns", None)
+        if started is None:
+            return
+        ended = time.perf_counter_ns()
+        seconds = (ended - started) / 1e9
+
+        active = _active_stats.get()
+        if active:
+            fp = fingerprint(statement)
+            for stats in active:
+                stats.statements += 1
+                stats.seconds += seconds
+                stats.fingerprints[fp] += 1
+
+        trace = current_trace()
+        if trace is not None:
+            trace.record("db", started, ended, statement=statement[:200])
+
+        if seconds * 1000 >= settings.SQL_SLOW_QUERY_MS:
+            logger.warning(f"Slow query ({seconds * 1000:.1f} ms): {fingerprint(statement)[:500]}")
+
+
+def report_repeated_queries(route: str, stats: QueryStats) -> None:
+    """Log likely N+1 patterns: one statement repeated many times in a request."""
+    for fp, count in stats.repeated(settings.SQL_REPEATED_QUERY_THRESHOLD):
+        logger.warning(f"Possible N+1 on {route}: statement ran {count} times: {fp[:300]}")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised by query_budget when a block issues too many or repeated statements."""
+    pass
+
+
+def assert_query_budget(stats: QueryStats, max_statements: Optional[int] = None, max_repeats: Optional[int] = None):
+    """
+    Fail if the tracked statements exceed a budget.
+
+    Args:
+        stats: Tracked statements
+        max_statements: Maximum total statements
+        max_repeats: Maximum times any single fingerprint may run
+    """
+    problems = []
+    if max_statements is not None and stats.statements > max_statements:
+        problems.append(f"{stats.statements} statements (budget {max_statements})")
+    if max_repeats is not None:
+        for fp, count in stats.repeated(max_repeats):
+            problems.append(f"ran {count} times (max {max_repeats}): {fp}")
+    if problems:
+        raise QueryBudgetExceeded("Query budget exceeded:\n  " + "\n  ".join(problems))
+
+
+@contextmanager
+def query_budget(max_statements: Optional[int] = None, max_repeats: Optional[int] = None) -> Iterator[QueryStats]:
+    """
+    Test helper: fail when the block exceeds a statement budget.
+
+    Usage:
+        with query_budget(max_statements=3, max_repeats=1):
+            await client.get("/api/children", params={"parent_id": 1})
+    """
+    with track_queries() as stats:
+        yield stats
+    assert_query_budget(stats, max_statements, max_repeats)
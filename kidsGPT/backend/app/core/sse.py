@@ -0,0 +1,200 @@
+"""
+Server-Sent Events writer - chunk coalescing, heartbeats and backpressure.
+
+Providers yield one word (or less) per chunk. Sending each as its own SSE
+frame costs a JSON encode, a frame header and a write per word. SSEWriter
+instead:
+
+- coalesces chunks into one frame once SSE_COALESCE_BYTES of text is
+  pending or the oldest pending chunk is SSE_COALESCE_MS old (the first
+  chunk always goes out at once, so time to first token is unchanged);
+- sends a ': ping' comment after SSE_HEARTBEAT_SECONDS without output,
+  so proxies and mobile networks don't drop an idle stream;
+- reads the provider through a bounded queue: when a slow client stops
+  draining, the queue fills and the provider is no longer read, instead
+  of the answer piling up in memory.
+
+SSEResponse closes the writer as soon as the client disconnects, which
+cancels the provider stream (and its upstream HTTP request) right away
+instead of generating on until max_tokens.
+
+The wire format is unchanged: 'data: {"chunk": ...}' frames, then
+'data: {"done": true}', or 'data: {"error": ...}' on failure.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional
+
+import anyio
+import orjson
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+
+# Precomputed frame pieces - only the JSON string in the middle is encoded per frame
+CHUNK_PREFIX = b'data: {"chunk": '
+ERROR_PREFIX = b'data: {"error": '
+FRAME_END = b"}\n\n"
+DONE_FRAME = b'data: {"done": true}\n\n'
+HEARTBEAT_FRAME = b": ping\n\n"
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",  # Stop nginx buffering the stream
+}
+
+_END = object()
+
+
+class _Failed:
+    """Queue item carrying the exception that ended the source stream."""
+
+    __slots__ = ("error",)
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+@dataclass
+class SSEStats:
+    """What a writer sent, for benchmarks and logging."""
+    chunks: int = 0
+    frames: int = 0
+    heartbeats: int = 0
+    bytes: int = 0
+
+
+def chunk_frame(text: str) -> bytes:
+    """One SSE data frame carrying `text` as a chunk."""
+    return CHUNK_PREFIX + orjson.dumps(text) + FRAME_END
+
+
+def error_frame(message: str) -> bytes:
+    """One SSE data frame reporting an error."""
+    return ERROR_PREFIX + orjson.dumps(message) + FRAME_END
+
+
+class SSEWriter:
+    """
+    Turns a stream of text chunks into coalesced SSE frames.
+
+    Usage:
+        return SSEResponse(SSEWriter(ai_service.chat_stream(...)).frames())
+    """
+
+    def __init__(
+        self,
+        chunks: AsyncIterator[str],
+        coalesce_bytes: Optional[int] = None,
+        coalesce_ms: Optional[float] = None,
+        heartbeat_seconds: Optional[float] = None,
+        max_pending: Optional[int] = None,
+    ):
+        self.chunks = chunks
+        self.coalesce_bytes = coalesce_bytes if coalesce_bytes is not None else settings.SSE_COALESCE_BYTES
+        coalesce_ms = coalesce_ms if coalesce_ms is not None else settings.SSE_COALESCE_MS
+        self.coalesce_window = coalesce_ms / 1000
+        self.heartbeat_seconds = (
+            heartbeat_seconds if heartbeat_seconds is not None else settings.SSE_HEARTBEAT_SECONDS
+        )
+        self.max_pending = max_pending if max_pending is not None else settings.SSE_MAX_PENDING_CHUNKS
+        self.stats = SSEStats()
+
+    async def _pump(self, queue: asyncio.Queue) -> None:
+        """Read the source into the queue; blocks while the queue is full."""
+        try:
+            async for chunk in self.chunks:
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(_Failed(e))
+            return
+        await queue.put(_END)
+
+    def _emit(self, frame: bytes) -> bytes:
+        self.stats.frames += 1
+        self.stats.bytes += len(frame)
+        return frame
+
+    async def frames(self) -> AsyncIterator[bytes]:
+        """Encoded SSE frames, ending with the done (or error) frame."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_pending)
+        pump = asyncio.create_task(self._pump(queue))
+        pending: List[str] = []
+        pending_size = 0
+        deadline = 0.0
+        first = True
+
+        try:
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    # Only pay for a timer when there is nothing to read yet
+                    timeout = deadline - time.monotonic() if pending else self.heartbeat_seconds
+                    try:
+                        item = await asyncio.wait_for(queue.get(), max(timeout, 0))
+                    except asyncio.TimeoutError:
+                        if pending:
+                            yield self._emit(chunk_frame("".join(pending)))
+                            pending, pending_size = [], 0
+                        else:
+                            self.stats.heartbeats += 1
+                            yield self._emit(HEARTBEAT_FRAME)
+                        continue
+
+                if item is _END or isinstance(item, _Failed):
+                    if pending:
+                        yield self._emit(chunk_frame("".join(pending)))
+                    if item is _END:
+                        yield self._emit(DONE_FRAME)
+                    else:
+                        yield self._emit(error_frame(str(item.error)))
+                    return
+
+                self.stats.chunks += 1
+                if first:
+                    first = False
+                    yield self._emit(chunk_frame(item))
+                    continue
+
+                if not pending:
+                    deadline = time.monotonic() + self.coalesce_window
+                pending.append(item)
+                pending_size += len(item)
+                if pending_size >= self.coalesce_bytes or time.monotonic() >= deadline:
+                    yield self._emit(chunk_frame("".join(pending)))
+                    pending, pending_size = [], 0
+        finally:
+            # Client gone or stream finished: stop reading the provider and
+            # let it finish its cleanup, even if our own task is being cancelled
+            pump.cancel()
+            with anyio.CancelScope(shield=True):
+                await asyncio.gather(pump, return_exceptions=True)
+
+
+class SSEResponse(StreamingResponse):
+    """
+    Event stream that is torn down as soon as the client goes away.
+
+    StreamingResponse notices a disconnect, but leaves a body iterator that
+    is suspended mid-stream for the garbage collector to close - until then
+    the provider keeps generating. This closes it explicitly.
+    """
+
+    media_type = "text/event-stream"
+
+    def __init__(self, content: AsyncIterator[bytes], status_code: int = 200):
+        super().__init__(content, status_code=status_code, headers=SSE_HEADERS)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            aclose = getattr(self.body_iterator, "aclose", None)
+            if aclose is not None:
+                with anyio.CancelScope(shield=True):
+                    await aclose()
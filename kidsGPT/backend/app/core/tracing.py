@@ -0,0 +1,252 @@
+"""
+Request-scoped tracing spans, exposed as a Server-Timing header.
+
+Off by default (TRACING_ENABLED). When off, span() is one context
+variable lookup returning a shared no-op, so call sites can stay in hot
+paths. When on, each HTTP request gets a trace; spans nest through
+context variables (tasks spawned inside a span inherit it) and the
+breakdown is sent as Server-Timing. Finished traces can also be written
+as OpenTelemetry-style JSON lines to TRACING_EXPORT_PATH.
+"""
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _new_id(size: int) -> str:
+    return os.urandom(size).hex()
+
+
+class Span:
+    """A timed operation inside a trace."""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "attributes", "start_ns", "end_ns", "_token")
+
+    def __init__(self, trace: "Trace", name: str, attributes: Dict[str, Any], parent_id: Optional[str] = None):
+        self.trace = trace
+        self.name = name
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = 0
+        self.end_ns = 0
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def __enter__(self) -> "Span":
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else self.trace.root_id
+        self._token = _current_span.set(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end_ns = time.perf_counter_ns()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.trace.spans.append(self)
+        return False
+
+
+class _NoopSpan:
+    """Stand-in returned by span() when no trace is active."""
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """All spans recorded while serving one request."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = _new_id(16)
+        self.root_id = _new_id(8)
+        self.spans: List[Span] = []
+        self.start_ns = time.perf_counter_ns()
+        # perf_counter is monotonic but has no epoch; anchor it once for export
+        self.epoch_offset_ns = time.time_ns() - self.start_ns
+        self.end_ns = 0
+        self.attributes: Dict[str, Any] = {}
+
+    def record(self, name: str, start_ns: int, end_ns: int, **attributes) -> None:
+        """Add an already-finished span (e.g. from a library callback)."""
+        parent = _current_span.get()
+        span = Span(self, name, attributes, parent.span_id if parent is not None else self.root_id)
+        span.start_ns, span.end_ns = start_ns, end_ns
+        self.spans.append(span)
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: total time per span name, in finish order."""
+        totals: "OrderedDict[str, List[float]]" = OrderedDict()
+        for span in self.spans:
+            entry = totals.setdefault(span.name, [0.0, 0])
+            entry[0] += span.duration_ms
+            entry[1] += 1
+
+        parts = []
+        for name, (duration, count) in totals.items():
+            part = f"{name};dur={duration:.2f}"
+            if count > 1:
+                part += f';desc="{count}x"'
+            parts.append(part)
+        parts.append(f"total;dur={(time.perf_counter_ns() - self.start_ns) / 1e6:.2f}")
+        return ", ".join(parts)
+
+    def to_otel(self) -> List[Dict[str, Any]]:
+        """Spans in OpenTelemetry JSON field names, root span first."""
+        def otel_span(span_id, parent_id, name, start_ns, end_ns, attributes):
+            return {
+                "traceId": self.trace_id,
+                "spanId": span_id,
+                "parentSpanId": parent_id or "",
+                "name": name,
+                "startTimeUnixNano": start_ns + self.epoch_offset_ns,
+                "endTimeUnixNano": end_ns + self.epoch_offset_ns,
+                "attributes": attributes,
+            }
+
+        exported = [otel_span(self.root_id, None, self.name, self.start_ns, self.end_ns, self.attributes)]
+        exported.extend(
+            otel_span(span.span_id, span.parent_id, span.name, span.start_ns, span.end_ns, span.attributes)
+            for span in self.spans
+        )
+        return exported
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    """Get the trace of the request being served, if tracing is on."""
+    return _current_trace.get()
+
+
+def span(name: str, **attributes):
+    """
+    Time a block as a child of the current span.
+
+    Usage:
+        with span("filter.input"):
+            result = input_filter.filter(text)
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return Span(trace, name, attributes)
+
+
+class FileSpanExporter:
+    """
+    Appends finished traces to a file as JSON lines (one span per line).
+
+    Lines are buffered and written in batches so the event loop does not
+    hit the disk on every request.
+    """
+
+    def __init__(self, path: str, max_buffer: int = 200, max_age: float = 1.0):
+        self.path = path
+        self.max_buffer = max_buffer
+        self.max_age = max_age
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+
+    def export(self, trace: Trace) -> None:
+        self._buffer.extend(json.dumps(item, default=str) for item in trace.to_otel())
+        if len(self._buffer) >= self.max_buffer or time.monotonic() - self._last_flush >= self.max_age:
+            self.flush()
+
+    def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        lines, self._buffer = self._buffer, []
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write traces to {self.path}: {e}")
+
+
+_exporter: Optional[FileSpanExporter] = None
+
+
+def get_exporter() -> Optional[FileSpanExporter]:
+    """Exporter for TRACING_EXPORT_PATH, or None when export is off."""
+    global _exporter
+    if not settings.TRACING_EXPORT_PATH:
+        return None
+    if _exporter is None or _exporter.path != settings.TRACING_EXPORT_PATH:
+        if _exporter is not None:
+            _exporter.flush()
+        _exporter = FileSpanExporter(settings.TRACING_EXPORT_PATH)
+    return _exporter
+
+
+def flush_traces() -> None:
+    """Write any buffered spans (call on shutdown)."""
+    if _exporter is not None:
+        _exporter.flush()
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware opening a trace per HTTP request when tracing is on."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(f"{scope['method']} {scope['path']}")
+        token = _current_trace.set(trace)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+                trace.attributes["http.status_code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            trace.end_ns = time.perf_counter_ns()
+            _current_trace.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                trace.attributes["http.route"] = getattr(route, "path", "")
+            exporter = get_exporter()
+            if exporter is not None:
+                exporter.export(trace)
@@ -1,12 +1,23 @@
 """KidsGPT FastAPI Application - Safe AI Learning Companion for Children."""
 
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 
 from app.core.config import settings
-from app.core.database import init_db, close_db
+from app.core.database import async_session_maker, engine, init_db, close_db
+from app.core.jobs import get_job_runner
+from app.core.metrics import CONTENT_TYPE, MetricsMiddleware, render_metrics, track_pool
+from app.core.sql_instrumentation import instrument_engine
+from app.core.tracing import TracingMiddleware, flush_traces
 from app.routers import auth, chat, children, admin
+from app.services.ai_service import get_ai_service
+from app.services.archive import run_archiver
+from app.services.content_dictionary import load_dictionaries
+from app.services.flagging import get_flag_recorder
+from app.services.write_behind import get_write_behind, start_write_behind, stop_write_behind
 
 
 @asynccontextmanager
@@ -16,8 +27,25 @@ async def lifespan(app: FastAPI):
     print(f"Starting {settings.APP_NAME} v{settings.APP_VERSION}")
     await init_db()
     print("Database initialized")
+    await load_dictionaries(async_session_maker)  # Stored message content may reference any of them
+    if settings.WRITE_BEHIND_ENABLED:
+        start_write_behind(async_session_maker)
+    archiver = asyncio.create_task(run_archiver(async_session_maker)) if settings.ARCHIVE_ENABLED else None
+    jobs = get_job_runner()
+    jobs.start()
     yield
     # Shutdown
+    if archiver is not None:
+        archiver.cancel()
+        with suppress(asyncio.CancelledError):
+            await archiver
+    writer = get_write_behind()
+    if writer is not None:
+        await writer.flush()  # Queued turns are stored before their flags are written
+    await get_flag_recorder().drain()
+    await jobs.stop()  # Drains queued jobs first: they may write chat data too
+    await stop_write_behind()  # Every queued chat turn is written before the pool closes
+    flush_traces()
     await close_db()
     print("Database connections closed")
 
@@ -28,6 +56,7 @@ app = FastAPI(
     version=settings.APP_VERSION,
     lifespan=lifespan,
     redirect_slashes=False,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware for frontend
@@ -42,9 +71,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],  # Conversation list paging
 )
 
 
+# Per-request spans and Server-Timing (no-op unless TRACING_ENABLED)
+app.add_middleware(TracingMiddleware)
+
+# Request metrics (outermost, so latency includes the other middleware)
+app.add_middleware(MetricsMiddleware)
+
+# SQL statement stats, slow-query log and pool usage
+instrument_engine(engine)
+track_pool(engine)
+
+
 # Include routers
 app.include_router(auth.router, prefix=f"{settings.API_PREFIX}/auth", tags=["Authentication"])
 app.include_router(children.router, prefix=f"{settings.API_PREFIX}/children", tags=["Children"])
@@ -67,3 +108,19 @@ async def root():
 async def health_check():
     """Health check endpoint."""
     return {"status": "healthy"}
+
+
+@app.get("/health/providers")
+async def provider_health():
+    """AI provider circuit breaker, concurrency and speculation state (for monitoring)."""
+    ai_service = get_ai_service()
+    return {
+        "providers": ai_service.provider_health(),
+        "speculation": ai_service.speculation_stats.snapshot(),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint (per worker process)."""
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
@@ -1,7 +1,13 @@
 """Database models for KidsGPT."""
 
 from app.models.user import User, Child, UserRole, SubscriptionTier
-from app.models.conversation import Conversation, Message, MessageRole
+from app.models.conversation import (
+    ArchivedTranscript, ContentDictionary, Conversation, Message, MessageRole, FinishReason,
+)
+from app.models.daily_stats import ChildDailyStats
+from app.models.id_block import IdBlock
+from app.models.job import Job, JobStatus
+from app.models.usage import UsageDaily, UsageRecord
 
 __all__ = [
     "User",
@@ -11,4 +17,13 @@ __all__ = [
     "Conversation",
     "Message",
     "MessageRole",
+    "FinishReason",
+    "ArchivedTranscript",
+    "ContentDictionary",
+    "ChildDailyStats",
+    "IdBlock",
+    "Job",
+    "JobStatus",
+    "UsageRecord",
+    "UsageDaily",
 ]
@@ -3,10 +3,15 @@
 from datetime import datetime
 from enum import Enum as PyEnum
 from typing import Optional, List
-from sqlalchemy import String, Integer, Boolean, DateTime, ForeignKey, Text, Enum
+from sqlalchemy import (
+    String, Integer, Boolean, DateTime, ForeignKey, Enum, Index, LargeBinary, event, exists, func, select, update,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from app.core.content_codec import CompressedText
 from app.core.database import Base
+from app.models.daily_stats import activity_params, activity_upsert, epoch_minute
+from app.models.user import Child
 
 
 class MessageRole(str, PyEnum):
@@ -16,9 +21,25 @@ class MessageRole(str, PyEnum):
     SYSTEM = "system"
 
 
+class FinishReason(str, PyEnum):
+    """Why an assistant message ended."""
+    STOP = "stop"  # The model finished its answer
+    LENGTH = "length"  # The answer hit max_tokens
+    CANCELLED = "cancelled"  # The client went away mid-answer; content is partial
+    ERROR = "error"  # The provider failed; content is partial or the fallback answer
+
+
 class Conversation(Base):
     """Conversation session model."""
     __tablename__ = "conversations"
+    __table_args__ = (
+        # Keyset reads of a child's conversations (export, pagination)
+        Index("ix_conversations_child_id_id", "child_id", "id"),
+        # Cursor pagination of a child's conversations, newest first
+        Index("ix_conversations_child_id_started_at_id", "child_id", "started_at", "id"),
+        # Admin review of flagged conversations, newest first
+        Index("ix_conversations_is_flagged_started_at", "is_flagged", "started_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     child_id: Mapped[int] = mapped_column(Integer, ForeignKey("children.id"), nullable=False)
@@ -28,25 +49,73 @@ class Conversation(Base):
     is_flagged: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     flag_reason: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
     message_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    archived_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)  # Older messages are in the archive
 
     # Relationships
     child: Mapped["Child"] = relationship("Child", back_populates="conversations")
     messages: Mapped[List["Message"]] = relationship(
         "Message", back_populates="conversation", cascade="all, delete-orphan", order_by="Message.created_at"
     )
+    archive: Mapped[Optional["ArchivedTranscript"]] = relationship(
+        "ArchivedTranscript", cascade="all, delete-orphan", uselist=False
+    )
 
     def __repr__(self) -> str:
         return f"<Conversation(id={self.id}, child_id={self.child_id}, messages={self.message_count})>"
 
 
+@event.listens_for(Conversation, "after_insert")
+def _count_conversation_insert(mapper, connection, target: Conversation) -> None:
+    """Keep Child.conversation_count and the day's rollup in step, in the same flush as the insert."""
+    connection.execute(
+        update(Child.__table__)
+        .where(Child.__table__.c.id == target.child_id)
+        .values(conversation_count=Child.__table__.c.conversation_count + 1)
+    )
+    connection.execute(
+        activity_upsert(connection.dialect.name),
+        [activity_params(target.child_id, target.started_at.date(), conversations=1)],
+    )
+
+
+@event.listens_for(Conversation, "after_delete")
+def _count_conversation_delete(mapper, connection, target: Conversation) -> None:
+    connection.execute(
+        update(Child.__table__)
+        .where(Child.__table__.c.id == target.child_id)
+        .values(conversation_count=Child.__table__.c.conversation_count - 1)
+    )
+
+
+def backfill_conversation_counts(connection) -> None:
+    """
+    Count the conversations of children whose counter reads 0 but who have some.
+
+    Those are children from before the counter existed (the hooks only
+    count from then on); run at startup, before anything is served.
+    """
+    children = Child.__table__
+    conversations = Conversation.__table__
+    owned = conversations.c.child_id == children.c.id
+    connection.execute(
+        update(children)
+        .where(children.c.conversation_count == 0, exists().where(owned))
+        .values(conversation_count=select(func.count()).where(owned).scalar_subquery())
+    )
+
+
 class Message(Base):
     """Individual message model."""
     __tablename__ = "messages"
+    __table_args__ = (
+        # Keyset reads of a conversation's messages
+        Index("ix_messages_conversation_id_id", "conversation_id", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     conversation_id: Mapped[int] = mapped_column(Integer, ForeignKey("conversations.id"), nullable=False)
     role: Mapped[MessageRole] = mapped_column(Enum(MessageRole), nullable=False)
-    content: Mapped[str] = mapped_column(Text, nullable=False)
+    content: Mapped[str] = mapped_column(CompressedText, nullable=False)  # See app.core.content_codec
     is_flagged: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     flag_reason: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
@@ -54,6 +123,7 @@ class Message(Base):
     # AI metadata
     ai_model: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)  # Which model generated response
     tokens_used: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    finish_reason: Mapped[Optional[FinishReason]] = mapped_column(Enum(FinishReason), nullable=True)
 
     # Relationships
     conversation: Mapped["Conversation"] = relationship("Conversation", back_populates="messages")
@@ -63,6 +133,55 @@ class Message(Base):
         return f"<Message(id={self.id}, role={self.role}, content='{content_preview}')>"
 
 
-# Import models in __init__.py for easier access
-# Need to import Child here to resolve forward reference
-from app.models.user import Child
+@event.listens_for(Message, "after_insert")
+def _count_message_insert(mapper, connection, target: Message) -> None:
+    """
+    Add the message to its child's daily rollup, in the same flush as the insert.
+
+    ORM bulk inserts (write-behind batches) skip mapper events and update the rollup themselves.
+    """
+    conversations = Conversation.__table__
+    child_id = select(conversations.c.child_id).where(conversations.c.id == target.conversation_id).scalar_subquery()
+    connection.execute(
+        activity_upsert(connection.dialect.name, child_id=child_id),
+        [activity_params(
+            None,
+            target.created_at.date(),
+            messages=1,
+            flagged=int(target.is_flagged),
+            tokens=target.tokens_used or 0,
+            minutes=[epoch_minute(target.created_at)] if target.role == MessageRole.CHILD else (),
+        )],
+    )
+
+
+class ArchivedTranscript(Base):
+    """
+    Messages of an inactive conversation, moved out of the messages table.
+
+    `payload` is the messages in id order, serialized and compressed as one
+    blob (see app.services.archive). Reads merge it with any live messages.
+    """
+    __tablename__ = "archived_transcripts"
+
+    conversation_id: Mapped[int] = mapped_column(Integer, ForeignKey("conversations.id"), primary_key=True)
+    message_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    payload: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    raw_bytes: Mapped[int] = mapped_column(Integer, nullable=False)  # Uncompressed size, for the ratio
+    archived_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<ArchivedTranscript(conversation_id={self.conversation_id}, messages={self.message_count})>"
+
+
+class ContentDictionary(Base):
+    """A trained compression dictionary for message content. Never modified or deleted once used."""
+    __tablename__ = "content_dictionaries"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    sample_count: Mapped[int] = mapped_column(Integer, nullable=False)  # Messages it was trained on
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<ContentDictionary(id={self.id}, bytes={len(self.data)})>"
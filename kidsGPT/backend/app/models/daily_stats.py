@@ -0,0 +1,124 @@
+"""Per-child daily activity rollup, for parent dashboards."""
+
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Optional, Sequence
+
+from sqlalchemy import Date, ForeignKey, Integer, bindparam, case, or_
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.config import settings
+from app.core.database import Base, upsert_insert
+
+
+class ChildDailyStats(Base):
+    """
+    One child's activity on one (UTC) day, maintained as messages are written.
+
+    Dashboards read one row per day instead of counting messages. Rows are
+    only ever incremented (see activity_upsert); rebuild them from the raw
+    tables with `python -m app.services.daily_stats rebuild`.
+    """
+    __tablename__ = "child_daily_stats"
+
+    child_id: Mapped[int] = mapped_column(Integer, ForeignKey("children.id"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    messages: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # Child and assistant
+    conversations: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # Started that day
+    flagged: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # Messages flagged by the safety filters
+    tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    active_minutes: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_active_minute: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # Minutes since the epoch
+
+    def __repr__(self) -> str:
+        return f"<ChildDailyStats(child_id={self.child_id}, day={self.day}, messages={self.messages})>"
+
+
+def epoch_minute(at: datetime) -> int:
+    """Minutes since the epoch of a naive UTC datetime."""
+    return int(at.replace(tzinfo=timezone.utc).timestamp() // 60)
+
+
+def activity_params(
+    child_id: Optional[int],
+    day: date,
+    messages: int = 0,
+    conversations: int = 0,
+    flagged: int = 0,
+    tokens: int = 0,
+    minutes: Sequence[int] = (),
+) -> Dict[str, Any]:
+    """
+    Parameters for activity_upsert: increments to one child's day.
+
+    Args:
+        minutes: Epoch minutes the child was active at (one per turn)
+
+    Active time is the time between consecutive turns, with gaps longer
+    than STATS_IDLE_MINUTES counted as a new session of one minute.
+    Gaps between the given minutes are credited here; the gap from the
+    row's last_active_minute is credited by the statement.
+    """
+    ordered = sorted(minutes)
+    inner = 0
+    for previous, current in zip(ordered, ordered[1:]):
+        gap = current - previous
+        inner += 1 if gap > settings.STATS_IDLE_MINUTES else gap
+    return {
+        "b_child_id": child_id,
+        "b_day": day,
+        "b_messages": messages,
+        "b_conversations": conversations,
+        "b_flagged": flagged,
+        "b_tokens": tokens,
+        "b_first_minute": ordered[0] if ordered else None,
+        "b_last_minute": ordered[-1] if ordered else None,
+        "b_inner_minutes": inner,
+        "b_new_minutes": 1 + inner if ordered else 0,
+    }
+
+
+def activity_upsert(dialect_name: str, child_id=None):
+    """
+    INSERT ... ON CONFLICT DO UPDATE adding activity_params to a child's day.
+
+    Runs with executemany; works on a sync connection (mapper events) or a session.
+
+    Args:
+        dialect_name: The connection's dialect ("sqlite" or "postgresql")
+        child_id: SQL expression for the child (default: the b_child_id parameter)
+    """
+    insert = upsert_insert(dialect_name)
+    table = ChildDailyStats.__table__
+    first_minute = bindparam("b_first_minute", type_=Integer)
+    last_minute = bindparam("b_last_minute", type_=Integer)
+    gap = first_minute - table.c.last_active_minute
+
+    statement = insert(table).values(
+        child_id=bindparam("b_child_id") if child_id is None else child_id,
+        day=bindparam("b_day"),
+        messages=bindparam("b_messages"),
+        conversations=bindparam("b_conversations"),
+        flagged=bindparam("b_flagged"),
+        tokens=bindparam("b_tokens"),
+        active_minutes=bindparam("b_new_minutes"),
+        last_active_minute=last_minute,
+    )
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.child_id, table.c.day],
+        set_={
+            "messages": table.c.messages + statement.excluded.messages,
+            "conversations": table.c.conversations + statement.excluded.conversations,
+            "flagged": table.c.flagged + statement.excluded.flagged,
+            "tokens": table.c.tokens + statement.excluded.tokens,
+            "active_minutes": table.c.active_minutes + case(
+                (first_minute.is_(None), 0),
+                (or_(table.c.last_active_minute.is_(None), gap > settings.STATS_IDLE_MINUTES), 1),
+                (gap > 0, gap),
+                else_=0,
+            ) + bindparam("b_inner_minutes"),
+            "last_active_minute": case(
+                (or_(table.c.last_active_minute.is_(None), last_minute > table.c.last_active_minute), last_minute),
+                else_=table.c.last_active_minute,
+            ),
+        },
+    )
@@ -0,0 +1,17 @@
+"""Id block model, for hi/lo id allocation."""
+
+from sqlalchemy import Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class IdBlock(Base):
+    """Next unreserved id of a table; writers reserve ids from it in blocks."""
+    __tablename__ = "id_blocks"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)  # Table the ids are for
+    next_id: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<IdBlock(name={self.name}, next_id={self.next_id})>"
@@ -0,0 +1,42 @@
+"""Background job model, for jobs that must survive a restart."""
+
+from datetime import datetime
+from enum import Enum as PyEnum
+from typing import Optional
+
+from sqlalchemy import JSON, DateTime, Enum, Index, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class JobStatus(str, PyEnum):
+    """Where a durable job is in its life."""
+    PENDING = "pending"  # Waiting for run_at
+    RUNNING = "running"  # Claimed by a worker until locked_until
+    DONE = "done"
+    FAILED = "failed"  # Out of attempts
+
+
+class Job(Base):
+    """A durable background job (see app.core.jobs)."""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # The poller's claim query: due jobs by status
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(100), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+    status: Mapped[JobStatus] = mapped_column(Enum(JobStatus), default=JobStatus.PENDING, nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False)
+    run_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<Job(id={self.id}, name={self.name}, status={self.status})>"
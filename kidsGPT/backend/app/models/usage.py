@@ -0,0 +1,59 @@
+"""AI token usage ledger and its pre-aggregated daily totals."""
+
+from datetime import date, datetime
+
+from sqlalchemy import Date, DateTime, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class UsageRecord(Base):
+    """
+    What one chat turn cost: the model that answered and its token counts.
+
+    Append-only, and without foreign keys: costs outlive deleted profiles and archived chats.
+    """
+    __tablename__ = "usage_ledger"
+    __table_args__ = (
+        Index("ix_usage_ledger_child_id_created_at", "child_id", "created_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    parent_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    child_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    conversation_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    message_id: Mapped[int] = mapped_column(Integer, nullable=False)  # The assistant message
+    model: Mapped[str] = mapped_column(String(100), nullable=False)
+    input_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    output_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    cached_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # Part of input_tokens
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<UsageRecord(id={self.id}, model={self.model}, tokens={self.input_tokens + self.output_tokens})>"
+
+
+class UsageDaily(Base):
+    """
+    Ledger totals per family, UTC day and model, updated with every ledger write.
+
+    Per-parent, per-day, per-model and per-tier views all read this table
+    instead of the ledger (see app.services.usage).
+    """
+    __tablename__ = "usage_daily"
+    __table_args__ = (
+        # System-wide views (by model, by tier) over a date range
+        Index("ix_usage_daily_day", "day"),
+    )
+
+    parent_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    model: Mapped[str] = mapped_column(String(100), primary_key=True)
+    turns: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    input_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    output_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    cached_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<UsageDaily(parent_id={self.parent_id}, day={self.day}, model={self.model}, turns={self.turns})>"
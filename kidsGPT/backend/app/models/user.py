@@ -11,6 +11,11 @@ from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.core.database import Base
 
 
+def utc_today() -> date:
+    """The current quota day. Daily limits reset at UTC midnight, the day boundary of the daily stats and usage rollups."""
+    return datetime.utcnow().date()
+
+
 def generate_kid_pin() -> str:
     """Generate a unique 6-digit PIN for kid login."""
     return ''.join(random.choices(string.digits, k=6))
@@ -68,6 +73,9 @@ class Child(Base):
     learning_goals: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)  # Parent-defined goals
     daily_message_limit: Mapped[int] = mapped_column(Integer, default=50, nullable=False)
     messages_today: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    conversation_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # Maintained on insert/delete
+    daily_token_limit: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # None = no token budget
+    tokens_today: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # Resets with messages_today
     last_message_date: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
@@ -80,15 +88,17 @@ class Child(Base):
     conversations: Mapped[List["Conversation"]] = relationship(
         "Conversation", back_populates="child", cascade="all, delete-orphan"
     )
+    daily_stats: Mapped[List["ChildDailyStats"]] = relationship("ChildDailyStats", cascade="all, delete-orphan")
 
     def __repr__(self) -> str:
         return f"<Child(id={self.id}, name={self.name}, age={self.age})>"
 
     def reset_daily_messages(self) -> None:
-        """Reset daily message count if it's a new day."""
-        today = date.today()
+        """Reset daily message and token counts if it's a new day."""
+        today = utc_today()
         if self.last_message_date != today:
             self.messages_today = 0
+            self.tokens_today = 0
             self.last_message_date = today
 
     def can_send_message(self) -> bool:
@@ -101,6 +111,16 @@ class Child(Base):
         self.reset_daily_messages()
         self.messages_today += 1
 
+    def within_token_budget(self) -> bool:
+        """Check if the child has tokens left today (always, without a budget)."""
+        self.reset_daily_messages()
+        return self.daily_token_limit is None or self.tokens_today < self.daily_token_limit
+
+    def add_tokens(self, tokens: int) -> None:
+        """Count tokens used today towards the budget."""
+        self.reset_daily_messages()
+        self.tokens_today += tokens
+
     def regenerate_pin(self) -> str:
         """Generate a new login PIN for this child."""
         self.login_pin = generate_kid_pin()
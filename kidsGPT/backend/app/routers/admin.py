@@ -1,14 +1,18 @@
 """Admin endpoints - System management and oversight."""
 
-from typing import List, Optional
-from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional, Union
+from datetime import date, datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, desc
+from sqlalchemy.orm import selectinload
 from pydantic import BaseModel
 
 from app.core.database import get_db
+from app.core.responses import PydanticResponse
 from app.models import User, Child, Conversation, Message, UserRole
+from app.services.archive import load_archives
+from app.services.usage import GroupBy, usage_totals
 
 router = APIRouter()
 
@@ -48,6 +52,23 @@ class SystemConfig(BaseModel):
     content_filter_level: str = "strict"
 
 
+class UsageTotal(BaseModel):
+    key: Union[int, date, str]  # parent id, day, model or tier, per group_by
+    turns: int
+    input_tokens: int
+    output_tokens: int
+    cached_tokens: int
+    estimated_cost_usd: Optional[float]  # None if a model has no price in AI_TOKEN_PRICES
+
+
+class ParentUsage(BaseModel):
+    parent_id: int
+    start: date
+    end: date
+    by_model: List[UsageTotal]
+    by_day: List[UsageTotal]
+
+
 # In-memory config (would be database in production)
 _system_config = SystemConfig()
 
@@ -87,7 +108,7 @@ async def get_admin_stats(
         select(func.count(Conversation.id)).where(Conversation.is_flagged == True)
     )
 
-    return AdminStats(
+    return PydanticResponse(AdminStats(
         total_users=users_count.scalar() or 0,
         total_children=children_count.scalar() or 0,
         total_conversations=conv_count.scalar() or 0,
@@ -95,7 +116,7 @@ async def get_admin_stats(
         messages_today=messages_today.scalar() or 0,
         active_users_today=0,  # Simplified for MVP
         flagged_conversations=flagged.scalar() or 0,
-    )
+    ))
 
 
 @router.get("/users", response_model=List[UserListItem])
@@ -118,23 +139,32 @@ async def list_users(
         select(User).order_by(desc(User.created_at)).limit(limit).offset(offset)
     )
     users = users_result.scalars().all()
+    user_ids = [user.id for user in users]
 
-    user_items = []
-    for user in users:
-        # Count children
+    # Stats for the whole page at once (one grouped query each, not one per user)
+    children_counts = {}
+    message_counts = {}
+    if user_ids:
         children_result = await db.execute(
-            select(func.count(Child.id)).where(Child.parent_id == user.id)
+            select(Child.parent_id, func.count(Child.id))
+            .where(Child.parent_id.in_(user_ids))
+            .group_by(Child.parent_id)
         )
-        children_count = children_result.scalar() or 0
+        children_counts = dict(children_result.all())
 
-        # Count messages
         msg_result = await db.execute(
-            select(func.count(Message.id))
+            select(Child.parent_id, func.count(Message.id))
             .join(Conversation, Message.conversation_id == Conversation.id)
             .join(Child, Conversation.child_id == Child.id)
-            .where(Child.parent_id == user.id)
+            .where(Child.parent_id.in_(user_ids))
+            .group_by(Child.parent_id)
         )
-        total_messages = msg_result.scalar() or 0
+        message_counts = dict(msg_result.all())
+
+    user_items = []
+    for user in users:
+        children_count = children_counts.get(user.id, 0)
+        total_messages = message_counts.get(user.id, 0)
 
         user_items.append(UserListItem(
             id=user.id,
@@ -148,7 +178,7 @@ async def list_users(
             total_messages=total_messages,
         ))
 
-    return user_items
+    return PydanticResponse(user_items)
 
 
 @router.patch("/users/{user_id}/subscription")
@@ -221,29 +251,25 @@ async def get_flagged_conversations(
     if not admin_result.scalar_one_or_none():
         raise HTTPException(status_code=403, detail="Admin access required")
 
+    # Children and messages are loaded with one IN query each, not one per conversation
     result = await db.execute(
         select(Conversation)
+        .options(selectinload(Conversation.child), selectinload(Conversation.messages))
         .where(Conversation.is_flagged == True)
         .order_by(desc(Conversation.started_at))
         .limit(limit)
     )
     conversations = result.scalars().all()
+    # Flagged conversations are not archived, but one flagged after archival has older messages in its archive
+    archives = await load_archives(db, [conv.id for conv in conversations if conv.archived_at is not None])
 
     flagged_list = []
     for conv in conversations:
-        # Get child info
-        child_result = await db.execute(
-            select(Child).where(Child.id == conv.child_id)
-        )
-        child = child_result.scalar_one_or_none()
-
-        # Get messages
-        msg_result = await db.execute(
-            select(Message)
-            .where(Message.conversation_id == conv.id)
-            .order_by(Message.created_at)
-        )
-        messages = msg_result.scalars().all()
+        child = conv.child
+        # Archived records first, then live messages (ordered by created_at: relationship order_by)
+        messages = archives.get(conv.id, []) + [
+            {"role": msg.role, "content": msg.content, "is_flagged": msg.is_flagged} for msg in conv.messages
+        ]
 
         flagged_list.append({
             "id": conv.id,
@@ -254,9 +280,9 @@ async def get_flagged_conversations(
             "flag_reason": conv.flag_reason,
             "messages": [
                 {
-                    "role": msg.role.value if hasattr(msg.role, 'value') else str(msg.role),
-                    "content": msg.content,
-                    "is_flagged": msg.is_flagged,
+                    "role": msg["role"].value if hasattr(msg["role"], 'value') else str(msg["role"]),
+                    "content": msg["content"],
+                    "is_flagged": msg["is_flagged"],
                 }
                 for msg in messages
             ]
@@ -331,3 +357,49 @@ async def create_admin_user(
         "role": "admin",
         "message": "Admin user created successfully"
     }
+
+
+@router.get("/usage", response_model=List[UsageTotal])
+async def get_usage(
+    admin_id: int,
+    group_by: GroupBy = "model",
+    days: int = Query(30, ge=1, le=366),
+    db: AsyncSession = Depends(get_db)
+):
+    """Token usage and estimated cost over the last `days` UTC days, per parent, model, tier or day."""
+    # Verify admin
+    admin_result = await db.execute(
+        select(User).where(User.id == admin_id, User.role == UserRole.ADMIN)
+    )
+    if not admin_result.scalar_one_or_none():
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    end = datetime.utcnow().date()
+    totals = await usage_totals(db, group_by, end - timedelta(days=days - 1), end)
+    return PydanticResponse([UsageTotal(**row) for row in totals])
+
+
+@router.get("/usage/parents/{parent_id}", response_model=ParentUsage)
+async def get_parent_usage(
+    parent_id: int,
+    admin_id: int,
+    days: int = Query(30, ge=1, le=366),
+    db: AsyncSession = Depends(get_db)
+):
+    """One family's token usage and estimated cost, per model and per day."""
+    # Verify admin
+    admin_result = await db.execute(
+        select(User).where(User.id == admin_id, User.role == UserRole.ADMIN)
+    )
+    if not admin_result.scalar_one_or_none():
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+    return PydanticResponse(ParentUsage(
+        parent_id=parent_id,
+        start=start,
+        end=end,
+        by_model=[UsageTotal(**row) for row in await usage_totals(db, "model", start, end, parent_id)],
+        by_day=[UsageTotal(**row) for row in await usage_totals(db, "day", start, end, parent_id)],
+    ))
@@ -9,6 +9,7 @@ from sqlalchemy.orm import selectinload
 from app.core.database import get_db
 from app.core.firebase import verify_id_token, is_firebase_configured
 from app.core.dependencies import get_current_user
+from app.core.responses import PydanticResponse
 from app.models import User, Child
 from app.schemas import (
     UserCreate, UserResponse, FirebaseLoginRequest,
@@ -247,7 +248,7 @@ async def kid_login(
     child.reset_daily_messages()
     await db.flush()
 
-    return KidLoginResponse(
+    return PydanticResponse(KidLoginResponse(
         child_id=child.id,
         child_name=child.name,
         age=child.age,
@@ -256,4 +257,4 @@ async def kid_login(
         messages_remaining=child.daily_message_limit - child.messages_today,
         can_send_message=child.can_send_message(),
         parent_name=child.parent.display_name
-    )
+    ))
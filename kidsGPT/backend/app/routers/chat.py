@@ -1,21 +1,40 @@
 """Chat endpoints - core KidsGPT functionality."""
 
+import asyncio
+import logging
+from contextlib import aclosing
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
 from fastapi.responses import StreamingResponse
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
-import json
-
-from app.core.database import get_db
-from app.models import Child, Conversation, Message, MessageRole
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy import and_, or_, select, desc
+
+from app.core.config import settings
+from app.core.database import get_db, get_session_factory
+from app.core.metrics import QUOTA_REJECTIONS
+from app.core.pagination import (
+    NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, InvalidCursor, decode_cursor, encode_cursor,
+)
+from app.core.responses import PydanticResponse
+from app.core.sse import SSEResponse, SSEWriter
+from app.models import Child, Conversation, FinishReason, Message, MessageRole
+from app.models.user import utc_today
 from app.schemas import (
     ChatRequest, ChatResponse, MessageResponse,
     ConversationResponse, ConversationWithMessages, ConversationHistory
 )
-from app.services.ai_service import get_ai_service
+from app.services.ai_service import get_ai_service, FALLBACK_RESPONSE
+from app.services.archive import load_recent, load_transcript
+from app.services.chat_session import ChatSession, ChatSessionError, count_turn
+from app.services.daily_stats import day_stats
+from app.services.flagging import get_flag_recorder
+from app.services.transcript_export import EXPORT_FORMATS, MEDIA_TYPES, export_transcript
+from app.services.usage import record_usage, usage_entry
+from app.services.write_behind import get_write_behind
 from ai.providers.base import ChatMessage
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
@@ -49,11 +68,19 @@ async def send_message(
 
     # Check daily message limit
     if not child.can_send_message():
+        QUOTA_REJECTIONS.inc(("daily_messages",))
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail=f"Daily message limit ({child.daily_message_limit}) reached. Try again tomorrow!"
         )
 
+    if not child.within_token_budget():
+        QUOTA_REJECTIONS.inc(("daily_tokens",))
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Daily token budget ({child.daily_token_limit}) reached. Try again tomorrow!"
+        )
+
     # Get or create conversation
     conversation: Conversation
     if request.conversation_id:
@@ -78,26 +105,25 @@ async def send_message(
         db.add(conversation)
         await db.flush()
 
-    # Get conversation history for context
-    history_result = await db.execute(
-        select(Message)
-        .where(Message.conversation_id == conversation.id)
-        .order_by(Message.created_at)
-        .limit(20)  # Limit context window
-    )
-    history_messages = history_result.scalars().all()
+    # Get conversation history for context, archived messages included
+    history = await load_recent(db, conversation, 20)  # Limit context window
 
     # Build message history for AI
     ai_messages: List[ChatMessage] = []
-    for msg in history_messages:
-        role = "user" if msg.role == MessageRole.CHILD else "assistant"
-        ai_messages.append(ChatMessage(role=role, content=msg.content))
+    for msg_role, content in history:
+        role = "user" if msg_role == MessageRole.CHILD else "assistant"
+        ai_messages.append(ChatMessage(role=role, content=content))
 
     # Add current message
     ai_messages.append(ChatMessage(role="user", content=request.message))
 
+    # Ids come from the allocator while write-behind is on, so they never collide with its batches
+    writer = get_write_behind()
+    message_id, response_id = await writer.allocator.allocate(2) if writer is not None else (None, None)
+
     # Save child's message
     child_message = Message(
+        id=message_id,
         conversation_id=conversation.id,
         role=MessageRole.CHILD,
         content=request.message,
@@ -117,40 +143,57 @@ async def send_message(
         )
     except Exception as e:
         # Log error and return friendly message
-        print(f"AI Error: {e}")
-        ai_response_content = (
-            "Oops! My brain got a little confused there. "
-            "Can you try asking me again? I want to help!"
-        )
+        logger.error(f"AI Error: {e}")
+        ai_response_content = FALLBACK_RESPONSE
         ai_model = "error"
         tokens_used = 0
+        finish_reason = FinishReason.ERROR
+        flags = []
     else:
         ai_response_content = ai_response.content
         ai_model = ai_response.model
         tokens_used = ai_response.tokens_used
+        finish_reason = FinishReason.STOP
+        flags = ai_response.flags
 
     # Save AI response
     assistant_message = Message(
+        id=response_id,
         conversation_id=conversation.id,
         role=MessageRole.ASSISTANT,
         content=ai_response_content,
         ai_model=ai_model,
         tokens_used=tokens_used,
+        finish_reason=finish_reason,
     )
     db.add(assistant_message)
     conversation.message_count += 1
 
-    # Update child's daily message count
-    child.increment_message_count()
+    # Count the turn; a concurrent turn may have used up the quota since the check above
+    try:
+        counters = await count_turn(db, child.id, tokens_used)
+    except ChatSessionError as e:
+        if e.quota is not None:
+            QUOTA_REJECTIONS.inc((e.quota,))
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
     await db.flush()
     await db.refresh(child_message)
     await db.refresh(assistant_message)
 
+    if finish_reason != FinishReason.ERROR:
+        await record_usage(db, [usage_entry(
+            child.parent_id, child.id, conversation.id, assistant_message.id, ai_model,
+            ai_response.input_tokens, ai_response.output_tokens, ai_response.cached_tokens,
+        )])
+
+    # Filter verdicts are written by a background batch, after this request commits
+    get_flag_recorder().record_turn(conversation.id, child_message.id, assistant_message.id, flags)
+
     # Calculate remaining messages
-    messages_remaining = child.daily_message_limit - child.messages_today
+    messages_remaining = counters.daily_message_limit - counters.messages_today
 
-    return ChatResponse(
+    return PydanticResponse(ChatResponse(
         conversation_id=conversation.id,
         message=MessageResponse(
             id=child_message.id,
@@ -167,43 +210,66 @@ async def send_message(
             content=assistant_message.content,
             is_flagged=assistant_message.is_flagged,
             created_at=assistant_message.created_at,
+            finish_reason=assistant_message.finish_reason,
         ),
         messages_remaining_today=messages_remaining,
-    )
+    ))
 
 
 @router.get("/conversations/{child_id}", response_model=List[ConversationResponse])
 async def list_conversations(
     child_id: int,
     parent_id: int,  # For verification
-    limit: int = 20,
-    offset: int = 0,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),  # Legacy paging; ignored when a cursor is given
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
-    """List all conversations for a child (parent view)."""
-    # Verify parent owns child
+    """
+    List a child's conversations, newest first (parent view).
+
+    Pass the X-Next-Cursor response header back as `cursor` to get the
+    next page; the header is absent on the last page. X-Total-Count is the
+    child's conversation count.
+    """
+    # Verify parent owns child (the count is read from the row, not the identity map)
     result = await db.execute(
-        select(Child).where(Child.id == child_id, Child.parent_id == parent_id)
+        select(Child.conversation_count).where(Child.id == child_id, Child.parent_id == parent_id)
     )
-    child = result.scalar_one_or_none()
+    total_count = result.scalar_one_or_none()
 
-    if not child:
+    if total_count is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Child not found"
         )
 
-    # Get conversations
-    conv_result = await db.execute(
+    query = (
         select(Conversation)
         .where(Conversation.child_id == child_id)
-        .order_by(desc(Conversation.started_at))
+        .order_by(desc(Conversation.started_at), desc(Conversation.id))
         .limit(limit)
-        .offset(offset)
     )
-    conversations = conv_result.scalars().all()
-
-    return [
+    if cursor is not None:
+        try:
+            started_at, last_id = decode_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        query = query.where(or_(
+            Conversation.started_at < started_at,
+            and_(Conversation.started_at == started_at, Conversation.id < last_id),
+        ))
+    elif offset:
+        query = query.offset(offset)
+
+    conversations = (await db.execute(query)).scalars().all()
+
+    headers = {TOTAL_COUNT_HEADER: str(total_count)}
+    if len(conversations) == limit:
+        last = conversations[-1]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(last.started_at, last.id)
+
+    return PydanticResponse([
         ConversationResponse(
             id=conv.id,
             child_id=conv.child_id,
@@ -214,7 +280,7 @@ async def list_conversations(
             message_count=conv.message_count,
         )
         for conv in conversations
-    ]
+    ], headers=headers)
 
 
 @router.get("/conversation/{conversation_id}", response_model=ConversationWithMessages)
@@ -251,15 +317,10 @@ async def get_conversation(
             detail="Access denied"
         )
 
-    # Get messages
-    msg_result = await db.execute(
-        select(Message)
-        .where(Message.conversation_id == conversation_id)
-        .order_by(Message.created_at)
-    )
-    messages = msg_result.scalars().all()
+    # Get messages (archived ones first, if the conversation has been archived)
+    messages = await load_transcript(db, conversation)
 
-    return ConversationWithMessages(
+    return PydanticResponse(ConversationWithMessages(
         id=conversation.id,
         child_id=conversation.child_id,
         title=conversation.title,
@@ -269,15 +330,54 @@ async def get_conversation(
         message_count=conversation.message_count,
         messages=[
             MessageResponse(
-                id=msg.id,
-                conversation_id=msg.conversation_id,
-                role=msg.role,
-                content=msg.content,
-                is_flagged=msg.is_flagged,
-                created_at=msg.created_at,
+                id=msg["id"],
+                conversation_id=msg["conversation_id"],
+                role=msg["role"],
+                content=msg["content"],
+                is_flagged=msg["is_flagged"],
+                created_at=msg["created_at"],
             )
             for msg in messages
         ],
+    ))
+
+
+@router.get("/export/{child_id}")
+async def export_transcripts(
+    child_id: int,
+    parent_id: int,  # For verification
+    format: str = Query("ndjson", description="ndjson or csv"),
+    gzip: bool = False,
+    db: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+):
+    """
+    Download all of a child's conversations and messages (parent only).
+
+    The body is streamed from keyset batches, so memory use stays constant
+    however long the history. With gzip=true the download is a .gz file.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}"
+        )
+
+    # Verify parent owns this child
+    result = await db.execute(
+        select(Child.id).where(Child.id == child_id, Child.parent_id == parent_id)
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Child not found"
+        )
+
+    filename = f"child-{child_id}-transcripts.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        export_transcript(session_factory, child_id, format, gzip=gzip),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
@@ -301,6 +401,7 @@ async def get_today_stats(
     # Reset if new day
     child.reset_daily_messages()
     await db.flush()
+    today = await day_stats(db, child.id, utc_today())
 
     return {
         "child_id": child.id,
@@ -309,18 +410,25 @@ async def get_today_stats(
         "daily_limit": child.daily_message_limit,
         "messages_remaining": child.daily_message_limit - child.messages_today,
         "can_send_message": child.can_send_message(),
+        "tokens_today": child.tokens_today,
+        "daily_token_limit": child.daily_token_limit,
+        "conversations_today": today["conversations"],
+        "active_minutes_today": today["active_minutes"],
     }
 
 
 @router.post("/stream", include_in_schema=True)
 async def stream_message(
     request: ChatRequest,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker = Depends(get_session_factory),
 ):
     """
     Stream a chat response (for real-time UI).
 
-    Returns Server-Sent Events stream.
+    Returns Server-Sent Events stream. The turn is saved when the stream
+    ends; if the client disconnects first, generation is cancelled and the
+    partial answer is saved with finish_reason "cancelled".
     """
     # Get child profile
     result = await db.execute(
@@ -335,37 +443,123 @@ async def stream_message(
         )
 
     if not child.can_send_message():
+        QUOTA_REJECTIONS.inc(("daily_messages",))
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Daily message limit reached"
         )
 
-    async def generate():
-        """Generate SSE stream."""
-        ai_service = get_ai_service()
+    if not child.within_token_budget():
+        QUOTA_REJECTIONS.inc(("daily_tokens",))
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Daily token budget ({child.daily_token_limit}) reached. Try again tomorrow!"
+        )
+
+    session = ChatSession(session_factory, child)
+    if request.conversation_id:
+        conversation = await db.scalar(
+            select(Conversation).where(
+                Conversation.id == request.conversation_id,
+                Conversation.child_id == request.child_id
+            )
+        )
+        if not conversation:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Conversation not found"
+            )
+        session.conversation_id = conversation.id
+
+    # Only the current message is sent as context for now
+    return SSEResponse(SSEWriter(session.turn(request.message)).frames())
 
-        # Build simple message list (just the current message for now)
-        ai_messages = [ChatMessage(role="user", content=request.message)]
 
-        try:
-            async for chunk in ai_service.chat_stream(
-                child_age=child.age,
-                messages=ai_messages,
-                child_name=child.name,
-                interests=child.interests or [],
-                learning_goals=child.learning_goals or [],
-            ):
-                yield f"data: {json.dumps({'chunk': chunk})}\n\n"
-
-            yield f"data: {json.dumps({'done': True})}\n\n"
-        except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+@router.websocket("/ws")
+async def chat_websocket(
+    websocket: WebSocket,
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+):
+    """
+    Chat over one WebSocket for a whole session.
 
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-        }
-    )
+    The child signs in once and the profile, quota and recent history stay
+    in memory, so each turn only streams the answer and writes it through.
+
+    Protocol (JSON text frames):
+        -> {"type": "auth", "pin": "123456", "conversation_id": null}
+        <- {"type": "ready", "child_id", "child_name", "conversation_id", "messages_remaining"}
+        -> {"type": "message", "message": "Why is the sky blue?"}
+        <- {"type": "chunk", "chunk": "..."} (repeated)
+        <- {"type": "done", "conversation_id", "message_id", "response_id", "messages_remaining"}
+        <- {"type": "error", "status": 429, "detail": "..."} (turn refused; socket stays open)
+
+    A failed sign-in sends an error and closes with 1008 (policy violation).
+    """
+    await websocket.accept()
+
+    try:
+        auth = await asyncio.wait_for(websocket.receive_json(), settings.WS_AUTH_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Authentication timed out")
+        return
+    except (WebSocketDisconnect, ValueError):
+        return
+
+    try:
+        if not isinstance(auth, dict) or auth.get("type") != "auth" or not isinstance(auth.get("pin"), str):
+            raise ChatSessionError(401, "First message must be {\"type\": \"auth\", \"pin\": ...}")
+        session = await ChatSession.open(session_factory, auth["pin"], auth.get("conversation_id"))
+    except ChatSessionError as e:
+        await websocket.send_json({"type": "error", "status": e.status_code, "detail": e.detail})
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail[:120])
+        return
+
+    await websocket.send_json({
+        "type": "ready",
+        "child_id": session.child_id,
+        "child_name": session.child_name,
+        "conversation_id": session.conversation_id,
+        "messages_remaining": session.messages_remaining,
+    })
+
+    try:
+        while True:
+            try:
+                incoming = await websocket.receive_json()
+            except ValueError:
+                await websocket.send_json({"type": "error", "status": 400, "detail": "Invalid JSON"})
+                continue
+
+            if not isinstance(incoming, dict) or incoming.get("type") != "message":
+                text = None
+            else:
+                text = incoming.get("message")
+            if not isinstance(text, str) or not 1 <= len(text) <= 2000:
+                await websocket.send_json(
+                    {"type": "error", "status": 422, "detail": "Expected {\"type\": \"message\", \"message\": 1-2000 chars}"}
+                )
+                continue
+
+            try:
+                # aclosing: if a send fails because the child left, the turn is
+                # closed at once - cancelling generation and saving the partial answer
+                async with aclosing(session.turn(text)) as chunks:
+                    async for chunk in chunks:
+                        await websocket.send_json({"type": "chunk", "chunk": chunk})
+            except ChatSessionError as e:
+                if e.quota is not None:
+                    QUOTA_REJECTIONS.inc((e.quota,))
+                await websocket.send_json({"type": "error", "status": e.status_code, "detail": e.detail})
+                continue
+
+            turn = session.last_turn
+            await websocket.send_json({
+                "type": "done",
+                "conversation_id": turn.conversation_id,
+                "message_id": turn.message_id,
+                "response_id": turn.response_id,
+                "messages_remaining": turn.messages_remaining,
+            })
+    except WebSocketDisconnect:
+        pass
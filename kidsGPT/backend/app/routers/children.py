@@ -1,13 +1,15 @@
 """Children profile management endpoints."""
 
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 
 from app.core.database import get_db
-from app.models import User, Child, Conversation, Message
-from app.schemas import ChildCreate, ChildUpdate, ChildResponse, ChildWithStats
+from app.core.responses import PydanticResponse
+from app.models import User, Child
+from app.schemas import ActivityTrend, ChildCreate, ChildUpdate, ChildResponse, ChildWithStats
+from app.services.daily_stats import activity_trend, message_totals
 
 router = APIRouter()
 
@@ -60,6 +62,7 @@ async def create_child(
         interests=child_data.interests,
         learning_goals=child_data.learning_goals,
         daily_message_limit=child_data.daily_message_limit,
+        daily_token_limit=child_data.daily_token_limit,
     )
     db.add(child)
     await db.flush()
@@ -75,26 +78,22 @@ async def list_children(
 ):
     """List all children for a parent with stats."""
     result = await db.execute(
-        select(Child).where(Child.parent_id == parent_id).order_by(Child.created_at)
+        select(Child)
+        .where(Child.parent_id == parent_id)
+        .order_by(Child.created_at)
+        .execution_options(populate_existing=True)  # conversation_count is updated outside the ORM
     )
     children = result.scalars().all()
+    child_ids = [child.id for child in children]
+
+    # Totals come from the child row and the daily rollup, not from counting messages
+    message_counts = await message_totals(db, child_ids)
 
     # Build response with stats
     children_with_stats = []
     for child in children:
-        # Get conversation count
-        conv_result = await db.execute(
-            select(func.count(Conversation.id)).where(Conversation.child_id == child.id)
-        )
-        total_conversations = conv_result.scalar() or 0
-
-        # Get message count
-        msg_result = await db.execute(
-            select(func.count(Message.id))
-            .join(Conversation)
-            .where(Conversation.child_id == child.id)
-        )
-        total_messages = msg_result.scalar() or 0
+        total_conversations = child.conversation_count
+        total_messages = message_counts.get(child.id, 0)
 
         child_data = ChildWithStats(
             id=child.id,
@@ -107,6 +106,8 @@ async def list_children(
             learning_goals=child.learning_goals,
             daily_message_limit=child.daily_message_limit,
             messages_today=child.messages_today,
+            daily_token_limit=child.daily_token_limit,
+            tokens_today=child.tokens_today,
             last_message_date=child.last_message_date,
             is_active=child.is_active,
             created_at=child.created_at,
@@ -116,7 +117,7 @@ async def list_children(
         )
         children_with_stats.append(child_data)
 
-    return children_with_stats
+    return PydanticResponse(children_with_stats)
 
 
 @router.get("/{child_id}", response_model=ChildWithStats)
@@ -127,7 +128,9 @@ async def get_child(
 ):
     """Get a specific child profile with stats."""
     result = await db.execute(
-        select(Child).where(Child.id == child_id, Child.parent_id == parent_id)
+        select(Child)
+        .where(Child.id == child_id, Child.parent_id == parent_id)
+        .execution_options(populate_existing=True)  # conversation_count is updated outside the ORM
     )
     child = result.scalar_one_or_none()
 
@@ -137,20 +140,11 @@ async def get_child(
             detail="Child not found"
         )
 
-    # Get stats
-    conv_result = await db.execute(
-        select(func.count(Conversation.id)).where(Conversation.child_id == child.id)
-    )
-    total_conversations = conv_result.scalar() or 0
-
-    msg_result = await db.execute(
-        select(func.count(Message.id))
-        .join(Conversation)
-        .where(Conversation.child_id == child.id)
-    )
-    total_messages = msg_result.scalar() or 0
+    # Totals come from the child row and the daily rollup, not from counting messages
+    total_conversations = child.conversation_count
+    total_messages = (await message_totals(db, [child.id])).get(child.id, 0)
 
-    return ChildWithStats(
+    return PydanticResponse(ChildWithStats(
         id=child.id,
         parent_id=child.parent_id,
         name=child.name,
@@ -161,13 +155,42 @@ async def get_child(
         learning_goals=child.learning_goals,
         daily_message_limit=child.daily_message_limit,
         messages_today=child.messages_today,
+        daily_token_limit=child.daily_token_limit,
+        tokens_today=child.tokens_today,
         last_message_date=child.last_message_date,
         is_active=child.is_active,
         created_at=child.created_at,
         total_conversations=total_conversations,
         total_messages=total_messages,
         can_send_message=child.can_send_message(),
+    ))
+
+
+@router.get("/{child_id}/trend", response_model=ActivityTrend)
+async def get_child_trend(
+    child_id: int,
+    parent_id: int,  # MVP: pass directly. Production: verify ownership via token
+    days: int = Query(7, ge=1, le=90),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a child's activity for each of the last `days` days (one rollup row per day)."""
+    result = await db.execute(
+        select(Child.id).where(Child.id == child_id, Child.parent_id == parent_id)
     )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Child not found"
+        )
+
+    trend = await activity_trend(db, child_id, days)
+    return PydanticResponse(ActivityTrend(
+        child_id=child_id,
+        days=trend,
+        total_messages=sum(day["messages"] for day in trend),
+        total_active_minutes=sum(day["active_minutes"] for day in trend),
+        total_flagged=sum(day["flagged"] for day in trend),
+    ))
 
 
 @router.patch("/{child_id}", response_model=ChildResponse)
@@ -8,6 +8,8 @@ from app.schemas.user import (
     ChildUpdate,
     ChildResponse,
     ChildWithStats,
+    DailyActivity,
+    ActivityTrend,
     FirebaseLoginRequest,
     KidLoginRequest,
     KidLoginResponse,
@@ -33,6 +35,8 @@ __all__ = [
     "ChildUpdate",
     "ChildResponse",
     "ChildWithStats",
+    "DailyActivity",
+    "ActivityTrend",
     "FirebaseLoginRequest",
     "KidLoginRequest",
     "KidLoginResponse",
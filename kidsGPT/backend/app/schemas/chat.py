@@ -4,7 +4,7 @@ from datetime import datetime
 from typing import Optional, List
 from pydantic import BaseModel, Field
 
-from app.models.conversation import MessageRole
+from app.models.conversation import FinishReason, MessageRole
 
 
 # --- Message Schemas ---
@@ -26,6 +26,7 @@ class MessageResponse(MessageBase):
     role: MessageRole
     is_flagged: bool
     created_at: datetime
+    finish_reason: Optional[FinishReason] = None
 
     class Config:
         from_attributes = True
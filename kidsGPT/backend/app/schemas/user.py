@@ -52,6 +52,7 @@ class ChildCreate(ChildBase):
     interests: Optional[List[str]] = None
     learning_goals: Optional[List[str]] = None
     daily_message_limit: int = Field(default=50, ge=1, le=1000)
+    daily_token_limit: Optional[int] = Field(None, ge=1)  # None = no token budget
 
     @field_validator('interests', 'learning_goals', mode='before')
     @classmethod
@@ -72,6 +73,7 @@ class ChildUpdate(BaseModel):
     interests: Optional[List[str]] = None
     learning_goals: Optional[List[str]] = None
     daily_message_limit: Optional[int] = Field(None, ge=1, le=1000)
+    daily_token_limit: Optional[int] = Field(None, ge=1)  # Send null to remove the budget
     is_active: Optional[bool] = None
 
 
@@ -85,6 +87,8 @@ class ChildResponse(ChildBase):
     learning_goals: Optional[List[str]]
     daily_message_limit: int
     messages_today: int
+    daily_token_limit: Optional[int] = None
+    tokens_today: int = 0
     last_message_date: Optional[date]
     is_active: bool
     created_at: datetime
@@ -100,6 +104,25 @@ class ChildWithStats(ChildResponse):
     can_send_message: bool = True
 
 
+class DailyActivity(BaseModel):
+    """One day of a child's activity (UTC day)."""
+    day: date
+    messages: int = 0
+    conversations: int = 0
+    flagged: int = 0
+    tokens: int = 0
+    active_minutes: int = 0
+
+
+class ActivityTrend(BaseModel):
+    """A child's recent activity, one entry per day, oldest first."""
+    child_id: int
+    days: List[DailyActivity]
+    total_messages: int = 0
+    total_active_minutes: int = 0
+    total_flagged: int = 0
+
+
 # --- Firebase Auth Schemas ---
 
 class FirebaseLoginRequest(BaseModel):
@@ -1,16 +1,50 @@
 """AI Service - Factory for AI providers and main chat interface."""
 
-from typing import Dict, Type, Optional, AsyncGenerator, List
+import importlib
+import time
+from typing import Awaitable, Dict, Type, Optional, AsyncGenerator, List
 from functools import lru_cache
 
-from ai.providers.base import AIProvider, ChatMessage, ChatResponse, ModerationResult
-from ai.providers.openai_provider import OpenAIProvider
-from ai.providers.anthropic_provider import AnthropicProvider
-from ai.providers.mock_provider import MockProvider
+from ai.providers.base import (
+    AIProvider,
+    ChatMessage,
+    ChatResponse,
+    ModerationResult,
+    StreamDelta,
+    StreamEvent,
+    StreamUsage,
+    text_deltas,
+)
+from ai.providers.router import ProviderRouter
+from ai.providers.resilience import AIMDLimiter, CircuitBreaker, GuardedProvider
+from ai.providers.retry import Deadline, deadline_scope, iterate_with_deadline
 from ai.prompts import get_system_prompt
-from ai.filters.input_filter import InputFilter
-from ai.filters.output_filter import OutputFilter
+from ai.filters.input_filter import InputFilter, InputFilterResult
+from ai.filters.output_filter import OutputFilter, OutputFilterResult
 from app.core.config import settings
+from app.core.metrics import AI_ERRORS, AI_LATENCY, AI_TOKENS, AI_TTFT, FILTER_HITS, FILTER_LATENCY
+from app.core.tracing import span
+from app.services.speculation import SpeculationStats, speculate
+
+
+# Shown to the child whenever no provider could answer
+FALLBACK_RESPONSE = (
+    "Oops! My brain got a little confused there. "
+    "Can you try asking me again? I want to help!"
+)
+
+# Flag recorded when provider moderation deflected the child's message
+MODERATION_FLAG = "moderation:flagged"
+
+
+def input_flags(result: InputFilterResult) -> List[str]:
+    """Input filter hits as "input:category" flags."""
+    return [f"input:{category}" for category in result.flag_categories]
+
+
+def output_flags(result: OutputFilterResult) -> List[str]:
+    """Output filter hits as "output:category" flags (one per category)."""
+    return list(dict.fromkeys(f"output:{pattern.split(':', 1)[0]}" for pattern in result.flagged_patterns))
 
 
 class AIService:
@@ -22,10 +56,12 @@ class AIService:
         response = await service.chat(child_age=7, messages=[...])
     """
 
-    _providers: Dict[str, Type[AIProvider]] = {
-        "openai": OpenAIProvider,
-        "anthropic": AnthropicProvider,
-        "mock": MockProvider,
+    # Imported on first use: each SDK costs hundreds of milliseconds of startup, and most
+    # workers only ever use one provider (tests and local runs: none but the mock)
+    _providers: Dict[str, str] = {
+        "openai": "ai.providers.openai_provider:OpenAIProvider",
+        "anthropic": "ai.providers.anthropic_provider:AnthropicProvider",
+        "mock": "ai.providers.mock_provider:MockProvider",
     }
 
     _instance: Optional["AIService"] = None
@@ -39,9 +75,10 @@ class AIService:
             provider_name: Provider to use ('openai' or 'anthropic')
         """
         self.provider_name = provider_name or settings.DEFAULT_AI_PROVIDER
-        self._provider = self._create_provider(self.provider_name)
+        self._provider = self._create_router(self.provider_name)
         self.input_filter = InputFilter()
         self.output_filter = OutputFilter()
+        self.speculation_stats = SpeculationStats()
 
     @classmethod
     def get_instance(cls, provider_name: str = None) -> "AIService":
@@ -58,17 +95,138 @@ class AIService:
         cls._instance = cls(provider_name)
         return cls._instance
 
-    def _create_provider(self, name: str) -> AIProvider:
-        """Create a provider instance."""
-        if name not in self._providers:
+    @classmethod
+    def provider_class(cls, name: str) -> Type[AIProvider]:
+        """
+        Import a registered provider's class (its SDK is loaded on the first call).
+
+        Raises:
+            ValueError: Unknown provider name
+        """
+        if name not in cls._providers:
             raise ValueError(f"Unknown provider: {name}")
-        return self._providers[name]()
+        module_name, _, class_name = cls._providers[name].partition(":")
+        return getattr(importlib.import_module(module_name), class_name)
+
+    def _create_provider(self, name: str) -> AIProvider:
+        """
+        Create a provider instance.
+
+        Args:
+            name: Provider name, optionally with a model ('openai:gpt-4o-mini')
+        """
+        name, _, model = name.partition(":")
+        provider_class = self.provider_class(name)
+        provider = provider_class(model=model) if model else provider_class()
+
+        if not settings.AI_CIRCUIT_BREAKER_ENABLED:
+            return provider
+        return GuardedProvider(
+            provider,
+            breaker=CircuitBreaker(
+                failure_threshold=settings.AI_BREAKER_FAILURE_THRESHOLD,
+                recovery_timeout=settings.AI_BREAKER_RECOVERY_SECONDS,
+            ),
+            limiter=AIMDLimiter(
+                initial_limit=settings.AI_CONCURRENCY_INITIAL_LIMIT,
+                max_limit=settings.AI_CONCURRENCY_MAX_LIMIT,
+                latency_threshold=settings.AI_CONCURRENCY_LATENCY_THRESHOLD_MS / 1000,
+            ),
+        )
+
+    def _create_router(self, primary_name: str) -> AIProvider:
+        """Create the primary provider, routed over any configured fallbacks."""
+        primary = self._create_provider(primary_name)
+        fallbacks = [name for name in settings.AI_FALLBACK_PROVIDERS if name != primary_name]
+        if not fallbacks:
+            return primary
+
+        return ProviderRouter(
+            [primary] + [self._create_provider(name) for name in fallbacks],
+            hedge_percentile=settings.AI_HEDGE_PERCENTILE,
+            hedge_min_delay=settings.AI_HEDGE_MIN_DELAY_MS / 1000,
+            hedge_default_delay=settings.AI_HEDGE_DEFAULT_DELAY_MS / 1000,
+        )
 
     @property
     def provider(self) -> AIProvider:
         """Get current AI provider."""
         return self._provider
 
+    def provider_health(self) -> List[Dict]:
+        """Circuit breaker and concurrency state for each provider."""
+        if isinstance(self._provider, ProviderRouter):
+            providers = self._provider.providers
+        else:
+            providers = [self._provider]
+        return [
+            provider.health() if isinstance(provider, GuardedProvider)
+            else {"provider": provider.name, "model": provider.model, "state": "unguarded"}
+            for provider in providers
+        ]
+
+    def _input_checks(self, messages: List[ChatMessage]) -> List[Awaitable[Optional[str]]]:
+        """
+        Remote safety checks on the child's latest message.
+
+        Each check resolves to None to pass, or a deflection response to block.
+        The local InputFilter is not here - it takes microseconds, so it runs
+        before any generation starts.
+        """
+        if not settings.AI_INPUT_MODERATION or not messages or messages[-1].role != "user":
+            return []
+        return [self._moderation_check(messages[-1].content)]
+
+    async def _moderation_check(self, text: str) -> Optional[str]:
+        """Provider moderation as an input check."""
+        result = await self._provider.moderate(text)
+        if result.is_safe:
+            return None
+        for category in result.flagged_categories:
+            FILTER_HITS.inc(("moderation", category))
+        return self.input_filter.deflection_for_categories(result.flagged_categories)
+
+    def _filter_input(self, content: str) -> InputFilterResult:
+        """Run the input filter, recording its time and hits."""
+        started = time.perf_counter()
+        with span("filter.input"):
+            result = self.input_filter.filter(content)
+        FILTER_LATENCY.observe(time.perf_counter() - started, ("input",))
+        for category in result.flag_categories:
+            FILTER_HITS.inc(("input", category))
+        return result
+
+    async def _filter_output(self, content: str) -> OutputFilterResult:
+        """Run the output filter, recording its time and hits."""
+        started = time.perf_counter()
+        with span("filter.output"):
+            result = await self.output_filter.filter(content)
+        FILTER_LATENCY.observe(time.perf_counter() - started, ("output",))
+        for pattern in result.flagged_patterns:
+            FILTER_HITS.inc(("output", pattern.split(":", 1)[0]))
+        return result
+
+    async def _run_checked(self, generation: Awaitable, checks: List[Awaitable[Optional[str]]]):
+        """
+        Run a generation gated by input checks.
+
+        Returns (result, None) once all checks pass, or (None, deflection).
+        """
+        if not checks:
+            return await generation, None
+        if settings.AI_SPECULATIVE_GENERATION:
+            return await speculate(generation, checks, self.speculation_stats)
+
+        # Sequential: checks first, then generation
+        for check in checks:
+            deflection = await check
+            if deflection is not None:
+                for pending in checks:
+                    pending.close()
+                generation.close()
+                return None, deflection
+        return await generation, None
+
     async def chat(
         self,
         child_age: int,
@@ -93,18 +251,19 @@ class AIService:
             ChatResponse with filtered content
         """
         # Get age-appropriate system prompt
-        system_prompt = get_system_prompt(
-            age=child_age,
-            child_name=child_name,
-            interests=interests or [],
-            learning_goals=learning_goals or [],
-        )
+        with span("prompt.build"):
+            system_prompt = get_system_prompt(
+                age=child_age,
+                child_name=child_name,
+                interests=interests or [],
+                learning_goals=learning_goals or [],
+            )
 
         # Filter input (last message from child)
         if messages:
             last_message = messages[-1]
             if last_message.role == "user":
-                filter_result = self.input_filter.filter(last_message.content)
+                filter_result = self._filter_input(last_message.content)
                 if not filter_result.is_safe:
                     # Return a safe deflection response
                     return ChatResponse(
@@ -112,24 +271,47 @@ class AIService:
                         model=self._provider.model,
                         tokens_used=0,
                         finish_reason="filtered",
+                        flags=input_flags(filter_result),
                     )
 
-        # Generate response
-        response = await self._provider.chat(
-            messages=messages,
-            system_prompt=system_prompt,
-            max_tokens=max_tokens,
-            temperature=0.7,
-        )
+        # Generate response - retries and hedges share one deadline
+        started = time.perf_counter()
+        try:
+            with span("ai.chat", model=self._provider.model), deadline_scope(settings.AI_REQUEST_DEADLINE_SECONDS):
+                response, deflection = await self._run_checked(
+                    self._provider.chat(
+                        messages=messages,
+                        system_prompt=system_prompt,
+                        max_tokens=max_tokens,
+                        temperature=0.7,
+                    ),
+                    self._input_checks(messages),
+                )
+        except Exception as e:
+            AI_ERRORS.inc((type(e).__name__,))
+            raise
+        if deflection is not None:
+            return ChatResponse(
+                content=deflection,
+                model=self._provider.model,
+                tokens_used=0,
+                finish_reason="filtered",
+                flags=[MODERATION_FLAG],
+            )
+
+        AI_LATENCY.observe(time.perf_counter() - started, (response.model, "chat"))
+        AI_TOKENS.inc((response.model, "input"), response.input_tokens)
+        AI_TOKENS.inc((response.model, "output"), response.output_tokens)
 
         # Filter output
-        output_result = await self.output_filter.filter(response.content)
+        output_result = await self._filter_output(response.content)
         if not output_result.is_safe:
             response.content = output_result.filtered_content
+            response.flags = output_flags(output_result)
 
         return response
 
-    async def chat_stream(
+    async def chat_stream_events(
         self,
         child_age: int,
         messages: List[ChatMessage],
@@ -137,43 +319,109 @@ class AIService:
         interests: List[str] = None,
         learning_goals: List[str] = None,
         max_tokens: int = 500,
-    ) -> AsyncGenerator[str, None]:
+    ) -> AsyncGenerator[StreamEvent, None]:
         """
         Generate a streaming chat response with safety filters.
 
+        Yields StreamDelta events, then one StreamUsage with the model that
+        answered, its token counts and finish reason (finish_reason
+        "filtered" and no tokens when a safety check deflected the message).
+
         Note: For streaming, we apply input filter before and
         accumulate output for post-filtering (with risk of partial unsafe content).
         Consider using non-streaming for maximum safety.
         """
         # Get age-appropriate system prompt
-        system_prompt = get_system_prompt(
-            age=child_age,
-            child_name=child_name,
-            interests=interests or [],
-            learning_goals=learning_goals or [],
-        )
+        with span("prompt.build"):
+            system_prompt = get_system_prompt(
+                age=child_age,
+                child_name=child_name,
+                interests=interests or [],
+                learning_goals=learning_goals or [],
+            )
 
         # Filter input
         if messages:
             last_message = messages[-1]
             if last_message.role == "user":
-                filter_result = self.input_filter.filter(last_message.content)
+                filter_result = self._filter_input(last_message.content)
                 if not filter_result.is_safe:
-                    yield filter_result.deflection_response
+                    yield StreamDelta(filter_result.deflection_response)
+                    yield StreamUsage(
+                        model=self._provider.model, finish_reason="filtered", flags=input_flags(filter_result)
+                    )
                     return
 
-        # Stream response
-        async for chunk in self._provider.chat_stream(
+        # Stream response - the first event is held back until input checks pass
+        stream = iterate_with_deadline(
+            self._provider.chat_stream_events(
+                messages=messages,
+                system_prompt=system_prompt,
+                max_tokens=max_tokens,
+                temperature=0.7,
+            ),
+            Deadline(settings.AI_REQUEST_DEADLINE_SECONDS),
+        )
+        model = self._provider.model
+        started = time.perf_counter()
+        try:
+            with span("ai.first_token", model=model):
+                first_event, deflection = await self._run_checked(
+                    _first_event(stream), self._input_checks(messages)
+                )
+            if deflection is not None:
+                yield StreamDelta(deflection)
+                yield StreamUsage(model=model, finish_reason="filtered", flags=[MODERATION_FLAG])
+                return
+            if first_event is None:
+                return
+
+            AI_TTFT.observe(time.perf_counter() - started, (model,))
+            yield first_event
+            async for event in stream:
+                if isinstance(event, StreamUsage):
+                    AI_LATENCY.observe(time.perf_counter() - started, (event.model, "stream"))
+                    AI_TOKENS.inc((event.model, "input"), event.input_tokens)
+                    AI_TOKENS.inc((event.model, "output"), event.output_tokens)
+                yield event
+        except Exception as e:
+            AI_ERRORS.inc((type(e).__name__,))
+            raise
+        finally:
+            await stream.aclose()
+
+    async def chat_stream(
+        self,
+        child_age: int,
+        messages: List[ChatMessage],
+        child_name: str = "friend",
+        interests: List[str] = None,
+        learning_goals: List[str] = None,
+        max_tokens: int = 500,
+    ) -> AsyncGenerator[str, None]:
+        """Text-only view of chat_stream_events."""
+        async for text in text_deltas(self.chat_stream_events(
+            child_age=child_age,
             messages=messages,
-            system_prompt=system_prompt,
+            child_name=child_name,
+            interests=interests,
+            learning_goals=learning_goals,
             max_tokens=max_tokens,
-            temperature=0.7,
-        ):
-            yield chunk
+        )):
+            yield text
 
     async def moderate(self, text: str) -> ModerationResult:
         """Check content using the provider's moderation."""
-        return await self._provider.moderate(text)
+        with deadline_scope(settings.AI_REQUEST_DEADLINE_SECONDS):
+            return await self._provider.moderate(text)
+
+
+async def _first_event(stream: AsyncGenerator[StreamEvent, None]) -> Optional[StreamEvent]:
+    """Pull the first event from a stream (None if it is empty)."""
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
 
 
 # Convenience function
@@ -0,0 +1,220 @@
+"""
+Hot/cold message archival.
+
+Conversations with no messages for ARCHIVE_AFTER_DAYS have their messages
+moved out of the `messages` table into one compressed blob per
+conversation (ArchivedTranscript). The live table, and every index on it,
+then only grows with recent activity.
+
+Reads stay transparent: load_transcript returns archived messages followed
+by any live ones (a child can still continue an old conversation), in the
+same shape as Message rows.
+
+The mover works in small chunks, each in its own short transaction, with a
+pause between chunks, so it never holds locks long enough to stall chat
+traffic.
+"""
+
+import asyncio
+import logging
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import orjson
+from sqlalchemy import delete, exists, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.models import ArchivedTranscript, Conversation, FinishReason, Message, MessageRole
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_FIELDS = (
+    "id", "role", "content", "is_flagged", "flag_reason", "created_at", "ai_model", "tokens_used", "finish_reason",
+)
+
+
+def pack_messages(records: Sequence[Dict[str, Any]]) -> Tuple[bytes, int]:
+    """Serialize and compress message records. Returns (payload, uncompressed size)."""
+    raw = orjson.dumps([[record[field] for field in ARCHIVED_FIELDS] for record in records])
+    return zlib.compress(raw, 9), len(raw)
+
+
+def unpack_messages(conversation_id: int, payload: bytes) -> List[Dict[str, Any]]:
+    """Decompress a payload back into message records, typed as Message columns are."""
+    records = []
+    for values in orjson.loads(zlib.decompress(payload)):
+        record = dict(zip(ARCHIVED_FIELDS, values))
+        record["conversation_id"] = conversation_id
+        record["role"] = MessageRole(record["role"])
+        record["created_at"] = datetime.fromisoformat(record["created_at"])
+        if record["finish_reason"] is not None:
+            record["finish_reason"] = FinishReason(record["finish_reason"])
+        records.append(record)
+    return records
+
+
+def _message_record(message: Message) -> Dict[str, Any]:
+    return {field: getattr(message, field) for field in ARCHIVED_FIELDS} | {"conversation_id": message.conversation_id}
+
+
+async def load_archived(db: AsyncSession, conversation_id: int) -> List[Dict[str, Any]]:
+    """Archived message records of one conversation (empty if it has none)."""
+    payload = await db.scalar(
+        select(ArchivedTranscript.payload).where(ArchivedTranscript.conversation_id == conversation_id)
+    )
+    return unpack_messages(conversation_id, payload) if payload is not None else []
+
+
+async def load_archives(db: AsyncSession, conversation_ids: Sequence[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """Archived message records of several conversations, in one query (conversations without an archive are left out)."""
+    if not conversation_ids:
+        return {}
+    result = await db.execute(
+        select(ArchivedTranscript.conversation_id, ArchivedTranscript.payload)
+        .where(ArchivedTranscript.conversation_id.in_(conversation_ids))
+    )
+    return {conversation_id: unpack_messages(conversation_id, payload) for conversation_id, payload in result}
+
+
+async def load_transcript(db: AsyncSession, conversation: Conversation) -> List[Dict[str, Any]]:
+    """
+    All messages of a conversation, archived then live, as records in id order.
+
+    Records carry the Message column names, so callers can build responses
+    the same way from either source.
+    """
+    records = await load_archived(db, conversation.id) if conversation.archived_at is not None else []
+    result = await db.execute(
+        select(Message).where(Message.conversation_id == conversation.id).order_by(Message.id)
+    )
+    records.extend(_message_record(message) for message in result.scalars())
+    return records
+
+
+async def load_recent(db: AsyncSession, conversation: Conversation, limit: int) -> List[Tuple[MessageRole, str]]:
+    """
+    The last `limit` messages of a conversation as (role, content), oldest first.
+
+    Model context for a continued conversation: the live rows, preceded by
+    the tail of the archive when there are fewer than `limit` of them.
+    """
+    result = await db.execute(
+        select(Message.role, Message.content)
+        .where(Message.conversation_id == conversation.id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(limit)
+    )
+    recent = [tuple(row) for row in reversed(result.all())]
+    if conversation.archived_at is not None and len(recent) < limit:
+        archived = await load_archived(db, conversation.id)
+        recent = [(record["role"], record["content"]) for record in archived[len(recent) - limit:]] + recent
+    return recent
+
+
+async def archive_conversation(db: AsyncSession, conversation_id: int) -> int:
+    """
+    Move one conversation's live messages into its archive blob (caller commits).
+
+    Only the messages read here are deleted, so a message written while the
+    archive is built stays live. Returns the number of messages moved.
+    """
+    messages = (await db.execute(
+        select(Message).where(Message.conversation_id == conversation_id).order_by(Message.id)
+    )).scalars().all()
+    if not messages:
+        return 0
+
+    archive = await db.get(ArchivedTranscript, conversation_id)
+    records = unpack_messages(conversation_id, archive.payload) if archive is not None else []
+    records.extend(_message_record(message) for message in messages)
+    payload, raw_bytes = pack_messages(records)
+
+    if archive is None:
+        db.add(ArchivedTranscript(
+            conversation_id=conversation_id, message_count=len(records), payload=payload, raw_bytes=raw_bytes,
+        ))
+    else:
+        archive.payload, archive.raw_bytes, archive.message_count = payload, raw_bytes, len(records)
+        archive.archived_at = datetime.utcnow()
+
+    await db.execute(
+        delete(Message).where(Message.conversation_id == conversation_id, Message.id <= messages[-1].id)
+    )
+    await db.execute(
+        update(Conversation).where(Conversation.id == conversation_id).values(archived_at=datetime.utcnow())
+    )
+    return len(messages)
+
+
+async def find_inactive(db: AsyncSession, cutoff: datetime, limit: int) -> List[int]:
+    """
+    Conversations that have live messages, none of them newer than `cutoff`.
+
+    Flagged conversations are left live: they are the ones reviewers read.
+    """
+    live = exists().where(Message.conversation_id == Conversation.id)
+    recent = exists().where(Message.conversation_id == Conversation.id, Message.created_at >= cutoff)
+    result = await db.execute(
+        select(Conversation.id)
+        .where(Conversation.started_at < cutoff, Conversation.is_flagged == False, live, ~recent)
+        .order_by(Conversation.id)
+        .limit(limit)
+    )
+    return list(result.scalars())
+
+
+async def archive_inactive(
+    session_factory: async_sessionmaker,
+    older_than_days: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    pause_seconds: Optional[float] = None,
+    max_conversations: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Archive every inactive conversation, one chunk per transaction.
+
+    Args:
+        session_factory: Factory for short-lived database sessions
+        older_than_days: Inactivity threshold (defaults to settings)
+        chunk_size: Conversations per transaction (defaults to settings)
+        pause_seconds: Sleep between chunks (defaults to settings)
+        max_conversations: Stop after this many (None = until none are left)
+
+    Returns:
+        Counts of conversations and messages archived
+    """
+    days = older_than_days if older_than_days is not None else settings.ARCHIVE_AFTER_DAYS
+    chunk_size = chunk_size or settings.ARCHIVE_CHUNK_SIZE
+    pause = pause_seconds if pause_seconds is not None else settings.ARCHIVE_PAUSE_SECONDS
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    totals = {"conversations": 0, "messages": 0}
+    while max_conversations is None or totals["conversations"] < max_conversations:
+        limit = chunk_size if max_conversations is None else min(chunk_size, max_conversations - totals["conversations"])
+        async with session_factory() as db:
+            conversation_ids = await find_inactive(db, cutoff, limit)
+            if not conversation_ids:
+                break
+            for conversation_id in conversation_ids:
+                totals["messages"] += await archive_conversation(db, conversation_id)
+            await db.commit()
+        totals["conversations"] += len(conversation_ids)
+        if len(conversation_ids) < limit:
+            break
+        await asyncio.sleep(pause)
+
+    if totals["conversations"]:
+        logger.info(f"Archived {totals['messages']} messages from {totals['conversations']} conversations")
+    return totals
+
+
+async def run_archiver(session_factory: async_sessionmaker) -> None:
+    """Background loop: archive inactive conversations every ARCHIVE_INTERVAL_SECONDS."""
+    while True:
+        try:
+            await archive_inactive(session_factory)
+        except Exception as e:
+            logger.error(f"Archive run failed: {e}")
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL_SECONDS)
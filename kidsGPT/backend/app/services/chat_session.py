@@ -0,0 +1,407 @@
+"""
+Session-scoped chat state for the WebSocket channel.
+
+An HTTP chat turn looks up the child, checks it is active and under its
+daily limit, fetches the conversation and reloads its history before the
+model is even called. A ChatSession does that once, when the child signs
+in, and keeps the profile, quota and recent history in memory. Each turn
+then costs one short write-through transaction: the two messages plus
+counter updates.
+"""
+
+import logging
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from sqlalchemy import Row, and_, case, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import selectinload
+
+from ai.providers.base import ChatMessage, StreamEvent, StreamUsage
+from app.models import Child, Conversation, FinishReason, Message, MessageRole
+from app.models.user import utc_today
+from app.services.ai_service import FALLBACK_RESPONSE, get_ai_service
+from app.services.archive import load_recent
+from app.services.flagging import get_flag_recorder
+from app.services.usage import record_usage, usage_entry
+from app.services.write_behind import PendingTurn, WriteBehindQueue, get_write_behind
+
+logger = logging.getLogger(__name__)
+
+HISTORY_LIMIT = 20  # Same context window as the HTTP chat endpoint
+
+
+class ChatSessionError(Exception):
+    """A sign-in or turn was refused; `status_code` mirrors the HTTP endpoint's, `quota` names a quota hit."""
+
+    def __init__(self, status_code: int, detail: str, quota: Optional[str] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.quota = quota
+
+
+@dataclass
+class TurnResult:
+    """Ids and counters after a turn has been written through."""
+    conversation_id: int
+    message_id: int
+    response_id: int
+    messages_remaining: int
+
+
+async def count_turn(db: AsyncSession, child_id: int, tokens_used: Optional[int]) -> Row:
+    """
+    Count one turn against the child's daily quota, if the quota still allows it.
+
+    The limits and the active flag are checked in the UPDATE itself, so
+    concurrent turns (two sessions, or a session and the HTTP endpoint)
+    cannot both take the last message. Call it in the transaction that
+    saves the turn, so a refused turn is rolled back with it.
+
+    Returns:
+        The child's messages_today, tokens_today, daily_message_limit and
+        daily_token_limit after the update
+
+    Raises:
+        ChatSessionError: 403 if the child was deactivated, 429 if today's quota is used up
+    """
+    today = utc_today()
+    tokens = tokens_used or 0
+    counters = (Child.messages_today, Child.tokens_today, Child.daily_message_limit, Child.daily_token_limit)
+    result = await db.execute(
+        update(Child)
+        .where(
+            Child.id == child_id,
+            Child.is_active,
+            or_(
+                Child.last_message_date.is_(None),
+                Child.last_message_date != today,
+                and_(
+                    Child.messages_today < Child.daily_message_limit,
+                    or_(Child.daily_token_limit.is_(None), Child.tokens_today < Child.daily_token_limit),
+                ),
+            ),
+        )
+        .values(
+            messages_today=case((Child.last_message_date == today, Child.messages_today + 1), else_=1),
+            tokens_today=case((Child.last_message_date == today, Child.tokens_today + tokens), else_=tokens),
+            last_message_date=today,
+        )
+        .returning(*counters)
+        .execution_options(synchronize_session=False)
+    )
+    row = result.one_or_none()
+    if row is not None:
+        return row
+
+    current = (await db.execute(select(Child.is_active, *counters).where(Child.id == child_id))).one_or_none()
+    if current is None or not current.is_active:
+        raise ChatSessionError(403, "This account has been deactivated. Please ask your parent.")
+    if current.messages_today < current.daily_message_limit:
+        raise ChatSessionError(
+            429, f"Daily token budget ({current.daily_token_limit}) reached. Try again tomorrow!", quota="daily_tokens"
+        )
+    raise ChatSessionError(
+        429, f"Daily message limit ({current.daily_message_limit}) reached. Try again tomorrow!", quota="daily_messages"
+    )
+
+
+class ChatSession:
+    """
+    One signed-in child's chat state for the life of a WebSocket.
+
+    The daily quotas (messages, and tokens when the child has a budget)
+    are checked in memory before a turn, from the counts read at sign-in
+    and refreshed by every save. The save itself counts the turn with
+    count_turn, so a quota used up by another session, or a child
+    deactivated meanwhile, still refuses the turn.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, child: Child):
+        self.session_factory = session_factory
+        self.child_id = child.id
+        self.parent_id = child.parent_id
+        self.child_name = child.name
+        self.child_age = child.age
+        self.interests: List[str] = child.interests or []
+        self.learning_goals: List[str] = child.learning_goals or []
+        self.daily_limit = child.daily_message_limit
+        self.messages_today = child.messages_today
+        self.token_limit = child.daily_token_limit
+        self.tokens_today = child.tokens_today
+        self.quota_date = child.last_message_date or utc_today()
+        self.conversation_id: Optional[int] = None
+        self.history: Deque[ChatMessage] = deque(maxlen=HISTORY_LIMIT)
+        self.last_turn: Optional[TurnResult] = None
+
+    @classmethod
+    async def open(
+        cls, session_factory: async_sessionmaker, pin: str, conversation_id: Optional[int] = None
+    ) -> "ChatSession":
+        """
+        Sign a child in by PIN and load their state.
+
+        Args:
+            session_factory: Factory for short-lived database sessions
+            pin: The child's 6-digit login PIN
+            conversation_id: Conversation to resume (None = start a new one on the first turn)
+
+        Raises:
+            ChatSessionError: Unknown PIN, inactive child or parent, or unknown conversation
+        """
+        async with session_factory() as db:
+            result = await db.execute(
+                select(Child).options(selectinload(Child.parent)).where(Child.login_pin == pin)
+            )
+            child = result.scalar_one_or_none()
+            if child is None:
+                raise ChatSessionError(404, "Invalid PIN. Please check with your parent for the correct PIN.")
+            if not child.is_active:
+                raise ChatSessionError(403, "This account has been deactivated. Please ask your parent.")
+            if not child.parent.is_active:
+                raise ChatSessionError(403, "The parent account is not active.")
+
+            session = cls(session_factory, child)
+            session._roll_quota_date()
+
+            if conversation_id is not None:
+                conversation = await db.scalar(
+                    select(Conversation).where(
+                        Conversation.id == conversation_id, Conversation.child_id == child.id
+                    )
+                )
+                if conversation is None:
+                    raise ChatSessionError(404, "Conversation not found")
+                session.conversation_id = conversation.id
+                for role, content in await load_recent(db, conversation, HISTORY_LIMIT):
+                    session._remember(role, content)
+        return session
+
+    @property
+    def messages_remaining(self) -> int:
+        self._roll_quota_date()
+        return max(self.daily_limit - self.messages_today, 0)
+
+    def _roll_quota_date(self) -> None:
+        today = utc_today()
+        if self.quota_date != today:
+            self.quota_date = today
+            self.messages_today = 0
+            self.tokens_today = 0
+
+    def _remember(self, role: MessageRole, content: str) -> None:
+        self.history.append(ChatMessage(role="user" if role == MessageRole.CHILD else "assistant", content=content))
+
+    def check_quota(self) -> None:
+        """Raise ChatSessionError (429) if today's message limit or token budget is used up."""
+        if self.messages_remaining <= 0:
+            raise ChatSessionError(
+                429, f"Daily message limit ({self.daily_limit}) reached. Try again tomorrow!", quota="daily_messages"
+            )
+        if self.token_limit is not None and self.tokens_today >= self.token_limit:
+            raise ChatSessionError(
+                429, f"Daily token budget ({self.token_limit}) reached. Try again tomorrow!", quota="daily_tokens"
+            )
+
+    async def stream_reply(self, text: str) -> AsyncIterator[StreamEvent]:
+        """Stream the assistant's answer to `text`, using the in-memory history as context."""
+        ai_service = get_ai_service()
+        async for event in ai_service.chat_stream_events(
+            child_age=self.child_age,
+            messages=[*self.history, ChatMessage(role="user", content=text)],
+            child_name=self.child_name,
+            interests=self.interests,
+            learning_goals=self.learning_goals,
+        ):
+            yield event
+
+    async def save_turn(
+        self,
+        text: str,
+        reply: str,
+        ai_model: Optional[str],
+        finish_reason: FinishReason = FinishReason.STOP,
+        tokens_used: Optional[int] = None,
+        usage: Optional[StreamUsage] = None,
+    ) -> TurnResult:
+        """
+        Persist the child's message and the reply.
+
+        Written through in one transaction, or handed to the write-behind
+        queue when it is running (see app.services.write_behind). With
+        `usage`, the turn also goes into the token usage ledger.
+
+        Raises:
+            ChatSessionError: The turn was refused by count_turn; nothing is saved
+        """
+        writer = get_write_behind()
+        if writer is not None:
+            return await self._queue_turn(writer, text, reply, ai_model, finish_reason, tokens_used, usage)
+
+        async with self.session_factory() as db:
+            await self._count_turn(db, tokens_used)
+            if self.conversation_id is None:
+                await self._create_conversation(db, text)
+
+            child_message = Message(conversation_id=self.conversation_id, role=MessageRole.CHILD, content=text)
+            assistant_message = Message(
+                conversation_id=self.conversation_id,
+                role=MessageRole.ASSISTANT,
+                content=reply,
+                ai_model=ai_model,
+                tokens_used=tokens_used,
+                finish_reason=finish_reason,
+            )
+            db.add_all([child_message, assistant_message])
+            await db.flush()
+
+            await db.execute(
+                update(Conversation)
+                .where(Conversation.id == self.conversation_id)
+                .values(message_count=Conversation.message_count + 2)
+            )
+            if usage is not None:
+                await record_usage(db, [self._usage_entry(assistant_message.id, usage)])
+            await db.commit()
+
+        return self._after_turn(text, reply, child_message.id, assistant_message.id)
+
+    async def _queue_turn(
+        self,
+        writer: WriteBehindQueue,
+        text: str,
+        reply: str,
+        ai_model: Optional[str],
+        finish_reason: FinishReason,
+        tokens_used: Optional[int],
+        usage: Optional[StreamUsage],
+    ) -> TurnResult:
+        """
+        Queue the turn for a batched write; ids come from the allocator so they can be returned now.
+
+        The quota is counted (and a new conversation row, whose id goes on
+        the messages, created) in one small transaction first: a refused
+        turn must not be acknowledged.
+        """
+        async with self.session_factory() as db:
+            await self._count_turn(db, tokens_used)
+            if self.conversation_id is None:
+                await self._create_conversation(db, text)
+            await db.commit()
+
+        message_id, response_id = await writer.allocator.allocate(2)
+        now = datetime.utcnow()
+        common = {"conversation_id": self.conversation_id, "is_flagged": False, "flag_reason": None, "created_at": now}
+        await writer.submit(PendingTurn(
+            conversation_id=self.conversation_id,
+            child_id=self.child_id,
+            rows=[
+                {**common, "id": message_id, "role": MessageRole.CHILD, "content": text,
+                 "ai_model": None, "tokens_used": None, "finish_reason": None},
+                {**common, "id": response_id, "role": MessageRole.ASSISTANT, "content": reply,
+                 "ai_model": ai_model, "tokens_used": tokens_used, "finish_reason": finish_reason},
+            ],
+            usage=self._usage_entry(response_id, usage, now) if usage is not None else None,
+        ))
+        return self._after_turn(text, reply, message_id, response_id)
+
+    async def _count_turn(self, db: AsyncSession, tokens_used: Optional[int]) -> None:
+        """count_turn, keeping the in-memory quota in step with the database's."""
+        try:
+            counters = await count_turn(db, self.child_id, tokens_used)
+        except ChatSessionError as e:
+            if e.quota == "daily_messages":
+                self.messages_today = self.daily_limit
+            elif e.quota == "daily_tokens":
+                self.tokens_today = self.token_limit
+            raise
+        self.quota_date = utc_today()
+        self.messages_today, self.tokens_today, self.daily_limit, self.token_limit = counters
+
+    async def _create_conversation(self, db: AsyncSession, text: str) -> None:
+        conversation = Conversation(
+            child_id=self.child_id,
+            title=text[:50] + "..." if len(text) > 50 else text,
+            message_count=0,
+        )
+        db.add(conversation)
+        await db.flush()
+        self.conversation_id = conversation.id
+
+    def _usage_entry(self, response_id: int, usage: StreamUsage, created_at: Optional[datetime] = None) -> Dict[str, Any]:
+        return usage_entry(
+            self.parent_id, self.child_id, self.conversation_id, response_id, usage.model,
+            usage.input_tokens, usage.output_tokens, usage.cached_tokens, created_at,
+        )
+
+    def _after_turn(self, text: str, reply: str, message_id: int, response_id: int) -> TurnResult:
+        self._remember(MessageRole.CHILD, text)
+        self._remember(MessageRole.ASSISTANT, reply)
+        return TurnResult(
+            conversation_id=self.conversation_id,
+            message_id=message_id,
+            response_id=response_id,
+            messages_remaining=self.messages_remaining,
+        )
+
+    async def turn(self, text: str) -> AsyncIterator[str]:
+        """
+        Run one turn: stream the reply chunks, then write the turn through.
+
+        The turn is recorded however the stream ends. If the consumer stops
+        early (client disconnect: the iterator is closed or its task
+        cancelled), the provider stream is closed at once and the partial
+        reply is saved with FinishReason.CANCELLED. The TurnResult is
+        available as `last_turn` afterwards.
+        """
+        self.check_quota()
+        parts: List[str] = []
+        usage: Optional[StreamUsage] = None
+        ai_model: Optional[str] = get_ai_service().provider.model
+        finish_reason = FinishReason.CANCELLED
+        try:
+            async for event in self.stream_reply(text):
+                if isinstance(event, StreamUsage):
+                    usage = event
+                    continue
+                parts.append(event.text)
+                yield event.text
+            finish_reason = _finish_reason(usage)
+        except Exception as e:
+            logger.error(f"AI Error: {e}")
+            ai_model = "error"
+            finish_reason = FinishReason.ERROR
+            if not parts:
+                parts.append(FALLBACK_RESPONSE)
+                yield FALLBACK_RESPONSE
+        finally:
+            if finish_reason == FinishReason.CANCELLED:
+                logger.info(f"Chat turn cancelled after {len(parts)} chunks (child {self.child_id})")
+            if usage is not None:
+                ai_model = usage.model
+            self.last_turn = await self.save_turn(
+                text,
+                "".join(parts),
+                ai_model,
+                finish_reason,
+                tokens_used=usage.tokens_used if usage is not None else None,
+                usage=usage,
+            )
+            # Streamed replies were not output-filtered; the flag job checks the stored text
+            get_flag_recorder().record_turn(
+                self.last_turn.conversation_id,
+                self.last_turn.message_id,
+                self.last_turn.response_id,
+                usage.flags if usage is not None else (),
+                reply=None if finish_reason == FinishReason.ERROR else "".join(parts),
+            )
+
+
+def _finish_reason(usage: Optional[StreamUsage]) -> FinishReason:
+    """Map a provider's finish reason ('length', 'max_tokens', 'end_turn', ...) to ours."""
+    if usage is not None and usage.finish_reason in ("length", "max_tokens"):
+        return FinishReason.LENGTH
+    return FinishReason.STOP
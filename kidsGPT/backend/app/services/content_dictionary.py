@@ -0,0 +1,133 @@
+"""
+Training and loading of message content dictionaries.
+
+Dictionaries live in the content_dictionaries table. Every worker loads
+all of them at startup, because any stored row may reference any of them.
+To roll out a new one:
+
+    python -m app.services.content_dictionary train --samples 5000
+
+then set CONTENT_DICTIONARY_ID to the printed id and restart. Rows already
+written keep decoding with the dictionary they were written with. To
+rewrite existing rows with the current settings (compress the rows
+written before the codec, or since, after turning compression on or
+rolling out a dictionary; store them as plain text after turning it off):
+
+    python -m app.services.content_dictionary recode
+"""
+
+import argparse
+import asyncio
+import logging
+from typing import List
+
+from sqlalchemy import Text, bindparam, select, type_coerce, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.content_codec import decode_content, encode_content, register_dictionary, train_dictionary
+from app.core.database import async_session_maker, close_db
+from app.models import ContentDictionary, Message, MessageRole
+
+logger = logging.getLogger(__name__)
+
+
+async def load_dictionaries(session_factory: async_sessionmaker) -> int:
+    """Register every stored dictionary with the codec. Returns how many were loaded."""
+    async with session_factory() as db:
+        rows = (await db.execute(select(ContentDictionary.id, ContentDictionary.data))).all()
+    for dictionary_id, data in rows:
+        register_dictionary(dictionary_id, data)
+    return len(rows)
+
+
+async def sample_messages(session_factory: async_sessionmaker, samples: int) -> List[str]:
+    """The most recent assistant replies, the text most worth compressing."""
+    async with session_factory() as db:
+        result = await db.execute(
+            select(Message.content)
+            .where(Message.role == MessageRole.ASSISTANT)
+            .order_by(Message.id.desc())
+            .limit(samples)
+        )
+        return list(result.scalars())
+
+
+async def train_and_store(session_factory: async_sessionmaker, samples: int = 5000) -> ContentDictionary:
+    """
+    Train a dictionary on recent assistant replies, store and register it.
+
+    Raises:
+        ValueError: There are no messages to train on
+    """
+    texts = await sample_messages(session_factory, samples)
+    if not texts:
+        raise ValueError("No assistant messages to train a dictionary on")
+
+    data = train_dictionary(texts)
+    async with session_factory() as db:
+        dictionary = ContentDictionary(data=data, sample_count=len(texts))
+        db.add(dictionary)
+        await db.commit()
+    register_dictionary(dictionary.id, data)
+    logger.info(f"Trained content dictionary {dictionary.id}: {len(data)} bytes from {len(texts)} messages")
+    return dictionary
+
+
+async def recode_messages(session_factory: async_sessionmaker, batch_size: int = 1000) -> int:
+    """
+    Re-encode stored message content with the current codec settings, one batch per transaction.
+
+    Only rows whose stored value changes are written. Dictionaries the rows
+    reference must be loaded. Returns how many rows were rewritten.
+    """
+    rewritten = 0
+    last_id = 0
+    stored = type_coerce(Message.content, Text)  # The value as stored, not decoded
+    while True:
+        async with session_factory() as db:
+            rows = (await db.execute(
+                select(Message.id, stored).where(Message.id > last_id).order_by(Message.id).limit(batch_size)
+            )).all()
+            if not rows:
+                return rewritten
+            last_id = rows[-1][0]
+            changed = [
+                {"b_id": message_id, "b_content": text}
+                for message_id, value in rows
+                if encode_content(text := decode_content(value)) != value
+            ]
+            if changed:
+                await db.execute(
+                    update(Message.__table__)
+                    .where(Message.__table__.c.id == bindparam("b_id"))
+                    .values(content=bindparam("b_content")),
+                    changed,
+                )
+                await db.commit()
+            rewritten += len(changed)
+
+
+async def _main(args: argparse.Namespace) -> None:
+    try:
+        if args.command == "train":
+            dictionary = await train_and_store(async_session_maker, args.samples)
+            print(f"Content dictionary {dictionary.id} ({len(dictionary.data)} bytes); set CONTENT_DICTIONARY_ID={dictionary.id}")
+        else:
+            await load_dictionaries(async_session_maker)
+            print(f"Rewrote {await recode_messages(async_session_maker, args.batch_size)} messages")
+    finally:
+        await close_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    train = subcommands.add_parser("train", help="Train a dictionary on recent assistant replies")
+    train.add_argument("--samples", type=int, default=5000, help="Messages to train on")
+    recode = subcommands.add_parser("recode", help="Rewrite stored messages with the current codec settings")
+    recode.add_argument("--batch-size", type=int, default=1000, help="Messages per transaction")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
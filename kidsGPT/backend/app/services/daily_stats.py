@@ -0,0 +1,155 @@
+"""
+Parent dashboard stats, read from the child_daily_stats rollup.
+
+Every write bumps the child's row for the day in the same transaction as
+the data: message and conversation inserts through mapper events (see
+app.models.conversation), and write-behind batches and the flag job through
+record_activity. Dashboards then read one row per day instead of counting
+messages.
+
+Rows written before the rollup existed, or after a manual data fix, can be
+recomputed from the raw tables (archived transcripts included):
+
+    python -m app.services.daily_stats rebuild [--child-id 3]
+"""
+
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.database import async_session_maker, close_db
+from app.models import ArchivedTranscript, Child, ChildDailyStats, Conversation, Message, MessageRole
+from app.models.daily_stats import activity_params, activity_upsert, epoch_minute
+from app.models.user import utc_today
+from app.services.archive import unpack_messages
+
+STAT_FIELDS = ("messages", "conversations", "flagged", "tokens", "active_minutes")
+
+
+async def record_activity(db: AsyncSession, params: Sequence[Dict[str, Any]]) -> None:
+    """Add activity_params increments to the rollup, in the caller's transaction."""
+    if params:
+        connection = await db.connection()
+        await db.execute(activity_upsert(connection.dialect.name), list(params))
+
+
+async def message_totals(db: AsyncSession, child_ids: Sequence[int]) -> Dict[int, int]:
+    """All-time message counts per child, summed over their daily rows."""
+    if not child_ids:
+        return {}
+    result = await db.execute(
+        select(ChildDailyStats.child_id, func.sum(ChildDailyStats.messages))
+        .where(ChildDailyStats.child_id.in_(child_ids))
+        .group_by(ChildDailyStats.child_id)
+    )
+    return {child_id: total or 0 for child_id, total in result.all()}
+
+
+async def day_stats(db: AsyncSession, child_id: int, day: date) -> Dict[str, int]:
+    """One day's rollup for a child (zeros if the child was not active)."""
+    row = await db.get(ChildDailyStats, (child_id, day))
+    return {field: getattr(row, field) if row is not None else 0 for field in STAT_FIELDS}
+
+
+async def activity_trend(db: AsyncSession, child_id: int, days: int, today: Optional[date] = None) -> List[Dict[str, Any]]:
+    """The last `days` days of activity, oldest first, with inactive days as zeros."""
+    today = today or utc_today()
+    start = today - timedelta(days=days - 1)
+    result = await db.execute(
+        select(ChildDailyStats).where(
+            ChildDailyStats.child_id == child_id,
+            ChildDailyStats.day >= start,
+            ChildDailyStats.day <= today,
+        )
+    )
+    rows = {row.day: row for row in result.scalars()}
+    trend = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = rows.get(day)
+        trend.append({"day": day} | {field: getattr(row, field) if row is not None else 0 for field in STAT_FIELDS})
+    return trend
+
+
+async def rebuild(session_factory: async_sessionmaker, child_id: Optional[int] = None) -> int:
+    """
+    Recompute the rollup from conversations, messages and archived transcripts.
+
+    Each child is rebuilt in its own transaction. Returns rows written.
+    """
+    async with session_factory() as db:
+        query = select(Child.id).order_by(Child.id)
+        if child_id is not None:
+            query = query.where(Child.id == child_id)
+        child_ids = (await db.execute(query)).scalars().all()
+
+    written = 0
+    for cid in child_ids:
+        async with session_factory() as db:
+            written += await _rebuild_child(db, cid)
+            await db.commit()
+    return written
+
+
+async def _rebuild_child(db: AsyncSession, child_id: int) -> int:
+    totals: Dict[date, Dict[str, Any]] = defaultdict(lambda: {
+        "messages": 0, "conversations": 0, "flagged": 0, "tokens": 0, "minutes": [],
+    })
+
+    def count(role: MessageRole, created_at: datetime, tokens: Optional[int], is_flagged: bool) -> None:
+        day = totals[created_at.date()]
+        day["messages"] += 1
+        day["tokens"] += tokens or 0
+        day["flagged"] += int(is_flagged)
+        if role == MessageRole.CHILD:
+            day["minutes"].append(epoch_minute(created_at))
+
+    started = await db.execute(select(Conversation.started_at).where(Conversation.child_id == child_id))
+    for (started_at,) in started:
+        totals[started_at.date()]["conversations"] += 1
+
+    messages = await db.execute(
+        select(Message.role, Message.created_at, Message.tokens_used, Message.is_flagged)
+        .join(Conversation)
+        .where(Conversation.child_id == child_id)
+    )
+    for row in messages:
+        count(*row)
+
+    archives = await db.execute(
+        select(ArchivedTranscript.conversation_id, ArchivedTranscript.payload)
+        .join(Conversation)
+        .where(Conversation.child_id == child_id)
+    )
+    for conversation_id, payload in archives:
+        for record in unpack_messages(conversation_id, payload):
+            count(record["role"], record["created_at"], record["tokens_used"], record["is_flagged"])
+
+    await db.execute(delete(ChildDailyStats).where(ChildDailyStats.child_id == child_id))
+    await record_activity(db, [activity_params(child_id, day, **values) for day, values in totals.items()])
+    return len(totals)
+
+
+async def _main(args: argparse.Namespace) -> None:
+    try:
+        rows = await rebuild(async_session_maker, args.child_id)
+        print(f"Rebuilt {rows} daily stats rows")
+    finally:
+        await close_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subcommands.add_parser("rebuild", help="Recompute the rollup from the raw tables")
+    rebuild_parser.add_argument("--child-id", type=int, default=None, help="Only this child (default: all)")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
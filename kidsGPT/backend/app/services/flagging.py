@@ -0,0 +1,207 @@
+"""
+Persisted safety flags for messages and conversations.
+
+AIService reports what its filters caught as flags on each response
+("input:self_harm", "output:violence", ...). The chat endpoints hand those
+to the FlagRecorder, which only appends them to an in-memory batch: the
+request never waits on a flag write. Every FLAG_BATCH_SIZE verdicts, or
+FLAG_BATCH_DELAY_MS after the first one, the batch becomes one durable
+background job (app.core.jobs) that marks the messages and rolls the flag
+up to their conversations in a single transaction. Being in the jobs
+table, a batch is not lost to a full queue, a retry pending at shutdown
+or a restart.
+
+Streamed replies are not output-filtered while they stream, so their text
+is checked with the OutputFilter inside the job instead.
+
+Unflagged messages cost nothing: is_flagged already defaults to False.
+The admin flagged-conversation view then reads ix_conversations_is_flagged_started_at.
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ai.filters.output_filter import OutputFilter
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.jobs import JobRunner, get_job_runner, job
+from app.core.metrics import FILTER_HITS
+from app.models import Conversation, Message
+from app.models.daily_stats import activity_params
+from app.services.ai_service import output_flags
+from app.services.daily_stats import record_activity
+
+logger = logging.getLogger(__name__)
+
+FLAG_JOB = "persist_flags"
+FLAG_REASON_LENGTH = 500  # flag_reason column size
+
+
+def flag_reason(flags: Sequence[str]) -> str:
+    """The flag_reason stored for a set of flags: "input:pii, input:self_harm"."""
+    return ", ".join(sorted(set(flags)))[:FLAG_REASON_LENGTH]
+
+
+class MessagesNotWritten(Exception):
+    """Some flagged messages are not in the database yet (uncommitted request, write-behind batch)."""
+
+
+class FlagRecorder:
+    """
+    Collects flag verdicts from the chat path and persists them in batches.
+
+    Usage:
+        recorder = get_flag_recorder()
+        recorder.record(message_id, conversation_id, response.flags)
+        recorder.record(reply_id, conversation_id, usage.flags, reply=text)  # Streamed reply: checked in the job
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, jobs: JobRunner,
+                 batch_size: Optional[int] = None, max_delay_ms: Optional[float] = None):
+        self.session_factory = session_factory
+        self.jobs = jobs
+        self.batch_size = batch_size or settings.FLAG_BATCH_SIZE
+        self.max_delay = (max_delay_ms if max_delay_ms is not None else settings.FLAG_BATCH_DELAY_MS) / 1000
+        self.output_filter = OutputFilter()
+        self._batch: List[Dict[str, Any]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._handing_over: Set[asyncio.Task] = set()
+        self.dropped = 0
+
+    def record(self, message_id: int, conversation_id: int, flags: Sequence[str] = (),
+               reply: Optional[str] = None) -> None:
+        """
+        Queue a message's verdict. Does no I/O.
+
+        Args:
+            message_id: The flagged message
+            conversation_id: Its conversation (flagged too)
+            flags: Filter hits already known ("stage:category")
+            reply: Reply text to run the output filter on in the job (streamed replies)
+        """
+        if not flags and reply is None:
+            return
+        verdict: Dict[str, Any] = {"message_id": message_id, "conversation_id": conversation_id, "flags": list(flags)}
+        if reply is not None:
+            verdict["reply"] = reply
+        self._batch.append(verdict)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self.flush)
+
+    def record_turn(self, conversation_id: int, message_id: int, response_id: int,
+                    flags: Sequence[str] = (), reply: Optional[str] = None) -> None:
+        """Queue a turn's verdicts: output flags go on the reply, the rest on the child's message."""
+        self.record(message_id, conversation_id, [flag for flag in flags if not flag.startswith("output:")])
+        self.record(response_id, conversation_id, [flag for flag in flags if flag.startswith("output:")], reply)
+
+    def flush(self) -> None:
+        """Hand the current batch to the job runner (in a task: recording the job is a database write)."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        task = asyncio.get_running_loop().create_task(self._hand_over(batch))
+        self._handing_over.add(task)
+        task.add_done_callback(self._handing_over.discard)
+
+    async def drain(self) -> None:
+        """Flush, then wait until every batch handed over so far is recorded as a job (shutdown)."""
+        self.flush()
+        if self._handing_over:
+            await asyncio.gather(*self._handing_over)
+
+    async def _hand_over(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            await self.jobs.enqueue(FLAG_JOB, {"verdicts": batch}, durable=True)
+        except Exception as e:
+            self.dropped += len(batch)
+            logger.error(f"Dropped {len(batch)} flag verdicts: {e}")
+
+    async def apply(self, verdicts: List[Dict[str, Any]]) -> int:
+        """
+        Write a batch: flag the messages, then their conversations. Idempotent.
+
+        Returns:
+            Messages flagged
+
+        Raises:
+            MessagesNotWritten: Some messages are not stored yet; the rest
+                are written and the job is retried for them
+        """
+        flagged: Dict[int, Dict[str, Any]] = {}
+        for verdict in verdicts:
+            flags = list(verdict["flags"])
+            if verdict.get("reply") is not None:
+                result = await self.output_filter.filter(verdict["reply"])
+                for flag in output_flags(result):
+                    FILTER_HITS.inc(("output", flag.split(":", 1)[1]))
+                    flags.append(flag)
+            if flags:
+                flagged[verdict["message_id"]] = {
+                    "b_id": verdict["message_id"],
+                    "b_conversation_id": verdict["conversation_id"],
+                    "b_reason": flag_reason(flags),
+                }
+        if not flagged:
+            return 0
+
+        messages = Message.__table__
+        conversations = Conversation.__table__
+        async with self.session_factory() as db:
+            found = (await db.execute(
+                select(Message.id, Message.is_flagged, Message.created_at, Conversation.child_id)
+                .join(Conversation)
+                .where(Message.id.in_(flagged))
+            )).all()
+            stored = {message.id for message in found}
+            rows = [row for message_id, row in flagged.items() if message_id in stored]
+            # Only first-time flags count towards the daily rollup, so retries don't double count
+            newly_flagged = Counter(
+                (message.child_id, message.created_at.date()) for message in found if not message.is_flagged
+            )
+            if rows:
+                await db.execute(
+                    update(messages)
+                    .where(messages.c.id == bindparam("b_id"))
+                    .values(is_flagged=True, flag_reason=bindparam("b_reason")),
+                    rows,
+                )
+                # The first reason a conversation was flagged for is the one reviewers see
+                await db.execute(
+                    update(conversations)
+                    .where(conversations.c.id == bindparam("b_conversation_id"))
+                    .values(is_flagged=True, flag_reason=func.coalesce(conversations.c.flag_reason, bindparam("b_reason"))),
+                    [{"b_conversation_id": row["b_conversation_id"], "b_reason": row["b_reason"]} for row in rows],
+                )
+                await record_activity(db, [
+                    activity_params(child_id, day, flagged=count) for (child_id, day), count in newly_flagged.items()
+                ])
+                await db.commit()
+        if len(rows) < len(flagged):
+            raise MessagesNotWritten(f"{len(flagged) - len(rows)} flagged messages not written yet")
+        return len(rows)
+
+
+@job(FLAG_JOB)
+async def persist_flags(verdicts: List[Dict[str, Any]]) -> None:
+    await get_flag_recorder().apply(verdicts)
+
+
+_recorder: Optional[FlagRecorder] = None
+
+
+def get_flag_recorder() -> FlagRecorder:
+    """The process-wide flag recorder, feeding the process-wide job runner."""
+    global _recorder
+    if _recorder is None:
+        _recorder = FlagRecorder(async_session_maker, get_job_runner())
+    return _recorder
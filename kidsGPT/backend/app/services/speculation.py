@@ -0,0 +1,71 @@
+"""Speculative generation - start the model while safety checks are still running."""
+
+import asyncio
+import time
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+V = TypeVar("V")
+
+
+@dataclass
+class SpeculationStats:
+    """Running totals for speculative generation."""
+    released: int = 0  # Generations released after all checks passed
+    cancelled: int = 0  # Generations cancelled because a check blocked
+    cancelled_generation_seconds: float = 0.0  # Upstream time cut short by cancellation
+    latency_saved_seconds: float = 0.0  # Check time hidden behind generation
+
+    def snapshot(self) -> Dict:
+        """Stats for monitoring."""
+        return {key: round(value, 3) if isinstance(value, float) else value
+                for key, value in asdict(self).items()}
+
+
+async def _cancel(tasks: List[asyncio.Task]) -> None:
+    """Cancel unfinished tasks and wait for them to unwind."""
+    pending = [task for task in tasks if not task.done()]
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def speculate(
+    generation: Awaitable[T],
+    checks: List[Awaitable[Optional[V]]],
+    stats: SpeculationStats,
+) -> Tuple[Optional[T], Optional[V]]:
+    """
+    Run a generation concurrently with safety checks.
+
+    Each check returns None to pass or a verdict to block. The first
+    blocking verdict cancels the generation at once; the generation's
+    result is only released after every check has passed. A check that
+    raises cancels the generation too (fail closed).
+
+    Returns:
+        (result, None) if all checks passed, or (None, verdict) if blocked
+    """
+    started = time.monotonic()
+    generation_task = asyncio.ensure_future(generation)
+    check_tasks = [asyncio.ensure_future(check) for check in checks]
+
+    try:
+        for finished in asyncio.as_completed(check_tasks):
+            verdict = await finished
+            if verdict is not None:
+                generation_task.cancel()
+                stats.cancelled += 1
+                stats.cancelled_generation_seconds += time.monotonic() - started
+                return None, verdict
+        checks_took = time.monotonic() - started
+
+        result = await generation_task
+        stats.released += 1
+        # Sequentially, the checks would have added their full duration
+        stats.latency_saved_seconds += min(checks_took, time.monotonic() - started)
+        return result, None
+    finally:
+        await _cancel(check_tasks + [generation_task])
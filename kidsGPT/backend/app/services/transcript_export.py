@@ -0,0 +1,229 @@
+"""
+Streaming transcript export - all of a child's conversations as NDJSON or CSV.
+
+Rows are read in keyset batches (WHERE id > last ORDER BY id LIMIT n),
+each in its own short session, and encoded as they are read. Archived
+messages are read from their conversation's archive blob first. Memory use
+is bounded by the batch size whatever the history length, and a slow
+download holds no database connection between batches.
+"""
+
+import csv
+import io
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+import orjson
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import settings
+from app.models import Conversation, Message
+from app.services.archive import load_archived
+
+EXPORT_FORMATS = ("ndjson", "csv")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+CONVERSATION_COLUMNS = (
+    Conversation.id,
+    Conversation.title,
+    Conversation.started_at,
+    Conversation.ended_at,
+    Conversation.is_flagged,
+    Conversation.flag_reason,
+    Conversation.message_count,
+    Conversation.archived_at,
+)
+MESSAGE_COLUMNS = (
+    Message.id,
+    Message.conversation_id,
+    Message.role,
+    Message.content,
+    Message.is_flagged,
+    Message.flag_reason,
+    Message.finish_reason,
+    Message.created_at,
+)
+
+CSV_HEADER = [
+    "conversation_id", "conversation_title", "conversation_started_at", "conversation_is_flagged",
+    "message_id", "role", "content", "is_flagged", "flag_reason", "created_at",
+]
+
+FLUSH_BYTES = 64 * 1024  # Gzip output is yielded in pieces of about this size
+
+
+async def iter_transcript(
+    session_factory: async_sessionmaker, child_id: int, batch_size: Optional[int] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield a child's conversations, each followed by its messages, in id order.
+
+    Records are dicts with "type" set to "conversation" or "message".
+    """
+    batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+    last_conversation_id = 0
+    while True:
+        async with session_factory() as db:
+            conversations = (await db.execute(
+                select(*CONVERSATION_COLUMNS)
+                .where(Conversation.child_id == child_id, Conversation.id > last_conversation_id)
+                .order_by(Conversation.id)
+                .limit(batch_size)
+            )).all()
+        if not conversations:
+            return
+        last_conversation_id = conversations[-1].id
+
+        messages = _iter_messages(session_factory, [c.id for c in conversations], batch_size)
+        try:
+            pending = await anext(messages, None)
+            for conversation in conversations:
+                yield {"type": "conversation", **conversation._asdict()}
+                if conversation.archived_at is not None:
+                    # One conversation's blob at a time, read in its own short session
+                    async with session_factory() as db:
+                        archived = await load_archived(db, conversation.id)
+                    for record in archived:
+                        yield {"type": "message", **{column.key: record[column.key] for column in MESSAGE_COLUMNS}}
+                while pending is not None and pending.conversation_id == conversation.id:
+                    yield {"type": "message", **pending._asdict()}
+                    pending = await anext(messages, None)
+        finally:
+            await messages.aclose()
+
+
+async def _iter_messages(session_factory: async_sessionmaker, conversation_ids: Sequence[int], batch_size: int):
+    """Messages of the given conversations, ordered by (conversation_id, id), in keyset batches."""
+    last = (0, 0)
+    while True:
+        async with session_factory() as db:
+            rows = (await db.execute(
+                select(*MESSAGE_COLUMNS)
+                .where(
+                    Message.conversation_id.in_(conversation_ids),
+                    or_(
+                        Message.conversation_id > last[0],
+                        and_(Message.conversation_id == last[0], Message.id > last[1]),
+                    ),
+                )
+                .order_by(Message.conversation_id, Message.id)
+                .limit(batch_size)
+            )).all()
+        for row in rows:
+            yield row
+        if len(rows) < batch_size:
+            return
+        last = (rows[-1].conversation_id, rows[-1].id)
+
+
+def encode_ndjson(record: Dict[str, Any]) -> bytes:
+    # orjson writes enums as their values and datetimes as ISO 8601
+    return orjson.dumps(record) + b"\n"
+
+
+class _CSVEncoder:
+    """One CSV row per message, with its conversation's fields repeated on each."""
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._conversation: List[Any] = []
+        self._conversation_rows = 0
+
+    def _take(self) -> bytes:
+        data = self._buffer.getvalue().encode("utf-8")
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def header(self) -> bytes:
+        self._writer.writerow(CSV_HEADER)
+        return self._take()
+
+    def encode(self, record: Dict[str, Any]) -> bytes:
+        if record["type"] == "conversation":
+            # A conversation with no messages still gets a row
+            data = self._empty_conversation_row()
+            self._conversation = [
+                record["id"], record["title"], _csv_value(record["started_at"]), record["is_flagged"],
+            ]
+            self._conversation_rows = 0
+            return data
+        self._conversation_rows += 1
+        self._writer.writerow(self._conversation + [
+            record["id"], _csv_value(record["role"]), record["content"], record["is_flagged"],
+            record["flag_reason"] or "", _csv_value(record["created_at"]),
+        ])
+        return self._take()
+
+    def _empty_conversation_row(self) -> bytes:
+        if self._conversation and not self._conversation_rows:
+            self._writer.writerow(self._conversation + [""] * 6)
+            return self._take()
+        return b""
+
+    def finish(self) -> bytes:
+        return self._empty_conversation_row()
+
+
+def _csv_value(value: Any) -> str:
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return getattr(value, "value", value)
+
+
+async def export_transcript(
+    session_factory: async_sessionmaker,
+    child_id: int,
+    export_format: str = "ndjson",
+    gzip: bool = False,
+    batch_size: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Encoded export body, optionally gzip-compressed, as a byte stream.
+
+    Args:
+        session_factory: Factory for short-lived database sessions
+        child_id: Child whose history to export
+        export_format: "ndjson" (a conversation line, then its message lines) or "csv" (one row per message)
+        gzip: Compress the stream (a .gz file, not Content-Encoding)
+        batch_size: Rows per keyset read (defaults to settings)
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    csv_encoder = _CSVEncoder() if export_format == "csv" else None
+    out = bytearray()
+
+    def take(force: bool = False) -> Optional[bytes]:
+        nonlocal out
+        if not out or (compressor is not None and not force and len(out) < FLUSH_BYTES):
+            return None
+        data = bytes(out)
+        out = bytearray()
+        return data
+
+    def write(data: bytes) -> None:
+        out.extend(compressor.compress(data) if compressor is not None else data)
+
+    if csv_encoder is not None:
+        write(csv_encoder.header())
+
+    batch = batch_size or settings.EXPORT_BATCH_SIZE
+    records = 0
+    async for record in iter_transcript(session_factory, child_id, batch):
+        write(csv_encoder.encode(record) if csv_encoder is not None else encode_ndjson(record))
+        records += 1
+        if records % batch == 0:
+            chunk = take()
+            if chunk:
+                yield chunk
+
+    if csv_encoder is not None:
+        write(csv_encoder.finish())
+    if compressor is not None:
+        out.extend(compressor.flush())
+    chunk = take(force=True)
+    if chunk:
+        yield chunk
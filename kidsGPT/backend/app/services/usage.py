@@ -0,0 +1,164 @@
+"""
+Token usage ledger and its per-family aggregates.
+
+Every answered turn appends one usage_ledger row (model, input, output and
+cached tokens) and bumps the family's usage_daily row for that UTC day and
+model, in the same transaction as the messages. Admin reports then sum a
+few aggregate rows per day instead of scanning messages or the ledger.
+
+Costs are estimates from AI_TOKEN_PRICES, applied when reports are read,
+so a price change re-prices history without rewriting it.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import upsert_insert
+from app.models import UsageDaily, UsageRecord, User
+
+GroupBy = Literal["parent", "model", "tier", "day"]
+
+TOKEN_FIELDS = ("input_tokens", "output_tokens", "cached_tokens")
+
+
+def usage_entry(
+    parent_id: int,
+    child_id: int,
+    conversation_id: int,
+    message_id: int,
+    model: str,
+    input_tokens: int,
+    output_tokens: int,
+    cached_tokens: int = 0,
+    created_at: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """One turn's ledger row, as record_usage takes it."""
+    return {
+        "parent_id": parent_id,
+        "child_id": child_id,
+        "conversation_id": conversation_id,
+        "message_id": message_id,
+        "model": model,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cached_tokens": cached_tokens,
+        "created_at": created_at or datetime.utcnow(),
+    }
+
+
+async def record_usage(db: AsyncSession, entries: Sequence[Dict[str, Any]]) -> None:
+    """
+    Append usage_entry rows to the ledger and add them to the daily aggregates, in the caller's transaction.
+
+    Turns that used no tokens (deflected, failed) are not recorded.
+    """
+    entries = [entry for entry in entries if entry["input_tokens"] or entry["output_tokens"]]
+    if not entries:
+        return
+    totals: Dict[Tuple[int, date, str], Dict[str, int]] = defaultdict(lambda: dict.fromkeys(("turns", *TOKEN_FIELDS), 0))
+    for entry in entries:
+        row = totals[(entry["parent_id"], entry["created_at"].date(), entry["model"])]
+        row["turns"] += 1
+        for field in TOKEN_FIELDS:
+            row[field] += entry[field]
+
+    await db.execute(insert(UsageRecord), list(entries))
+    connection = await db.connection()
+    table = UsageDaily.__table__
+    statement = upsert_insert(connection.dialect.name)(table).values(
+        parent_id=bindparam("b_parent_id"),
+        day=bindparam("b_day"),
+        model=bindparam("b_model"),
+        turns=bindparam("b_turns"),
+        **{field: bindparam(f"b_{field}") for field in TOKEN_FIELDS},
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.parent_id, table.c.day, table.c.model],
+        set_={
+            field: table.c[field] + statement.excluded[field] for field in ("turns", *TOKEN_FIELDS)
+        },
+    )
+    await db.execute(statement, [
+        {"b_parent_id": parent_id, "b_day": day, "b_model": model, **{f"b_{k}": v for k, v in row.items()}}
+        for (parent_id, day, model), row in totals.items()
+    ])
+
+
+def token_prices(model: str) -> Optional[List[float]]:
+    """AI_TOKEN_PRICES for a model, matching dated snapshots ("gpt-4o-2024-08-06") by prefix."""
+    if model in settings.AI_TOKEN_PRICES:
+        return settings.AI_TOKEN_PRICES[model]
+    prefixes = [name for name in settings.AI_TOKEN_PRICES if model.startswith(name)]
+    return settings.AI_TOKEN_PRICES[max(prefixes, key=len)] if prefixes else None
+
+
+def estimated_cost(model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> Optional[float]:
+    """Estimated USD cost of some tokens (None if the model has no price configured)."""
+    prices = token_prices(model)
+    if prices is None:
+        return None
+    input_price, output_price = prices[0], prices[1]
+    cached_price = prices[2] if len(prices) > 2 else input_price
+    cost = (input_tokens - cached_tokens) * input_price + cached_tokens * cached_price + output_tokens * output_price
+    return round(cost / 1_000_000, 6)
+
+
+async def usage_totals(
+    db: AsyncSession,
+    group_by: GroupBy,
+    start: date,
+    end: date,
+    parent_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Token totals between two UTC days (inclusive), read from the daily aggregates.
+
+    Rows are keyed by the grouping ("parent_id", "model", "tier" or "day"),
+    largest first (oldest first for days), each with an estimated cost. The
+    cost is summed per model, so it is None if any model has no price.
+    """
+    key = {
+        "parent": UsageDaily.parent_id,
+        "model": UsageDaily.model,
+        "tier": User.subscription_tier,
+        "day": UsageDaily.day,
+    }[group_by]
+    query = (
+        select(
+            key.label("key"),
+            UsageDaily.model,
+            func.sum(UsageDaily.turns),
+            *(func.sum(getattr(UsageDaily, field)) for field in TOKEN_FIELDS),
+        )
+        .where(UsageDaily.day >= start, UsageDaily.day <= end)
+        .group_by(key, UsageDaily.model)
+    )
+    if group_by == "tier":
+        query = query.join(User, User.id == UsageDaily.parent_id)
+    if parent_id is not None:
+        query = query.where(UsageDaily.parent_id == parent_id)
+
+    totals: Dict[Any, Dict[str, Any]] = {}
+    for key_value, model, turns, input_tokens, output_tokens, cached_tokens in await db.execute(query):
+        row = totals.setdefault(key_value, {
+            "key": key_value.value if group_by == "tier" else key_value,
+            "turns": 0, "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0, "estimated_cost_usd": 0.0,
+        })
+        row["turns"] += turns
+        row["input_tokens"] += input_tokens
+        row["output_tokens"] += output_tokens
+        row["cached_tokens"] += cached_tokens
+        cost = estimated_cost(model, input_tokens, output_tokens, cached_tokens)
+        row["estimated_cost_usd"] = None if cost is None or row["estimated_cost_usd"] is None else round(
+            row["estimated_cost_usd"] + cost, 6
+        )
+
+    rows = list(totals.values())
+    if group_by == "day":
+        return sorted(rows, key=lambda row: row["key"])
+    return sorted(rows, key=lambda row: row["input_tokens"] + row["output_tokens"], reverse=True)
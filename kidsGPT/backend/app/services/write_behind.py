@@ -0,0 +1,380 @@
+"""
+Write-behind persistence for chat turns.
+
+A write-through turn costs one transaction: two message inserts, two
+counter updates and a commit. On SQLite every commit is a journal sync,
+so commit latency caps turns per second however fast the model is.
+
+With write-behind, a finished turn is queued in memory and the caller
+carries on. A single writer task drains the queue and writes everything
+that arrived within WRITE_BEHIND_MAX_DELAY_MS (or WRITE_BEHIND_MAX_ROWS
+rows) as one batch: one bulk insert, one counter update per conversation
+and one commit for all of them (group commit). The child's daily quota
+is not batched: it is counted when the turn is queued (see
+app.services.chat_session.count_turn), so a refused turn is never
+acknowledged.
+
+Message ids are needed before the row exists (the client gets them in the
+"done" event), so they come from IdAllocator, which reserves them from the
+database in blocks (hi/lo). While write-behind is on, every message insert
+must take its id from the allocator.
+
+Trade-off: a turn is acknowledged before it is durable. A crash loses the
+turns of the last few milliseconds; a clean shutdown (lifespan) flushes
+everything.
+
+A batch that fails is retried with capped backoff for as long as the
+process runs (callers wait once WRITE_BEHIND_MAX_PENDING turns back up).
+A batch rejected by a constraint is split in halves until the failing
+turns are isolated. Turns that cannot be written - failing at shutdown,
+or rejected on their own - are appended to WRITE_BEHIND_DEAD_LETTER_PATH,
+one turn per line, and written later with:
+
+    python -m app.services.write_behind replay [--path dead_letter.jsonl]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from collections import Counter
+from dataclasses import asdict, dataclass
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import bindparam, case, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import settings
+from app.core.database import async_session_maker, close_db
+from app.core.metrics import WRITE_BEHIND_TURNS
+from app.models import Conversation, FinishReason, IdBlock, Message, MessageRole
+from app.models.daily_stats import activity_params, epoch_minute
+from app.services.daily_stats import record_activity
+from app.services.usage import record_usage
+
+logger = logging.getLogger(__name__)
+
+WRITE_RETRY_BASE_DELAY = 0.1  # Seconds before the first retry of a failed batch; doubles up to the cap
+
+
+class IdAllocator:
+    """
+    Hands out ids for a table from blocks reserved in the id_blocks table.
+
+    One database round trip reserves `block_size` ids; the rest are handed
+    out from memory. Reservations never overlap (the counter is bumped in
+    one atomic UPDATE) and always start above the table's current max id.
+    Ids of a block left unused at shutdown are skipped, not reused.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, name: str = "messages",
+                 id_column=Message.id, block_size: Optional[int] = None):
+        self.session_factory = session_factory
+        self.name = name
+        self.id_column = id_column
+        self.block_size = block_size or settings.ID_BLOCK_SIZE
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def allocate(self, count: int = 1) -> List[int]:
+        """Return `count` unused ids."""
+        async with self._lock:
+            ids: List[int] = []
+            while len(ids) < count:
+                if self._next >= self._end:
+                    self._next, self._end = await self._reserve(max(self.block_size, count - len(ids)))
+                take = min(count - len(ids), self._end - self._next)
+                ids.extend(range(self._next, self._next + take))
+                self._next += take
+            return ids
+
+    async def _reserve(self, size: int) -> Tuple[int, int]:
+        for _ in range(3):
+            async with self.session_factory() as db:
+                floor = (await db.scalar(select(func.max(self.id_column))) or 0) + 1
+                end = await db.scalar(
+                    update(IdBlock)
+                    .where(IdBlock.name == self.name)
+                    .values(next_id=case((IdBlock.next_id > floor, IdBlock.next_id), else_=floor) + size)
+                    .returning(IdBlock.next_id)
+                    .execution_options(synchronize_session=False)
+                )
+                if end is None:
+                    end = floor + size
+                    db.add(IdBlock(name=self.name, next_id=end))
+                try:
+                    await db.commit()
+                except IntegrityError:
+                    # Another worker created the row first; its UPDATE path will work now
+                    await db.rollback()
+                    continue
+            return end - size, end
+        raise RuntimeError(f"Could not reserve an id block for {self.name}")
+
+
+@dataclass
+class PendingTurn:
+    """A finished turn waiting to be written: its two message rows and whose counters it bumps."""
+    conversation_id: int
+    child_id: int
+    rows: List[Dict[str, Any]]  # Message column values, ids included
+    usage: Optional[Dict[str, Any]] = None  # Token usage ledger entry (app.services.usage.usage_entry)
+
+    def to_json(self) -> bytes:
+        return orjson.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, line: bytes) -> "PendingTurn":
+        """Read back a to_json line, typed as the writes expect."""
+        data = orjson.loads(line)
+        for row in data["rows"]:
+            row["role"] = MessageRole(row["role"])
+            row["created_at"] = datetime.fromisoformat(row["created_at"])
+            if row["finish_reason"] is not None:
+                row["finish_reason"] = FinishReason(row["finish_reason"])
+        if data["usage"] is not None:
+            data["usage"]["created_at"] = datetime.fromisoformat(data["usage"]["created_at"])
+        return cls(**data)
+
+
+class WriteBehindQueue:
+    """
+    Queue of finished turns and the task that writes them in batches.
+
+    Usage:
+        writer = WriteBehindQueue(session_factory)
+        writer.start()
+        ids = await writer.allocator.allocate(2)
+        await writer.submit(PendingTurn(...))
+        await writer.close()  # Flushes everything queued
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, max_rows: Optional[int] = None,
+                 max_delay_ms: Optional[float] = None, max_pending: Optional[int] = None,
+                 dead_letter_path: Optional[str] = None):
+        self.session_factory = session_factory
+        self.dead_letter_path = dead_letter_path or settings.WRITE_BEHIND_DEAD_LETTER_PATH
+        self.allocator = IdAllocator(session_factory)
+        self.max_rows = max_rows or settings.WRITE_BEHIND_MAX_ROWS
+        self.max_delay = (max_delay_ms if max_delay_ms is not None else settings.WRITE_BEHIND_MAX_DELAY_MS) / 1000
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending or settings.WRITE_BEHIND_MAX_PENDING)
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self._closing = asyncio.Event()
+        self.batches = 0
+        self.turns_written = 0
+        self.turns_dead_lettered = 0
+        self.turns_dropped = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, turn: PendingTurn) -> None:
+        """Queue a turn. Waits only if WRITE_BEHIND_MAX_PENDING turns are already queued."""
+        if self._closed:
+            raise RuntimeError("Write-behind queue is closed")
+        await self._queue.put(turn)
+
+    async def flush(self) -> None:
+        """Wait until every turn queued so far has been written."""
+        await self._queue.join()
+
+    async def close(self) -> None:
+        """Stop accepting turns, write everything queued (dead-lettering what fails), then stop the writer."""
+        self._closed = True
+        self._closing.set()
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            rows = len(batch[0].rows)
+            deadline = loop.time() + self.max_delay
+            while rows < self.max_rows:
+                try:
+                    turn = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        turn = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                batch.append(turn)
+                rows += len(turn.rows)
+            try:
+                await self._write_with_retry(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write_with_retry(self, batch: List[PendingTurn]) -> None:
+        """
+        Write a batch, retrying until it succeeds; dead-letter it if it never can (shutdown, bad data).
+
+        A constraint violation fails the same way on every retry, so the
+        batch is bisected instead and only the turns that fail alone are
+        dead-lettered.
+        """
+        delay = WRITE_RETRY_BASE_DELAY
+        while True:
+            try:
+                await self.write_batch(batch)
+                self.batches += 1
+                self.turns_written += len(batch)
+                WRITE_BEHIND_TURNS.inc(("written",), len(batch))
+                return
+            except IntegrityError as e:
+                if len(batch) == 1:
+                    self._dead_letter(batch, e)
+                    return
+                middle = len(batch) // 2
+                await self._write_with_retry(batch[:middle])
+                await self._write_with_retry(batch[middle:])
+                return
+            except Exception as e:
+                if self._closed:
+                    self._dead_letter(batch, e)
+                    return
+                logger.warning(f"Write-behind batch of {len(batch)} turns failed, retrying in {delay}s: {e}")
+                try:
+                    await asyncio.wait_for(self._closing.wait(), delay)  # Shutdown: one last try
+                except asyncio.TimeoutError:
+                    pass
+                delay = min(delay * 2, settings.WRITE_BEHIND_RETRY_MAX_SECONDS)
+
+    def _dead_letter(self, batch: List[PendingTurn], error: Exception) -> None:
+        """Append a batch that cannot be written to the dead-letter file, for replay."""
+        try:
+            with open(self.dead_letter_path, "ab") as f:
+                f.write(b"".join(turn.to_json() + b"\n" for turn in batch))
+        except OSError as e:
+            self.turns_dropped += len(batch)
+            WRITE_BEHIND_TURNS.inc(("dropped",), len(batch))
+            logger.error(f"Write-behind batch of {len(batch)} turns failed ({error}) and could not be saved, dropping it: {e}")
+            return
+        self.turns_dead_lettered += len(batch)
+        WRITE_BEHIND_TURNS.inc(("dead_lettered",), len(batch))
+        logger.error(f"Write-behind batch of {len(batch)} turns failed, saved to {self.dead_letter_path}: {error}")
+
+    async def write_batch(self, batch: List[PendingTurn]) -> None:
+        """Write turns in one transaction: bulk insert, aggregated counter updates, one commit."""
+        per_conversation = Counter()
+        activity: Dict[Tuple[int, date], Dict[str, Any]] = {}
+        for turn in batch:
+            per_conversation[turn.conversation_id] += len(turn.rows)
+            sent_at = turn.rows[0]["created_at"]
+            day = activity.setdefault((turn.child_id, sent_at.date()), {"messages": 0, "tokens": 0, "minutes": []})
+            day["messages"] += len(turn.rows)
+            day["tokens"] += sum(row["tokens_used"] or 0 for row in turn.rows)
+            day["minutes"].append(epoch_minute(sent_at))
+
+        conversations = Conversation.__table__
+        async with self.session_factory() as db:
+            await db.execute(insert(Message), [row for turn in batch for row in turn.rows])
+            await db.execute(
+                update(conversations)
+                .where(conversations.c.id == bindparam("b_conversation_id"))
+                .values(message_count=conversations.c.message_count + bindparam("b_count")),
+                [{"b_conversation_id": cid, "b_count": count} for cid, count in per_conversation.items()],
+            )
+            await record_usage(db, [turn.usage for turn in batch if turn.usage is not None])
+            await record_activity(db, [
+                activity_params(child_id, day, **values) for (child_id, day), values in activity.items()
+            ])
+            await db.commit()
+
+
+_writer: Optional[WriteBehindQueue] = None
+
+
+def start_write_behind(session_factory: async_sessionmaker) -> WriteBehindQueue:
+    """Create and start the process-wide write-behind queue (called from lifespan)."""
+    global _writer
+    _writer = WriteBehindQueue(session_factory)
+    _writer.start()
+    return _writer
+
+
+def get_write_behind() -> Optional[WriteBehindQueue]:
+    """The running write-behind queue, or None when turns are written through."""
+    return _writer
+
+
+async def stop_write_behind() -> None:
+    """Flush and stop the write-behind queue (called from lifespan)."""
+    global _writer
+    if _writer is not None:
+        writer, _writer = _writer, None
+        await writer.close()
+        logger.info(f"Write-behind flushed: {writer.turns_written} turns in {writer.batches} batches")
+        if writer.turns_dead_lettered or writer.turns_dropped:
+            logger.error(
+                f"Write-behind: {writer.turns_dead_lettered} turns saved to {writer.dead_letter_path} for replay, "
+                f"{writer.turns_dropped} dropped"
+            )
+
+
+async def replay_dead_letters(session_factory: async_sessionmaker, path: Optional[str] = None) -> Dict[str, int]:
+    """
+    Write the turns saved in a dead-letter file, one transaction per turn.
+
+    Turns that still fail stay in the file; it is removed once empty.
+    Returns counts of "written" and "failed" turns.
+    """
+    path = path or settings.WRITE_BEHIND_DEAD_LETTER_PATH
+    if not os.path.exists(path):
+        return {"written": 0, "failed": 0}
+    with open(path, "rb") as f:
+        lines = [line for line in f.read().splitlines() if line.strip()]
+
+    writer = WriteBehindQueue(session_factory, dead_letter_path=path)
+    failed = []
+    for line in lines:
+        try:
+            await writer.write_batch([PendingTurn.from_json(line)])
+        except Exception as e:
+            logger.error(f"Replaying a dead-lettered turn failed: {e}")
+            failed.append(line)
+
+    if failed:
+        with open(path, "wb") as f:
+            f.write(b"".join(line + b"\n" for line in failed))
+    else:
+        os.remove(path)
+    return {"written": len(lines) - len(failed), "failed": len(failed)}
+
+
+async def _main(args: argparse.Namespace) -> None:
+    try:
+        totals = await replay_dead_letters(async_session_maker, args.path)
+        print(f"Replayed {totals['written']} turns, {totals['failed']} still failing")
+    finally:
+        await close_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    replay = subcommands.add_parser("replay", help="Write the turns saved in the dead-letter file")
+    replay.add_argument("--path", default=None, help="Dead-letter file (default: WRITE_BEHIND_DEAD_LETTER_PATH)")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
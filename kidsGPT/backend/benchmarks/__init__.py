@@ -0,0 +1 @@
+# Benchmarks package - run from the backend directory, e.g. python -m benchmarks.bench_moderation_batching
@@ -0,0 +1,106 @@
+"""
+Message content codec benchmark.
+
+Builds a corpus of assistant-style replies from the mock provider's facts
+wrapped in the openers and follow-up questions real replies use, trains a
+dictionary on one half and measures the other half three ways:
+
+    plain       stored as is (codec off)
+    deflate     compressed without a dictionary
+    dictionary  compressed with the trained dictionary
+
+and prints stored bytes, compression ratio and encode/decode microseconds
+per message as JSON.
+
+Usage:
+    python -m benchmarks.bench_content_codec --messages 5000
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import List
+
+from ai.providers.mock_provider import DINOSAUR_FACTS, FUN_FACTS, MATH_RESPONSES, SPACE_FACTS
+from app.core import content_codec
+from app.core.config import settings
+
+OPENERS = [
+    "Great question! ", "Ooh, I love this one! ", "What a fun thing to wonder about! ",
+    "That's such a smart question! ", "", "Here's something cool: ",
+]
+FOLLOW_UPS = [
+    " What else would you like to know?", " Would you like to hear another fun fact?",
+    " Can you think of another animal that does something amazing?", " Isn't that amazing?", "",
+]
+FACTS = FUN_FACTS + DINOSAUR_FACTS + SPACE_FACTS + MATH_RESPONSES
+
+
+def build_corpus(count: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    return [
+        rng.choice(OPENERS) + " ".join(rng.sample(FACTS, rng.randint(1, 2))) + rng.choice(FOLLOW_UPS)
+        for _ in range(count)
+    ]
+
+
+def measure(corpus: List[str], enabled: bool, dictionary_id: int, repeat: int) -> dict:
+    settings.CONTENT_DICTIONARY_ID = dictionary_id
+    encoded = [content_codec.encode_content(text, enabled=enabled) for text in corpus]
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in corpus:
+            content_codec.encode_content(text, enabled=enabled)
+    encode_us = (time.perf_counter() - started) / (repeat * len(corpus)) * 1e6
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for value in encoded:
+            content_codec.decode_content(value)
+    decode_us = (time.perf_counter() - started) / (repeat * len(corpus)) * 1e6
+
+    raw_bytes = sum(len(text.encode("utf-8")) for text in corpus)
+    stored_bytes = sum(len(value.encode("utf-8")) for value in encoded)
+    return {
+        "raw_bytes": raw_bytes,
+        "stored_bytes": stored_bytes,
+        "ratio": round(raw_bytes / stored_bytes, 2),
+        "compressed_rows": sum(value.startswith(content_codec.COMPRESSED) for value in encoded),
+        "encode_us_per_message": round(encode_us, 2),
+        "decode_us_per_message": round(decode_us, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000, help="Messages to train on, and again to measure")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing passes over the measured messages")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    training = build_corpus(args.messages, args.seed)
+    measured = build_corpus(args.messages, args.seed + 1)
+
+    started = time.perf_counter()
+    dictionary = content_codec.train_dictionary(training)
+    train_seconds = time.perf_counter() - started
+    content_codec.register_dictionary(1, dictionary)
+
+    results = {
+        "plain": measure(measured, enabled=False, dictionary_id=0, repeat=args.repeat),
+        "deflate": measure(measured, enabled=True, dictionary_id=0, repeat=args.repeat),
+        "dictionary": measure(measured, enabled=True, dictionary_id=1, repeat=args.repeat),
+    }
+    print(json.dumps({
+        "messages": args.messages,
+        "min_bytes": settings.CONTENT_COMPRESSION_MIN_BYTES,
+        "dictionary_bytes": len(dictionary),
+        "train_seconds": round(train_seconds, 3),
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Application import-time benchmark.
+
+Imports the app in fresh interpreters with `python -X importtime` (what a
+new worker pays before serving its first request) and prints, as JSON,
+the median cumulative import time of the target module, the slowest
+top-level packages it pulled in, and any deferred SDK that was loaded.
+
+Exits with status 1 when the median exceeds --max-ms or a deferred SDK
+(provider SDKs, Firebase) is imported at startup, so it can guard against
+regressions in CI:
+
+    python -m benchmarks.bench_import_time --runs 5 --max-ms 1500
+
+The threshold is machine dependent; set it from a baseline run on the CI
+runner, with some headroom.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# Loaded on first use (app.services.ai_service, ai.providers, app.core.firebase); never at startup
+DEFERRED = ("openai", "anthropic", "firebase_admin", "google.auth")
+
+
+def import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    """Self and cumulative microseconds per module, for one import of `module` in a fresh interpreter."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def deferred_loaded(modules) -> List[str]:
+    """The DEFERRED SDK modules among `modules`."""
+    return sorted(name for name in modules if any(name == sdk or name.startswith(f"{sdk}.") for sdk in DEFERRED))
+
+
+def top_packages(times: Dict[str, Tuple[int, int]], count: int) -> List[Tuple[str, float]]:
+    """The slowest top-level packages, by the self time of all their modules, in milliseconds."""
+    totals: Dict[str, int] = defaultdict(int)
+    for name, (self_us, _) in times.items():
+        totals[name.split(".")[0]] += self_us
+    return [(name, round(us / 1000, 1)) for name, us in sorted(totals.items(), key=lambda item: -item[1])[:count]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time (the median is reported)")
+    parser.add_argument("--max-ms", type=float, default=1500.0, help="Fail above this median import time")
+    parser.add_argument("--top", type=int, default=10, help="Slowest packages to list")
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    median_ms = statistics.median(times[args.module][1] for times in runs) / 1000
+    loaded = deferred_loaded(runs[-1])
+    print(json.dumps({
+        "module": args.module,
+        "runs": args.runs,
+        "median_ms": round(median_ms, 1),
+        "max_ms": args.max_ms,
+        "slowest_packages_ms": dict(top_packages(runs[-1], args.top)),
+        "deferred_sdks_loaded": loaded,
+    }, indent=2))
+
+    if median_ms > args.max_ms or loaded:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Metrics recording overhead benchmark.
+
+Measures what instrumentation adds to one request: the raw cost of the
+recording calls a chat request makes, and the end-to-end cost of
+MetricsMiddleware around a trivial ASGI app. Prints results as JSON.
+
+Usage:
+    python -m benchmarks.bench_metrics --iterations 200000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from app.core import metrics
+
+
+def recording_cost(iterations: int) -> float:
+    """Nanoseconds for the recording calls of one chat request."""
+    started = time.perf_counter()
+    for i in range(iterations):
+        metrics.HTTP_LATENCY.observe(0.123, ("POST", "/api/chat"))
+        metrics.HTTP_REQUESTS.inc(("POST", "/api/chat", "200"))
+        metrics.DB_STATEMENTS.observe(9, ("/api/chat",))
+        metrics.DB_TIME.observe(0.004, ("/api/chat",))
+        metrics.FILTER_LATENCY.observe(0.00002, ("input",))
+        metrics.FILTER_LATENCY.observe(0.00003, ("output",))
+        metrics.AI_LATENCY.observe(0.8, ("mock-sparky-v1", "chat"))
+        metrics.AI_TOKENS.inc(("mock-sparky-v1", "input"), 120)
+        metrics.AI_TOKENS.inc(("mock-sparky-v1", "output"), 40)
+    return (time.perf_counter() - started) / iterations * 1e9
+
+
+async def middleware_cost(iterations: int) -> dict:
+    """Nanoseconds per request for a bare ASGI app, with and without MetricsMiddleware."""
+    class Route:
+        path = "/bench"
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    results = {}
+    for label, handler in (("bare", app), ("instrumented", metrics.MetricsMiddleware(app))):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await handler({"type": "http", "method": "GET", "route": Route()}, receive, send)
+        results[label] = (time.perf_counter() - started) / iterations * 1e9
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200_000)
+    args = parser.parse_args()
+
+    recording_ns = recording_cost(args.iterations)
+    middleware_ns = asyncio.run(middleware_cost(args.iterations))
+    render_started = time.perf_counter()
+    exposition = metrics.render_metrics()
+    render_ms = (time.perf_counter() - render_started) * 1000
+
+    print(json.dumps({
+        "iterations": args.iterations,
+        "recording_ns_per_request": round(recording_ns, 1),
+        "middleware_ns_per_request": round(middleware_ns["instrumented"] - middleware_ns["bare"], 1),
+        "scrape_ms": round(render_ms, 3),
+        "scrape_bytes": len(exposition),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
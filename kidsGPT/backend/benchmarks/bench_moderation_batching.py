@@ -0,0 +1,104 @@
+"""
+Moderation micro-batching throughput benchmark.
+
+Runs concurrent moderation calls against a local stand-in for the
+moderation endpoint (fixed round trip, limited connections) with and
+without MicroBatcher, and prints throughput as JSON.
+
+Usage:
+    python -m benchmarks.bench_moderation_batching --calls 2000 --rtt-ms 30
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from ai.providers.base import ModerationResult
+from ai.providers.batching import MicroBatcher
+
+
+class StandInModerationEndpoint:
+    """Local stand-in: each request costs one round trip, whatever its size."""
+
+    def __init__(self, rtt: float, connections: int):
+        self.rtt = rtt
+        self._connections = asyncio.Semaphore(connections)
+        self.requests = 0
+
+    async def moderate(self, texts: List[str]) -> List[ModerationResult]:
+        async with self._connections:
+            self.requests += 1
+            await asyncio.sleep(self.rtt)
+        return [
+            ModerationResult(is_safe=True, categories={}, category_scores={}, flagged_categories=[])
+            for _ in texts
+        ]
+
+
+async def run(calls: int, concurrency: int, rtt: float, connections: int, batcher_args: dict = None) -> dict:
+    """Drive `calls` moderation calls with `concurrency` callers."""
+    endpoint = StandInModerationEndpoint(rtt, connections)
+    if batcher_args is None:
+        async def moderate(text: str) -> ModerationResult:
+            return (await endpoint.moderate([text]))[0]
+    else:
+        batcher = MicroBatcher(endpoint.moderate, **batcher_args)
+        moderate = batcher.submit
+
+    remaining = iter(range(calls))
+    latencies: List[float] = []
+
+    async def caller():
+        for i in remaining:
+            started = time.perf_counter()
+            await moderate(f"message {i}")
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "calls": calls,
+        "round_trips": endpoint.requests,
+        "seconds": round(elapsed, 3),
+        "calls_per_second": round(calls / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--rtt-ms", type=float, default=30.0)
+    parser.add_argument("--connections", type=int, default=10, help="Max concurrent HTTP connections")
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    common = dict(
+        calls=args.calls,
+        concurrency=args.concurrency,
+        rtt=args.rtt_ms / 1000,
+        connections=args.connections,
+    )
+    unbatched = asyncio.run(run(**common))
+    batched = asyncio.run(run(
+        **common,
+        batcher_args={"max_batch_size": args.batch_size, "max_wait": args.window_ms / 1000},
+    ))
+
+    print(json.dumps({
+        "unbatched": unbatched,
+        "batched": batched,
+        "speedup": round(batched["calls_per_second"] / unbatched["calls_per_second"], 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Response serialization benchmark.
+
+Serves large payloads - a long chat transcript and a page of admin users -
+from small FastAPI apps three ways and measures CPU time per response:
+
+    default    response_model + FastAPI's JSONResponse (re-validate, jsonable_encoder, json.dumps)
+    orjson     response_model + ORJSONResponse (re-validate, then orjson)
+    pydantic   PydanticResponse (serialize the validated models once, in pydantic-core)
+
+Usage:
+    python -m benchmarks.bench_serialization --messages 500 --users 1000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse
+from httpx import ASGITransport, AsyncClient
+
+from app.core.responses import PydanticResponse
+from app.models import MessageRole
+from app.routers.admin import UserListItem
+from app.schemas import ConversationWithMessages, MessageResponse
+
+MODES = ["default", "orjson", "pydantic"]
+
+
+def build_transcript(messages: int) -> ConversationWithMessages:
+    started = datetime(2024, 5, 1, 16, 0, 0)
+    return ConversationWithMessages(
+        id=1, child_id=1, title="Why is the sky blue?", started_at=started, ended_at=None,
+        is_flagged=False, message_count=messages,
+        messages=[
+            MessageResponse(
+                id=i, conversation_id=1,
+                role=MessageRole.CHILD if i % 2 == 0 else MessageRole.ASSISTANT,
+                content=("Why is the sky blue?" if i % 2 == 0 else
+                         "Great question! Sunlight is made of many colors, and the air scatters blue light the most. " * 3),
+                is_flagged=False, created_at=started + timedelta(seconds=20 * i),
+            )
+            for i in range(messages)
+        ],
+    )
+
+
+def build_users(count: int) -> List[UserListItem]:
+    now = datetime(2024, 5, 1)
+    return [
+        UserListItem(
+            id=i, email=f"parent{i}@example.com", display_name=f"Parent {i}", role="parent",
+            subscription_tier="basic", is_active=True, created_at=now - timedelta(days=i % 365),
+            children_count=i % 4, total_messages=i * 7,
+        )
+        for i in range(count)
+    ]
+
+
+def build_app(mode: str, transcript: ConversationWithMessages, users: List[UserListItem]) -> FastAPI:
+    response_class = ORJSONResponse if mode == "orjson" else JSONResponse
+    app = FastAPI(default_response_class=response_class)
+
+    @app.get("/transcript", response_model=ConversationWithMessages)
+    async def get_transcript():
+        return PydanticResponse(transcript) if mode == "pydantic" else transcript
+
+    @app.get("/users", response_model=List[UserListItem])
+    async def get_users():
+        return PydanticResponse(users) if mode == "pydantic" else users
+
+    return app
+
+
+async def measure(app: FastAPI, path: str, iterations: int) -> dict:
+    """CPU and wall time per response, after a warm-up."""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        for _ in range(5):
+            response = await client.get(path)
+        cpu_started, wall_started = time.process_time(), time.perf_counter()
+        for _ in range(iterations):
+            await client.get(path)
+        cpu = time.process_time() - cpu_started
+        wall = time.perf_counter() - wall_started
+    return {
+        "bytes": len(response.content),
+        "cpu_ms_per_response": round(cpu / iterations * 1000, 3),
+        "wall_ms_per_response": round(wall / iterations * 1000, 3),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    transcript = build_transcript(args.messages)
+    users = build_users(args.users)
+    results = {}
+    for path in ("/transcript", "/users"):
+        results[path] = {}
+        for mode in MODES:
+            results[path][mode] = await measure(build_app(mode, transcript, users), path, args.iterations)
+        default_cpu = results[path]["default"]["cpu_ms_per_response"]
+        fast_cpu = results[path]["pydantic"]["cpu_ms_per_response"]
+        results[path]["cpu_saved_ms_per_response"] = round(default_cpu - fast_cpu, 3)
+        results[path]["speedup"] = round(default_cpu / fast_cpu, 2) if fast_cpu else None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500, help="Messages in the transcript payload")
+    parser.add_argument("--users", type=int, default=1000, help="Users in the admin payload")
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps({"messages": args.messages, "users": args.users, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+SSE framing benchmark.
+
+Streams word-sized chunks (as MockProvider and most providers emit them)
+through the old one-frame-per-chunk encoder and through SSEWriter, and
+prints frames sent, frames per second of encoding work and bytes on the
+wire per token as JSON.
+
+Two runs per mode: 'burst' (chunks arrive as fast as they are read, i.e.
+pure encoding cost) and 'paced' (chunks arrive at --tokens-per-second, as
+from a real model, where the coalescing window decides frame count).
+
+Usage:
+    python -m benchmarks.bench_sse --tokens 300 --tokens-per-second 60
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import AsyncIterator, List
+
+from app.core.sse import SSEWriter
+
+WORDS = "Stars are giant balls of hot gas that make their own light far away in space".split()
+
+
+async def tokens(count: int, tokens_per_second: float = 0.0) -> AsyncIterator[str]:
+    """Word chunks, optionally paced like a model streaming output."""
+    interval = 1 / tokens_per_second if tokens_per_second else 0.0
+    for i in range(count):
+        if interval:
+            await asyncio.sleep(interval)
+        yield WORDS[i % len(WORDS)] + " "
+
+
+async def per_chunk_frames(chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """The previous framing: one json.dumps and one frame per chunk."""
+    async for chunk in chunks:
+        yield f"data: {json.dumps({'chunk': chunk})}\n\n".encode()
+    yield f"data: {json.dumps({'done': True})}\n\n".encode()
+
+
+async def measure(frames: AsyncIterator[bytes], token_count: int) -> dict:
+    sizes: List[int] = []
+    cpu_started, wall_started = time.process_time(), time.perf_counter()
+    async for frame in frames:
+        sizes.append(len(frame))
+    cpu = time.process_time() - cpu_started
+    wall = time.perf_counter() - wall_started
+    return {
+        "frames": len(sizes),
+        "bytes": sum(sizes),
+        "bytes_per_token": round(sum(sizes) / token_count, 2),
+        "frames_per_cpu_second": round(len(sizes) / cpu) if cpu else None,
+        "tokens_per_cpu_second": round(token_count / cpu) if cpu else None,
+        "wall_seconds": round(wall, 3),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    results = {}
+    for label, rate, count in (("burst", 0.0, args.burst_tokens), ("paced", args.tokens_per_second, args.tokens)):
+        writer_kwargs = {"coalesce_bytes": args.coalesce_bytes, "coalesce_ms": args.coalesce_ms}
+        results[label] = {
+            "tokens": count,
+            "per_chunk": await measure(per_chunk_frames(tokens(count, rate)), count),
+            "coalesced": await measure(SSEWriter(tokens(count, rate), **writer_kwargs).frames(), count),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=300, help="Tokens in the paced run")
+    parser.add_argument("--burst-tokens", type=int, default=100_000, help="Tokens in the burst run")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--coalesce-bytes", type=int, default=None, help="Default: SSE_COALESCE_BYTES")
+    parser.add_argument("--coalesce-ms", type=float, default=None, help="Default: SSE_COALESCE_MS")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Chat turn persistence benchmark: write-through vs write-behind.
+
+Runs --sessions concurrent ChatSessions against a fresh SQLite file, each
+saving --turns turns (no model calls: this measures persistence only), and
+prints turns per second for each mode as JSON. The write-behind figure
+includes the final flush, so every turn is on disk when the clock stops.
+
+Usage:
+    python -m benchmarks.bench_write_behind --sessions 50 --turns 20
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.database import Base
+from app.models import Child, Conversation, User
+from app.services import write_behind
+from app.services.chat_session import ChatSession
+from app.services.write_behind import WriteBehindQueue
+
+
+async def setup(path: Path, sessions: int):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    chat_sessions = []
+    async with session_factory() as db:
+        parent = User(email="bench@example.com")
+        db.add(parent)
+        await db.flush()
+        for i in range(sessions):
+            child = Child(parent_id=parent.id, name=f"Kid {i}", age=8, login_pin=f"{i:06d}", daily_message_limit=10**6)
+            db.add(child)
+            await db.flush()
+            conversation = Conversation(child_id=child.id, title="Bench")
+            db.add(conversation)
+            await db.flush()
+            chat_session = ChatSession(session_factory, child)
+            chat_session.conversation_id = conversation.id
+            chat_sessions.append(chat_session)
+        await db.commit()
+    return engine, session_factory, chat_sessions
+
+
+async def run_mode(mode: str, args: argparse.Namespace, directory: Path) -> dict:
+    engine, session_factory, chat_sessions = await setup(directory / f"{mode}.db", args.sessions)
+    queue = None
+    if mode == "write_behind":
+        queue = WriteBehindQueue(session_factory, max_rows=args.max_rows, max_delay_ms=args.max_delay_ms)
+        queue.start()
+        write_behind._writer = queue
+
+    async def chat(session: ChatSession):
+        for i in range(args.turns):
+            await session.save_turn(f"Why is the sky blue? ({i})", "Because air scatters blue light the most!", "mock")
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(chat(session) for session in chat_sessions))
+        if queue is not None:
+            await queue.close()
+        elapsed = time.perf_counter() - started
+    finally:
+        write_behind._writer = None
+        await engine.dispose()
+
+    turns = args.sessions * args.turns
+    result = {"turns": turns, "seconds": round(elapsed, 3), "turns_per_second": round(turns / elapsed)}
+    if queue is not None:
+        result["batches"] = queue.batches
+        result["turns_per_batch"] = round(queue.turns_written / queue.batches, 1) if queue.batches else 0
+    return result
+
+
+async def run(args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        results = {mode: await run_mode(mode, args, Path(directory)) for mode in ("write_through", "write_behind")}
+    results["speedup"] = round(results["write_behind"]["turns_per_second"] / results["write_through"]["turns_per_second"], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50, help="Concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=20, help="Turns per session")
+    parser.add_argument("--max-rows", type=int, default=500)
+    parser.add_argument("--max-delay-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+"""
+In-process load test for the KidsGPT API.
+
+Seeds a temporary SQLite database with synthetic families, then drives the
+ASGI app through httpx (no network, no uvicorn) with scripted scenarios:
+kid login, multi-turn chat, SSE streaming, the parent dashboard and the
+admin views. The AI upstream is MockProvider with simulated latency.
+
+Each scenario runs on its own so that DB statements can be attributed to
+it. Results are printed (and optionally written) as JSON; pass a previous
+result as --baseline to get deltas and a non-zero exit on regressions.
+
+Usage:
+    python -m benchmarks.loadtest --requests 500 --concurrency 20
+    python -m benchmarks.loadtest --output new.json --baseline old.json
+    python -m benchmarks.loadtest --scenarios chat,sse --ttft-ms 300
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+SCENARIOS = ["kid_login", "chat", "sse", "parent_dashboard", "admin"]
+
+CHILD_MESSAGES = [
+    "Tell me a fun fact",
+    "Why is the sky blue?",
+    "Tell me about dinosaurs",
+    "How far away is the moon?",
+    "Can you tell me a story?",
+    "What is 7 plus 5?",
+    "Who are you?",
+    "What do sharks eat?",
+]
+
+
+def configure_environment(args: argparse.Namespace, db_path: str) -> None:
+    """Point settings at a scratch database and a simulated mock upstream (before app import)."""
+    os.environ.update({
+        "DATABASE_URL": f"sqlite+aiosqlite:///{db_path}",
+        "DEBUG": "false",
+        "DEFAULT_AI_PROVIDER": "mock",
+        "AI_FALLBACK_PROVIDERS": "[]",
+        "MOCK_SIMULATE": "true",
+        "MOCK_TTFT_MS": str(args.ttft_ms),
+        "MOCK_TOKENS_PER_SECOND": str(args.tokens_per_second),
+        "MOCK_ERROR_RATE": str(args.error_rate),
+        "MOCK_SEED": str(args.seed),
+    })
+
+
+@dataclass
+class SyntheticData:
+    """IDs of the seeded rows that scenarios pick from."""
+    admin_id: int
+    parents: Dict[int, List[int]]  # parent_id -> child ids
+    pins: List[str]
+    child_ids: List[int] = field(default_factory=list)
+
+
+async def seed(args: argparse.Namespace, rng: random.Random) -> SyntheticData:
+    """Create tables and bulk-insert synthetic users, children, conversations and messages."""
+    from sqlalchemy import insert
+
+    from app.core.database import async_session_maker, init_db
+    from app.models import Child, Conversation, Message, MessageRole, User, UserRole, SubscriptionTier
+
+    await init_db()
+    now = datetime.utcnow()
+
+    users = [{
+        "id": 1, "email": "admin@loadtest.local", "display_name": "Admin",
+        "role": UserRole.ADMIN, "subscription_tier": SubscriptionTier.PREMIUM,
+        "is_active": True, "created_at": now, "updated_at": now,
+    }]
+    children, conversations, messages = [], [], []
+    parents: Dict[int, List[int]] = {}
+    child_id = conversation_id = 0
+
+    for parent_id in range(2, args.parents + 2):
+        users.append({
+            "id": parent_id, "email": f"parent{parent_id}@loadtest.local",
+            "display_name": f"Parent {parent_id}", "role": UserRole.PARENT,
+            "subscription_tier": SubscriptionTier.PREMIUM, "is_active": True,
+            "created_at": now - timedelta(days=rng.randint(0, 365)), "updated_at": now,
+        })
+        parents[parent_id] = []
+        for _ in range(rng.randint(1, args.max_children)):
+            child_id += 1
+            parents[parent_id].append(child_id)
+            children.append({
+                "id": child_id, "parent_id": parent_id, "name": f"Kid{child_id}",
+                "age": rng.randint(3, 13), "login_pin": f"{child_id:06d}",
+                "interests": rng.sample(["dinosaurs", "space", "art", "math", "animals"], 2),
+                "daily_message_limit": 1_000_000, "messages_today": 0,
+                "is_active": True, "created_at": now, "updated_at": now,
+            })
+            for _ in range(args.conversations):
+                conversation_id += 1
+                started = now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+                flagged = rng.random() < 0.02
+                conversations.append({
+                    "id": conversation_id, "child_id": child_id,
+                    "title": rng.choice(CHILD_MESSAGES), "started_at": started,
+                    "is_flagged": flagged, "flag_reason": "synthetic" if flagged else None,
+                    "message_count": args.messages,
+                })
+                for i in range(args.messages):
+                    child_turn = i % 2 == 0
+                    messages.append({
+                        "conversation_id": conversation_id,
+                        "role": MessageRole.CHILD if child_turn else MessageRole.ASSISTANT,
+                        "content": rng.choice(CHILD_MESSAGES) if child_turn else "That's a great question! " * 8,
+                        "is_flagged": False,
+                        "created_at": started + timedelta(seconds=30 * i),
+                        "ai_model": None if child_turn else "mock-sparky-v1",
+                        "tokens_used": None if child_turn else 150,
+                    })
+
+    async with async_session_maker() as session:
+        for model, rows in ((User, users), (Child, children), (Conversation, conversations), (Message, messages)):
+            for start in range(0, len(rows), 5000):
+                await session.execute(insert(model), rows[start:start + 5000])
+        await session.commit()
+
+    child_ids = [cid for ids in parents.values() for cid in ids]
+    return SyntheticData(
+        admin_id=1,
+        parents=parents,
+        pins=[f"{cid:06d}" for cid in child_ids],
+        child_ids=child_ids,
+    )
+
+
+class Recorder:
+    """Collects per-request latencies and status codes for one scenario."""
+
+    def __init__(self, app):
+        self.app = app
+        self.latencies: List[float] = []
+        self.first_byte: List[float] = []
+        self.errors = 0
+
+    async def request(self, client, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors += 1
+        return response
+
+    async def stream(self, path: str, payload: Dict) -> None:
+        """
+        POST to a streaming endpoint by calling the ASGI app directly.
+
+        httpx's ASGITransport buffers the whole body, which would hide
+        time to first byte, so SSE requests bypass it.
+        """
+        body = json.dumps(payload).encode()
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": b"", "root_path": "", "server": ("loadtest", 80), "client": ("127.0.0.1", 0),
+            "headers": [(b"host", b"loadtest"), (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode())],
+        }
+        received = False
+        state = {"status": 0, "first_byte": None}
+        started = time.perf_counter()
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.Event().wait()  # Client never disconnects
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body" and message.get("body") and state["first_byte"] is None:
+                state["first_byte"] = time.perf_counter() - started
+
+        await self.app(scope, receive, send)
+        self.latencies.append(time.perf_counter() - started)
+        if state["first_byte"] is not None:
+            self.first_byte.append(state["first_byte"])
+        if state["status"] >= 400 or state["first_byte"] is None:
+            self.errors += 1
+
+
+Scenario = Callable[[object, Recorder, SyntheticData, random.Random], Awaitable[None]]
+
+
+async def kid_login(client, rec: Recorder, data: SyntheticData, rng: random.Random) -> None:
+    await rec.request(client, "POST", "/api/auth/kid-login", json={"pin": rng.choice(data.pins)})
+
+
+async def chat(client, rec: Recorder, data: SyntheticData, rng: random.Random) -> None:
+    """Three-turn conversation: the first turn opens it, the rest carry its history."""
+    child_id = rng.choice(data.child_ids)
+    conversation_id = None
+    for _ in range(3):
+        response = await rec.request(client, "POST", "/api/chat", json={
+            "child_id": child_id,
+            "message": rng.choice(CHILD_MESSAGES),
+            "conversation_id": conversation_id,
+        })
+        if response.status_code != 200:
+            return
+        conversation_id = response.json()["conversation_id"]
+
+
+async def sse(client, rec: Recorder, data: SyntheticData, rng: random.Random) -> None:
+    await rec.stream("/api/chat/stream", {
+        "child_id": rng.choice(data.child_ids),
+        "message": rng.choice(CHILD_MESSAGES),
+    })
+
+
+async def parent_dashboard(client, rec: Recorder, data: SyntheticData, rng: random.Random) -> None:
+    """What the parent app loads on open: children, then each child's history and today's stats."""
+    parent_id = rng.choice(list(data.parents))
+    await rec.request(client, "GET", "/api/children", params={"parent_id": parent_id})
+    for child_id in data.parents[parent_id]:
+        await rec.request(client, "GET", f"/api/chat/conversations/{child_id}", params={"parent_id": parent_id})
+        await rec.request(client, "GET", f"/api/chat/today/{child_id}")
+
+
+async def admin(client, rec: Recorder, data: SyntheticData, rng: random.Random) -> None:
+    params = {"admin_id": data.admin_id}
+    await rec.request(client, "GET", "/api/admin/stats", params=params)
+    await rec.request(client, "GET", "/api/admin/users", params=params)
+    await rec.request(client, "GET", "/api/admin/flagged-conversations", params=params)
+
+
+SCENARIO_FUNCS: Dict[str, Scenario] = {
+    "kid_login": kid_login,
+    "chat": chat,
+    "sse": sse,
+    "parent_dashboard": parent_dashboard,
+    "admin": admin,
+}
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(rec: Recorder, elapsed: float, statements: int) -> Dict:
+    """Latency percentiles, throughput and DB load for one scenario."""
+    latencies = sorted(rec.latencies)
+    count = len(latencies)
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * 1000, 2)
+
+    summary = {
+        "requests": count,
+        "errors": rec.errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(count / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "db_statements_per_request": round(statements / count, 2) if count else 0.0,
+    }
+    if rec.first_byte:
+        first_byte = sorted(rec.first_byte)
+        summary["ttfb_p50_ms"] = ms(percentile(first_byte, 50))
+        summary["ttfb_p95_ms"] = ms(percentile(first_byte, 95))
+    return summary
+
+
+async def run_scenario(
+    name: str,
+    app,
+    client,
+    data: SyntheticData,
+    iterations: int,
+    concurrency: int,
+    seed_value: int,
+    statement_counter: List[int],
+) -> Dict:
+    """Run `iterations` of a scenario spread over `concurrency` virtual users."""
+    scenario = SCENARIO_FUNCS[name]
+    rec = Recorder(app)
+    remaining = iter(range(iterations))
+
+    async def user(index: int):
+        rng = random.Random(f"{seed_value}:{name}:{index}")
+        for _ in remaining:
+            await scenario(client, rec, data, rng)
+
+    statement_counter[0] = 0
+    started = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return summarize(rec, elapsed, statement_counter[0])
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> Dict:
+    """Per-scenario change against a baseline run, flagging regressions beyond tolerance."""
+    comparison = {}
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        deltas = {}
+        for key in ("p50_ms", "p95_ms", "p99_ms", "requests_per_second", "db_statements_per_request"):
+            if current.get(key) is None or not previous.get(key):
+                continue
+            deltas[key] = round((current[key] - previous[key]) / previous[key] * 100, 1)
+
+        regressed = (
+            deltas.get("p95_ms", 0) > tolerance
+            or deltas.get("requests_per_second", 0) < -tolerance
+            or deltas.get("db_statements_per_request", 0) > tolerance
+        )
+        comparison[name] = {"change_percent": deltas, "regressed": regressed}
+    return comparison
+
+
+async def main_async(args: argparse.Namespace) -> Dict:
+    from httpx import ASGITransport, AsyncClient
+    from sqlalchemy import event
+
+    from app.core.database import close_db, engine
+    from app.main import app
+
+    rng = random.Random(args.seed)
+    seed_started = time.perf_counter()
+    data = await seed(args, rng)
+    seed_seconds = time.perf_counter() - seed_started
+
+    statement_counter = [0]
+
+    def count_statement(*_):
+        statement_counter[0] += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+
+    scenarios = {}
+    transport = ASGITransport(app=app)
+    try:
+        async with AsyncClient(transport=transport, base_url="http://loadtest", timeout=60.0) as client:
+            for name in args.scenarios:
+                scenarios[name] = await run_scenario(
+                    name, app, client, data, args.requests, args.concurrency, args.seed, statement_counter
+                )
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
+        await close_db()
+
+    return {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "parents": args.parents,
+            "children": len(data.child_ids),
+            "conversations_per_child": args.conversations,
+            "messages_per_conversation": args.messages,
+            "ttft_ms": args.ttft_ms,
+            "tokens_per_second": args.tokens_per_second,
+            "error_rate": args.error_rate,
+            "seed": args.seed,
+            "seed_seconds": round(seed_seconds, 2),
+        },
+        "scenarios": scenarios,
+    }
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset to run")
+    parser.add_argument("--requests", type=int, default=200, help="Scenario iterations per scenario")
+    parser.add_argument("--concurrency", type=int, default=20, help="Virtual users per scenario")
+    parser.add_argument("--parents", type=int, default=500)
+    parser.add_argument("--max-children", type=int, default=3)
+    parser.add_argument("--conversations", type=int, default=20, help="Seeded conversations per child")
+    parser.add_argument("--messages", type=int, default=10, help="Seeded messages per conversation")
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="Mock time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Mock upstream 500 rate")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON result to this file")
+    parser.add_argument("--baseline", help="Compare against a previous JSON result")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="Allowed p95/throughput change, percent")
+    args = parser.parse_args(argv)
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}. Available: {', '.join(SCENARIOS)}")
+    return args
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="kidsgpt-loadtest-") as tmp:
+        configure_environment(args, os.path.join(tmp, "loadtest.db"))
+        results = asyncio.run(main_async(args))
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare(results, json.load(f), args.tolerance)
+        results["baseline"] = {"file": args.baseline, "tolerance_percent": args.tolerance, "scenarios": comparison}
+        if any(entry["regressed"] for entry in comparison.values()):
+            exit_code = 1
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
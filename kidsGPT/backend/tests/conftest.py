@@ -5,6 +5,7 @@ Pytest fixtures and configuration for KidsGPT backend tests.
 import os
 import pytest
 import asyncio
+from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
 # Set test environment before importing app modules
@@ -15,7 +16,9 @@ from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 
 from app.main import app
-from app.core.database import Base, get_db
+from app.core.database import Base, get_db, get_session_factory
+from app.core.sql_instrumentation import instrument_engine
+from app.models import Child, SubscriptionTier, User
 
 
 # Create test engine
@@ -23,6 +26,7 @@ test_engine = create_async_engine(
     "sqlite+aiosqlite:///:memory:",
     echo=False,
 )
+instrument_engine(test_engine)
 
 TestSessionLocal = async_sessionmaker(
     bind=test_engine,
@@ -61,7 +65,13 @@ async def client(db_session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
     async def override_get_db():
         yield db_session
 
+    @asynccontextmanager
+    async def shared_session():
+        yield db_session
+
     app.dependency_overrides[get_db] = override_get_db
+    # Short-lived sessions (streaming, WebSockets) share the test session too
+    app.dependency_overrides[get_session_factory] = lambda: shared_session
 
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
@@ -70,6 +80,27 @@ async def client(db_session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
     app.dependency_overrides.clear()
 
 
+@pytest.fixture
+async def session_factory(tmp_path) -> AsyncGenerator[async_sessionmaker, None]:
+    """A file database of its own: background tasks (writers, job workers) and the test use separate connections."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def make_child(db: AsyncSession, email: str = "parent@test.com", **child_fields) -> Child:
+    """Create a parent and their child Sam (PIN 123456), committed. `child_fields` override Child columns."""
+    parent = User(email=email, subscription_tier=SubscriptionTier.BASIC)
+    db.add(parent)
+    await db.flush()
+    child = Child(parent_id=parent.id, name="Sam", age=8, login_pin="123456", **child_fields)
+    db.add(child)
+    await db.commit()
+    return child
+
+
 @pytest.fixture
 async def test_user(client: AsyncClient) -> dict:
     """Create a test user for tests that need authentication."""
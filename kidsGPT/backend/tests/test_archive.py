@@ -0,0 +1,191 @@
+"""
+Tests for hot/cold message archival.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import get_session_factory
+from app.main import app
+from app.models import ArchivedTranscript, Child, Conversation, FinishReason, Message, MessageRole, User, UserRole
+from app.services.ai_service import get_ai_service
+from app.services.archive import archive_inactive, pack_messages, unpack_messages
+from tests.conftest import make_child
+
+OLD = datetime.utcnow() - timedelta(days=200)
+
+
+async def make_conversation(db: AsyncSession, child: Child, at: datetime, turns: int = 2) -> Conversation:
+    conversation = Conversation(child_id=child.id, title="Dinosaurs", started_at=at, message_count=turns * 2)
+    db.add(conversation)
+    await db.flush()
+    for t in range(turns):
+        db.add_all([
+            Message(conversation_id=conversation.id, role=MessageRole.CHILD, content=f"Question {t}", created_at=at),
+            Message(
+                conversation_id=conversation.id, role=MessageRole.ASSISTANT, content=f"Answer {t}",
+                created_at=at, ai_model="mock", tokens_used=12, finish_reason=FinishReason.STOP,
+            ),
+        ])
+    await db.flush()
+    return conversation
+
+
+def session_factory():
+    return app.dependency_overrides[get_session_factory]()
+
+
+async def live_count(db: AsyncSession) -> int:
+    return await db.scalar(select(func.count(Message.id)))
+
+
+def test_pack_round_trip():
+    """Test that packed records decompress to the same typed values."""
+    records = [{
+        "id": 7, "role": MessageRole.ASSISTANT, "content": "Stars are suns " * 20, "is_flagged": False,
+        "flag_reason": None, "created_at": datetime(2024, 5, 1, 12, 30), "ai_model": "mock",
+        "tokens_used": 40, "finish_reason": FinishReason.LENGTH,
+    }]
+    payload, raw_bytes = pack_messages(records)
+    assert len(payload) < raw_bytes
+    assert unpack_messages(3, payload) == [{**records[0], "conversation_id": 3}]
+
+
+@pytest.mark.asyncio
+class TestArchive:
+    """Tests for the mover and transparent reads."""
+
+    async def test_moves_only_inactive(self, client: AsyncClient, db_session: AsyncSession):
+        """Test that old conversations are archived and recent ones stay live."""
+        child = await make_child(db_session)
+        old = await make_conversation(db_session, child, OLD)
+        recent = await make_conversation(db_session, child, datetime.utcnow())
+
+        totals = await archive_inactive(session_factory(), older_than_days=90, pause_seconds=0)
+
+        assert totals == {"conversations": 1, "messages": 4}
+        assert await live_count(db_session) == 4
+        await db_session.refresh(old)
+        await db_session.refresh(recent)
+        assert old.archived_at is not None
+        assert recent.archived_at is None
+        archive = await db_session.get(ArchivedTranscript, old.id)
+        assert archive.message_count == 4
+
+    async def test_throttled_chunks(self, client: AsyncClient, db_session: AsyncSession):
+        """Test that the mover works in chunks and honours max_conversations."""
+        child = await make_child(db_session)
+        for _ in range(5):
+            await make_conversation(db_session, child, OLD, turns=1)
+
+        first = await archive_inactive(session_factory(), older_than_days=90, chunk_size=2, pause_seconds=0,
+                                       max_conversations=3)
+        assert first["conversations"] == 3
+        rest = await archive_inactive(session_factory(), older_than_days=90, chunk_size=2, pause_seconds=0)
+        assert rest["conversations"] == 2
+        assert await live_count(db_session) == 0
+
+    async def test_reads_are_transparent(self, client: AsyncClient, db_session: AsyncSession):
+        """Test that the conversation view and export are unchanged by archival."""
+        child = await make_child(db_session)
+        conversation = await make_conversation(db_session, child, OLD)
+        detail_url = f"/api/chat/conversation/{conversation.id}"
+        export_url = f"/api/chat/export/{child.id}"
+        params = {"parent_id": child.parent_id}
+
+        detail_before = (await client.get(detail_url, params=params)).json()
+        export_before = (await client.get(export_url, params={**params, "format": "csv"})).text
+        await archive_inactive(session_factory(), older_than_days=90, pause_seconds=0)
+        detail_after = (await client.get(detail_url, params=params)).json()
+        export_after = (await client.get(export_url, params={**params, "format": "csv"})).text
+
+        assert detail_after["messages"] == detail_before["messages"]
+        assert len(detail_after["messages"]) == 4
+        assert export_after == export_before
+
+    async def test_continued_conversation_merges(self, client: AsyncClient, db_session: AsyncSession):
+        """Test that messages added after archival are read after the archive, and archived again later."""
+        child = await make_child(db_session)
+        conversation = await make_conversation(db_session, child, OLD)
+        await archive_inactive(session_factory(), older_than_days=90, pause_seconds=0)
+
+        db_session.add(Message(
+            conversation_id=conversation.id, role=MessageRole.CHILD, content="I'm back!", created_at=OLD,
+        ))
+        await db_session.flush()
+        response = await client.get(f"/api/chat/conversation/{conversation.id}", params={"parent_id": child.parent_id})
+        contents = [m["content"] for m in response.json()["messages"]]
+        assert contents[-1] == "I'm back!"
+        assert len(contents) == 5
+
+        await archive_inactive(session_factory(), older_than_days=90, pause_seconds=0)
+        archive = await db_session.get(ArchivedTranscript, conversation.id)
+        await db_session.refresh(archive)
+        assert archive.message_count == 5
+        assert await live_count(db_session) == 0
+
+    async def test_continued_conversation_keeps_context(
+        self, client: AsyncClient, db_session: AsyncSession, monkeypatch
+    ):
+        """Test that continuing an archived conversation over HTTP sends the archived messages as context."""
+        child = await make_child(db_session)
+        conversation = await make_conversation(db_session, child, OLD)
+        await archive_inactive(session_factory(), older_than_days=90, pause_seconds=0)
+
+        contexts = []
+        ai_service = get_ai_service()
+        chat = ai_service.chat
+
+        async def recording_chat(**kwargs):
+            contexts.append([message.content for message in kwargs["messages"]])
+            return await chat(**kwargs)
+
+        monkeypatch.setattr(ai_service, "chat", recording_chat)
+        response = await client.post(
+            "/api/chat", json={"child_id": child.id, "conversation_id": conversation.id, "message": "I'm back!"}
+        )
+
+        assert response.status_code == 200
+        assert contexts == [["Question 0", "Answer 0", "Question 1", "Answer 1", "I'm back!"]]
+
+    async def test_flagged_transcripts_stay_readable(self, client: AsyncClient, db_session: AsyncSession):
+        """Test that flagged conversations are not archived, and the admin view reads archives of later-flagged ones."""
+        child = await make_child(db_session)
+        admin = User(email="admin@test.com", role=UserRole.ADMIN)
+        db_session.add(admin)
+        flagged = await make_conversation(db_session, child, OLD)
+        flagged.is_flagged, flagged.flag_reason = True, "input:pii"
+        flagged_later = await make_conversation(db_session, child, OLD - timedelta(days=1))
+        await db_session.flush()
+
+        totals = await archive_inactive(session_factory(), older_than_days=90, pause_seconds=0)
+        assert totals == {"conversations": 1, "messages": 4}
+        await db_session.refresh(flagged)
+        assert flagged.archived_at is None
+
+        # Flagged after it was archived (a late flag job): its transcript is in the archive
+        flagged_later.is_flagged, flagged_later.flag_reason = True, "output:violence"
+        await db_session.flush()
+        response = await client.get("/api/admin/flagged-conversations", params={"admin_id": admin.id})
+        assert response.status_code == 200
+        transcripts = {conv["id"]: [m["content"] for m in conv["messages"]] for conv in response.json()}
+        expected = ["Question 0", "Answer 0", "Question 1", "Answer 1"]
+        assert transcripts == {flagged.id: expected, flagged_later.id: expected}
+
+    async def test_deleting_child_removes_archives(self, client: AsyncClient, db_session: AsyncSession):
+        """Test that deleting a child also deletes the archived transcripts of its conversations."""
+        await db_session.execute(text("PRAGMA foreign_keys=ON"))
+        child = await make_child(db_session)
+        await make_conversation(db_session, child, OLD)
+        await archive_inactive(session_factory(), older_than_days=90, pause_seconds=0)
+        db_session.expunge_all()
+
+        response = await client.delete(f"/api/children/{child.id}", params={"parent_id": child.parent_id})
+
+        assert response.status_code == 204
+        assert await db_session.scalar(select(func.count()).select_from(ArchivedTranscript)) == 0
+        assert await db_session.scalar(select(func.count(Conversation.id))) == 0
@@ -4,8 +4,14 @@ Note: These tests mock the AI service to avoid actual API calls.
 """
 
 import pytest
+from datetime import datetime, timedelta
 from unittest.mock import AsyncMock, patch, MagicMock
 from httpx import AsyncClient
+from sqlalchemy import select, update
+
+from app.models import Child, Conversation
+from app.models.conversation import backfill_conversation_counts
+from tests.conftest import make_child
 
 
 @pytest.mark.asyncio
@@ -125,6 +131,78 @@ async def test_get_conversations(client: AsyncClient, test_user: dict, test_chil
     assert "message_count" in data[0]
 
 
+@pytest.mark.asyncio
+async def test_conversation_cursor_pages(client: AsyncClient, db_session):
+    """Test that cursor pages walk every conversation once, newest first, with a total count."""
+    child = await make_child(db_session)
+    base = datetime(2024, 1, 1)
+    # Two conversations share each timestamp, so the id tie-break matters
+    db_session.add_all([
+        Conversation(child_id=child.id, title=f"Chat {i}", started_at=base + timedelta(hours=i // 2))
+        for i in range(7)
+    ])
+    await db_session.flush()
+    url = f"/api/chat/conversations/{child.id}"
+
+    seen = []
+    params = {"parent_id": child.parent_id, "limit": 3}
+    while True:
+        response = await client.get(url, params=params)
+        assert response.status_code == 200
+        assert response.headers["x-total-count"] == "7"
+        seen.extend(response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+        params["cursor"] = cursor
+
+    assert len(seen) == 7
+    assert len({c["id"] for c in seen}) == 7
+    keys = [(c["started_at"], c["id"]) for c in seen]
+    assert keys == sorted(keys, reverse=True)
+
+    # A conversation started after the first page was fetched does not shift later pages
+    first = await client.get(url, params={"parent_id": child.parent_id, "limit": 3})
+    db_session.add(Conversation(child_id=child.id, title="New", started_at=base + timedelta(days=1)))
+    await db_session.flush()
+    second = await client.get(
+        url, params={"parent_id": child.parent_id, "limit": 3, "cursor": first.headers["x-next-cursor"]}
+    )
+    assert [c["id"] for c in second.json()] == [c["id"] for c in seen[3:6]]
+    assert second.headers["x-total-count"] == "8"
+
+    # Legacy offset paging still works
+    legacy = await client.get(url, params={"parent_id": child.parent_id, "limit": 3, "offset": 4})
+    assert [c["id"] for c in legacy.json()] == [c["id"] for c in seen[3:6]]
+
+
+@pytest.mark.asyncio
+async def test_backfill_conversation_counts(db_session):
+    """Test that children from before the counter get their conversations counted."""
+    child = await make_child(db_session)
+    empty = Child(parent_id=child.parent_id, name="Alex", age=6, login_pin="654321")
+    db_session.add_all([empty, Conversation(child_id=child.id), Conversation(child_id=child.id)])
+    await db_session.flush()
+    # As after an upgrade: the new column reads 0 for existing rows
+    await db_session.execute(update(Child).values(conversation_count=0))
+
+    connection = await db_session.connection()
+    await connection.run_sync(backfill_conversation_counts)
+    counts = dict((await db_session.execute(select(Child.id, Child.conversation_count))).all())
+    assert counts == {child.id: 2, empty.id: 0}
+
+
+@pytest.mark.asyncio
+async def test_conversation_invalid_cursor(client: AsyncClient, db_session):
+    """Test that a malformed cursor is rejected."""
+    child = await make_child(db_session)
+    response = await client.get(
+        f"/api/chat/conversations/{child.id}",
+        params={"parent_id": child.parent_id, "cursor": "not-a-cursor"},
+    )
+    assert response.status_code == 400
+
+
 @pytest.mark.asyncio
 async def test_get_conversation_detail(client: AsyncClient, test_user: dict, test_child: dict):
     """Test getting a specific conversation with messages."""
@@ -0,0 +1,206 @@
+"""
+Tests for the WebSocket chat channel.
+"""
+
+import asyncio
+import json
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.sql_instrumentation import track_queries
+from app.main import app
+from app.models import Conversation, FinishReason, Message, MessageRole
+from tests.conftest import make_child
+
+
+class WebSocketDriver:
+    """Minimal in-process WebSocket client speaking ASGI to the app."""
+
+    def __init__(self, path: str):
+        self.scope = {
+            "type": "websocket",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "scheme": "ws",
+            "query_string": b"",
+            "headers": [(b"host", b"test")],
+            "client": ("127.0.0.1", 5000),
+            "server": ("test", 80),
+            "subprotocols": [],
+        }
+        self.inbound: asyncio.Queue = asyncio.Queue()
+        self.outbound: asyncio.Queue = asyncio.Queue()
+        self.close_code = None
+
+    async def __aenter__(self) -> "WebSocketDriver":
+        self.task = asyncio.create_task(app(self.scope, self.inbound.get, self.outbound.put))
+        await self.inbound.put({"type": "websocket.connect"})
+        accepted = await asyncio.wait_for(self.outbound.get(), 5)
+        assert accepted["type"] == "websocket.accept"
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if not self.task.done():
+            await self.inbound.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, 5)
+
+    async def send_json(self, data) -> None:
+        await self.inbound.put({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def receive_json(self):
+        message = await asyncio.wait_for(self.outbound.get(), 5)
+        if message["type"] == "websocket.close":
+            self.close_code = message["code"]
+            return None
+        return json.loads(message["text"])
+
+    async def chat(self, text: str) -> tuple:
+        """Send a message and collect (chunks, final event)."""
+        await self.send_json({"type": "message", "message": text})
+        chunks = []
+        while True:
+            event = await self.receive_json()
+            if event["type"] != "chunk":
+                return chunks, event
+            chunks.append(event["chunk"])
+
+
+@pytest.fixture
+async def ws_db(client: AsyncClient, db_session: AsyncSession) -> AsyncSession:
+    """Test session, with the app's dependency overrides (including the session factory) installed."""
+    return db_session
+
+
+@pytest.mark.asyncio
+class TestChatWebSocket:
+    """Tests for sign-in, turns and write-through."""
+
+    async def test_invalid_pin_closes(self, ws_db: AsyncSession):
+        """Test that an unknown PIN gets an error and a policy-violation close."""
+        await make_child(ws_db)
+        async with WebSocketDriver("/api/chat/ws") as ws:
+            await ws.send_json({"type": "auth", "pin": "000000"})
+            assert (await ws.receive_json())["status"] == 404
+            assert await ws.receive_json() is None
+            assert ws.close_code == 1008
+
+    async def test_turns_stream_and_write_through(self, ws_db: AsyncSession):
+        """Test that turns stream chunks and persist both messages to one conversation."""
+        child = await make_child(ws_db)
+        async with WebSocketDriver("/api/chat/ws") as ws:
+            await ws.send_json({"type": "auth", "pin": "123456"})
+            ready = await ws.receive_json()
+            assert ready["type"] == "ready"
+            assert ready["messages_remaining"] == 50
+
+            chunks, done = await ws.chat("Why is the sky blue?")
+            assert chunks and done["type"] == "done"
+            assert done["messages_remaining"] == 49
+
+            _, second = await ws.chat("And why are sunsets red?")
+            assert second["conversation_id"] == done["conversation_id"]
+
+        conversation = await ws_db.get(Conversation, done["conversation_id"])
+        await ws_db.refresh(conversation)
+        await ws_db.refresh(child)
+        assert conversation.message_count == 4
+        assert child.messages_today == 2
+        roles = (await ws_db.execute(
+            select(Message.role).where(Message.conversation_id == conversation.id).order_by(Message.id)
+        )).scalars().all()
+        assert roles == [MessageRole.CHILD, MessageRole.ASSISTANT] * 2
+
+    async def test_turn_skips_profile_and_history_reads(self, ws_db: AsyncSession):
+        """Test that a turn after sign-in only writes: no child, conversation or history selects."""
+        await make_child(ws_db)
+        async with WebSocketDriver("/api/chat/ws") as ws:
+            await ws.send_json({"type": "auth", "pin": "123456"})
+            await ws.receive_json()
+            await ws.chat("Hello!")
+            with track_queries() as stats:
+                await ws.chat("Tell me about volcanoes")
+        assert not any(fp.startswith("SELECT") for fp in stats.fingerprints)
+        assert stats.statements <= 4
+
+    async def test_quota_refusal_keeps_socket_open(self, ws_db: AsyncSession):
+        """Test that hitting the daily limit refuses the turn without closing."""
+        await make_child(ws_db, daily_message_limit=1)
+        async with WebSocketDriver("/api/chat/ws") as ws:
+            await ws.send_json({"type": "auth", "pin": "123456"})
+            await ws.receive_json()
+            await ws.chat("Hi")
+            _, refused = await ws.chat("Hi again")
+            assert refused == {"type": "error", "status": 429, "detail": refused["detail"]}
+
+            await ws.send_json({"type": "message", "message": ""})
+            assert (await ws.receive_json())["status"] == 422
+
+    async def test_concurrent_sessions_share_the_quota(self, ws_db: AsyncSession):
+        """Test that two sessions signed in under one limit cannot both use its last message."""
+        child = await make_child(ws_db, daily_message_limit=1)
+        async with WebSocketDriver("/api/chat/ws") as first, WebSocketDriver("/api/chat/ws") as second:
+            for ws in (first, second):
+                await ws.send_json({"type": "auth", "pin": "123456"})
+                assert (await ws.receive_json())["messages_remaining"] == 1
+
+            _, done = await first.chat("Hi")
+            assert done["type"] == "done" and done["messages_remaining"] == 0
+            _, refused = await second.chat("Hi too")
+            assert refused["type"] == "error" and refused["status"] == 429
+
+            # The refusal refreshed the session's quota: no second reply is generated
+            await second.send_json({"type": "message", "message": "Please?"})
+            assert (await second.receive_json())["status"] == 429
+
+        await ws_db.refresh(child)
+        assert child.messages_today == 1
+        assert len((await ws_db.execute(select(Message.id))).all()) == 2
+
+    async def test_deactivated_child_is_refused_mid_session(self, ws_db: AsyncSession):
+        """Test that deactivating a signed-in child refuses its next turn."""
+        child = await make_child(ws_db)
+        async with WebSocketDriver("/api/chat/ws") as ws:
+            await ws.send_json({"type": "auth", "pin": "123456"})
+            await ws.receive_json()
+            child.is_active = False
+            await ws_db.flush()
+            _, refused = await ws.chat("Hi")
+            assert refused["type"] == "error" and refused["status"] == 403
+
+        assert (await ws_db.execute(select(Message.id))).first() is None
+
+    async def test_resume_conversation(self, ws_db: AsyncSession):
+        """Test that signing in with a conversation id continues that conversation."""
+        child = await make_child(ws_db)
+        conversation = Conversation(child_id=child.id, title="Dinosaurs", message_count=2)
+        ws_db.add(conversation)
+        await ws_db.flush()
+        ws_db.add_all([
+            Message(conversation_id=conversation.id, role=MessageRole.CHILD, content="Tell me about T. rex"),
+            Message(conversation_id=conversation.id, role=MessageRole.ASSISTANT, content="T. rex was huge!"),
+        ])
+        await ws_db.flush()
+
+        async with WebSocketDriver("/api/chat/ws") as ws:
+            await ws.send_json({"type": "auth", "pin": "123456", "conversation_id": conversation.id})
+            ready = await ws.receive_json()
+            assert ready["conversation_id"] == conversation.id
+            _, done = await ws.chat("How big?")
+            assert done["conversation_id"] == conversation.id
+
+    async def test_turn_records_usage(self, ws_db: AsyncSession):
+        """Test that a streamed turn saves the answering model, tokens and finish reason."""
+        await make_child(ws_db)
+        async with WebSocketDriver("/api/chat/ws") as ws:
+            await ws.send_json({"type": "auth", "pin": "123456"})
+            await ws.receive_json()
+            _, done = await ws.chat("Tell me a fun fact")
+
+        reply = await ws_db.get(Message, done["response_id"])
+        assert reply.ai_model and reply.ai_model != "error"
+        assert reply.tokens_used > 0
+        assert reply.finish_reason == FinishReason.STOP
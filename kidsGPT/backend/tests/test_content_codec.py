@@ -0,0 +1,148 @@
+"""
+Tests for compressed message content storage.
+"""
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ai.providers.mock_provider import FUN_FACTS, SPACE_FACTS
+from app.core import content_codec
+from app.core.config import settings
+from app.core.content_codec import (
+    UnknownDictionary, content_dictionary_id, decode_content, encode_content, register_dictionary, train_dictionary,
+)
+from app.core.database import get_session_factory
+from app.main import app
+from app.models import Conversation, Message, MessageRole
+from app.services.content_dictionary import load_dictionaries, recode_messages, train_and_store
+from tests.conftest import make_child
+
+REPLIES = [f"Great question! {fact} What else would you like to know?" for fact in FUN_FACTS + SPACE_FACTS]
+
+
+@pytest.fixture(autouse=True)
+def codec(monkeypatch):
+    """Compression on, with a clean dictionary registry for each test."""
+    monkeypatch.setattr(content_codec, "_dictionaries", {})
+    monkeypatch.setattr(content_codec, "_primed", {})
+    monkeypatch.setattr(settings, "CONTENT_COMPRESSION_ENABLED", True)
+    monkeypatch.setattr(settings, "CONTENT_COMPRESSION_MIN_BYTES", 64)
+    monkeypatch.setattr(settings, "CONTENT_DICTIONARY_ID", 0)
+    return monkeypatch
+
+
+class TestCodec:
+    """Tests for encoding and decoding values."""
+
+    def test_short_text_stays_plain(self):
+        """Test that text under the threshold is stored uncompressed."""
+        value = encode_content("Hi!")
+        assert value == "Hi!"
+        assert content_dictionary_id(value) is None
+        assert decode_content(value) == "Hi!"
+
+    def test_disabled_stores_plain(self, codec):
+        """Test that with compression off even long text is stored as is."""
+        codec.setattr(settings, "CONTENT_COMPRESSION_ENABLED", False)
+        assert encode_content(REPLIES[0]) == REPLIES[0]
+
+    def test_text_starting_with_escape(self, codec):
+        """Test that plain text that looks like an encoded value is escaped, not misread."""
+        codec.setattr(settings, "CONTENT_COMPRESSION_ENABLED", False)
+        looks_compressed = content_codec.COMPRESSED + "0:AAAA"
+        assert decode_content(encode_content(looks_compressed)) == looks_compressed
+        assert content_dictionary_id(encode_content(looks_compressed)) is None
+
+    def test_dictionary_round_trip_and_ratio(self, codec):
+        """Test that a trained dictionary compresses better and records its id on each value."""
+        register_dictionary(3, train_dictionary(REPLIES * 3))
+        plain = [encode_content(reply) for reply in REPLIES]
+        codec.setattr(settings, "CONTENT_DICTIONARY_ID", 3)
+        with_dictionary = [encode_content(reply) for reply in REPLIES]
+
+        assert [decode_content(value) for value in with_dictionary] == REPLIES
+        assert all(content_dictionary_id(value) == 3 for value in with_dictionary)
+        assert sum(map(len, with_dictionary)) < sum(map(len, plain)) / 2
+
+    def test_unknown_dictionary(self, codec):
+        """Test that a value written with an unregistered dictionary fails loudly."""
+        register_dictionary(5, train_dictionary(REPLIES))
+        codec.setattr(settings, "CONTENT_DICTIONARY_ID", 5)
+        value = encode_content(REPLIES[0])
+        content_codec._dictionaries.clear()
+        with pytest.raises(UnknownDictionary):
+            decode_content(value)
+
+    def test_missing_active_dictionary_falls_back(self, codec):
+        """Test that a configured but unloaded dictionary compresses without one instead of failing."""
+        codec.setattr(settings, "CONTENT_DICTIONARY_ID", 9)
+        value = encode_content(REPLIES[0] * 3)
+        assert content_dictionary_id(value) == 0
+        assert decode_content(value) == REPLIES[0] * 3
+
+    def test_legacy_text_passes_through(self):
+        """Test that rows written as TEXT before the codec still read back."""
+        assert decode_content("Plain old row") == "Plain old row"
+        assert decode_content("\x1b[31mRed text\x1b[0m") == "\x1b[31mRed text\x1b[0m"
+        assert decode_content("\x1bzebra") == "\x1bzebra"
+
+
+@pytest.mark.asyncio
+async def test_orm_reads_decode(client: AsyncClient, db_session: AsyncSession, codec):
+    """Test that stored content is compressed on disk and plain text through the ORM and Core selects."""
+    child = await make_child(db_session)
+    conversation = Conversation(child_id=child.id, title="Facts")
+    db_session.add(conversation)
+    await db_session.flush()
+    db_session.add_all([
+        Message(conversation_id=conversation.id, role=MessageRole.ASSISTANT, content=reply) for reply in REPLIES
+    ])
+    await db_session.commit()
+
+    session_factory = app.dependency_overrides[get_session_factory]()
+    dictionary = await train_and_store(session_factory, samples=100)
+    codec.setattr(settings, "CONTENT_DICTIONARY_ID", dictionary.id)
+    db_session.add(Message(conversation_id=conversation.id, role=MessageRole.ASSISTANT, content=REPLIES[1]))
+    await db_session.commit()
+    db_session.expunge_all()
+
+    stored = (await db_session.execute(text("SELECT content FROM messages ORDER BY id DESC LIMIT 1"))).scalar_one()
+    assert content_dictionary_id(stored) == dictionary.id
+
+    content_codec._dictionaries.clear()
+    assert await load_dictionaries(session_factory) == 1
+    contents = (await db_session.execute(select(Message.content).order_by(Message.id))).scalars().all()
+    assert contents == REPLIES + [REPLIES[1]]
+    last = (await db_session.execute(select(Message).order_by(Message.id.desc()).limit(1))).scalar_one()
+    assert last.content == REPLIES[1]
+
+
+@pytest.mark.asyncio
+async def test_recode_rewrites_rows(client: AsyncClient, db_session: AsyncSession, codec):
+    """Test that recode compresses rows written before the codec, and follows the current settings both ways."""
+    contents = [reply * 3 for reply in REPLIES[:3]]
+    child = await make_child(db_session)
+    conversation = Conversation(child_id=child.id, title="Facts")
+    db_session.add(conversation)
+    await db_session.flush()
+    for content in contents:
+        await db_session.execute(
+            text("INSERT INTO messages (conversation_id, role, content, is_flagged, created_at) "
+                 "VALUES (:conversation_id, 'ASSISTANT', :content, 0, CURRENT_TIMESTAMP)"),
+            {"conversation_id": conversation.id, "content": content},
+        )
+    await db_session.commit()
+    session_factory = app.dependency_overrides[get_session_factory]()
+
+    async def stored():
+        return (await db_session.execute(text("SELECT content FROM messages ORDER BY id"))).scalars().all()
+
+    assert await recode_messages(session_factory, batch_size=2) == 3
+    assert all(value.startswith(content_codec.COMPRESSED) for value in await stored())
+    assert await recode_messages(session_factory) == 0
+
+    codec.setattr(settings, "CONTENT_COMPRESSION_ENABLED", False)
+    assert await recode_messages(session_factory) == 3
+    assert await stored() == contents
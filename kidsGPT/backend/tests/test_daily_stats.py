@@ -0,0 +1,158 @@
+"""
+Tests for the per-child daily activity rollup.
+"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.jobs import JobRunner
+from app.models import Child, ChildDailyStats, Conversation, Message, MessageRole
+from app.models import user as user_models
+from app.models.daily_stats import activity_params, epoch_minute
+from app.services import write_behind
+from app.services.chat_session import ChatSession
+from app.services.daily_stats import rebuild, record_activity
+from app.services.flagging import FlagRecorder
+from app.services.write_behind import WriteBehindQueue
+from tests.conftest import make_child
+
+
+async def stats_rows(session_factory):
+    async with session_factory() as db:
+        rows = (await db.execute(select(ChildDailyStats).order_by(ChildDailyStats.day))).scalars().all()
+    return [(row.day, row.messages, row.conversations, row.flagged, row.tokens, row.active_minutes) for row in rows]
+
+
+def test_active_minutes_within_batch():
+    """Test that gaps between turns count as active time, and idle gaps as a new one-minute session."""
+    params = activity_params(1, datetime(2024, 5, 1).date(), minutes=[100, 103, 104, 130])
+    assert params["b_inner_minutes"] == 3 + 1 + 1
+    assert params["b_new_minutes"] == 6
+    assert (params["b_first_minute"], params["b_last_minute"]) == (100, 130)
+
+
+@pytest.mark.asyncio
+class TestMaintainedOnWrite:
+    """Tests for incremental rollup updates."""
+
+    async def test_write_through_turns(self, session_factory):
+        """Test that chat turns bump messages, conversations, tokens and active time for the day."""
+        async with session_factory() as db:
+            child = await make_child(db)
+        session = ChatSession(session_factory, child)
+        await session.save_turn("Why is the sky blue?", "Light scattering!", "mock", tokens_used=40)
+        await session.save_turn("And sunsets?", "Longer path!", "mock", tokens_used=30)
+
+        [(day, messages, conversations, flagged, tokens, active_minutes)] = await stats_rows(session_factory)
+        assert (day, messages, conversations, flagged, tokens) == (datetime.utcnow().date(), 4, 1, 0, 70)
+        assert active_minutes in (1, 2)  # 2 if the turns straddle a minute boundary
+
+    async def test_quota_day_is_utc(self, session_factory, monkeypatch):
+        """Test that just past UTC midnight the daily limit resets, on the rollup's day boundary."""
+        class JustPastMidnight(datetime):
+            @classmethod
+            def utcnow(cls):
+                return datetime(2024, 3, 10, 0, 0, 5)
+
+        monkeypatch.setattr(user_models, "datetime", JustPastMidnight)
+        async with session_factory() as db:
+            child = await make_child(db)
+            child.daily_message_limit = child.messages_today = 5
+            child.last_message_date = date(2024, 3, 9)
+            await db.commit()
+        assert child.can_send_message()
+        session = ChatSession(session_factory, child)
+        session.check_quota()
+        await session.save_turn("Hi", "Hello!", "mock")
+
+        async with session_factory() as db:
+            stored = await db.get(Child, child.id)
+        assert (stored.last_message_date, stored.messages_today) == (date(2024, 3, 10), 1)
+        assert session.messages_remaining == 4
+
+    async def test_gap_from_previous_write(self, session_factory):
+        """Test that the gap since the row's last turn is credited, unless the child was idle."""
+        async with session_factory() as db:
+            child = await make_child(db)
+            day = datetime(2024, 5, 1).date()
+            start = epoch_minute(datetime(2024, 5, 1, 9))
+            for minute in (start, start + 3, start + 30):
+                await record_activity(db, [activity_params(child.id, day, messages=1, minutes=[minute])])
+            await db.commit()
+        assert await stats_rows(session_factory) == [(day, 3, 0, 0, 0, 1 + 3 + 1)]
+
+    async def test_write_behind_batches(self, session_factory, monkeypatch):
+        """Test that bulk-inserted turns, which skip mapper events, still reach the rollup."""
+        async with session_factory() as db:
+            child = await make_child(db)
+        queue = WriteBehindQueue(session_factory, max_delay_ms=20)
+        queue.start()
+        monkeypatch.setattr(write_behind, "_writer", queue)
+        session = ChatSession(session_factory, child)
+        for i in range(3):
+            await session.save_turn(f"Question {i}", f"Answer {i}", "mock", tokens_used=10)
+        await queue.close()
+
+        [(day, messages, conversations, flagged, tokens, active_minutes)] = await stats_rows(session_factory)
+        assert (day, messages, conversations, flagged, tokens) == (datetime.utcnow().date(), 6, 1, 0, 30)
+        assert active_minutes in (1, 2)
+
+    async def test_flags_counted_once(self, session_factory):
+        """Test that a flag job run twice (retry) counts each flagged message once."""
+        async with session_factory() as db:
+            child = await make_child(db)
+            conversation = Conversation(child_id=child.id)
+            db.add(conversation)
+            await db.flush()
+            message = Message(conversation_id=conversation.id, role=MessageRole.CHILD, content="My number is 555-123-4567")
+            db.add(message)
+            await db.commit()
+        recorder = FlagRecorder(session_factory, JobRunner())
+        verdicts = [{"message_id": message.id, "conversation_id": conversation.id, "flags": ["input:pii"]}]
+        await recorder.apply(verdicts)
+        await recorder.apply(verdicts)
+
+        assert await stats_rows(session_factory) == [(datetime.utcnow().date(), 1, 1, 1, 0, 1)]
+
+    async def test_rebuild_matches(self, session_factory):
+        """Test that rebuilding from the raw tables gives the incrementally maintained rows."""
+        async with session_factory() as db:
+            child = await make_child(db)
+        session = ChatSession(session_factory, child)
+        for i in range(3):
+            await session.save_turn(f"Question {i}", f"Answer {i}", "mock", tokens_used=5)
+        maintained = await stats_rows(session_factory)
+
+        assert await rebuild(session_factory) == 1
+        assert await stats_rows(session_factory) == maintained
+
+
+@pytest.mark.asyncio
+async def test_parent_views_read_rollup(client: AsyncClient, db_session: AsyncSession):
+    """Test that the child list and the weekly trend are served from the rollup."""
+    child = await make_child(db_session)
+    today = datetime.utcnow().date()
+    await record_activity(db_session, [
+        activity_params(child.id, today - timedelta(days=2), messages=6, tokens=90, minutes=[1000, 1004]),
+        activity_params(child.id, today - timedelta(days=30), messages=10),
+    ])
+    await db_session.commit()
+
+    response = await client.get("/api/children", params={"parent_id": child.parent_id})
+    assert response.status_code == 200
+    assert response.json()[0]["total_messages"] == 16
+
+    response = await client.get(f"/api/children/{child.id}/trend", params={"parent_id": child.parent_id})
+    assert response.status_code == 200
+    trend = response.json()
+    assert [day["messages"] for day in trend["days"]] == [0, 0, 0, 0, 6, 0, 0]
+    assert trend["days"][-1]["day"] == today.isoformat()
+    assert trend["total_messages"] == 6
+    assert trend["total_active_minutes"] == 5
+
+    response = await client.get(f"/api/children/{child.id}/trend", params={"parent_id": child.parent_id + 1})
+    assert response.status_code == 404
@@ -0,0 +1,161 @@
+"""
+Tests for persisted safety flags.
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from ai.providers.base import ChatMessage
+from app.core.config import settings
+from app.core.jobs import JobRunner
+from app.models import Conversation, Job, JobStatus, Message, MessageRole
+from app.services import flagging
+from app.services.ai_service import AIService
+from app.services.flagging import FLAG_JOB, FlagRecorder, MessagesNotWritten
+from tests.conftest import make_child
+
+
+@pytest.fixture
+async def recorder(session_factory, monkeypatch):
+    """A recorder feeding a running job runner, installed as the process-wide one."""
+    monkeypatch.setattr(settings, "JOBS_BACKOFF_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "JOBS_POLL_SECONDS", 0.01)  # Durable retries wait in the table for the poller
+    runner = JobRunner(session_factory, workers=1)
+    runner.start()
+    recorder = FlagRecorder(session_factory, runner, max_delay_ms=10)
+    monkeypatch.setattr(flagging, "_recorder", recorder)
+    yield recorder
+    await runner.stop()
+
+
+async def make_turn(session_factory, reply: str = "Let's learn about stars!"):
+    """A conversation with one child message and one reply; returns their ids."""
+    async with session_factory() as db:
+        child = await make_child(db)
+        conversation = Conversation(child_id=child.id, title="Chat")
+        db.add(conversation)
+        await db.flush()
+        message = Message(conversation_id=conversation.id, role=MessageRole.CHILD, content="Hi")
+        response = Message(conversation_id=conversation.id, role=MessageRole.ASSISTANT, content=reply)
+        db.add_all([message, response])
+        await db.commit()
+        return conversation.id, message.id, response.id
+
+
+async def flag_state(session_factory, conversation_id: int):
+    async with session_factory() as db:
+        # Messages first: once they show a flag, the conversation (same commit) does too
+        messages = (await db.execute(
+            select(Message.is_flagged, Message.flag_reason).order_by(Message.id)
+        )).all()
+        conversation = await db.get(Conversation, conversation_id)
+    return conversation, [tuple(row) for row in messages]
+
+
+@pytest.mark.asyncio
+class TestFlagRecorder:
+    """Tests for batching and writing verdicts."""
+
+    async def test_turn_flags_persisted(self, session_factory, recorder: FlagRecorder):
+        """Test that input flags land on the child's message and roll up to the conversation."""
+        conversation_id, message_id, response_id = await make_turn(session_factory)
+        recorder.record_turn(conversation_id, message_id, response_id, ["input:self_harm", "input:pii"])
+        await asyncio.sleep(0.05)
+        await recorder.drain()
+        await recorder.jobs.join()
+
+        conversation, messages = await flag_state(session_factory, conversation_id)
+        assert messages == [(True, "input:pii, input:self_harm"), (False, None)]
+        assert conversation.is_flagged
+        assert conversation.flag_reason == "input:pii, input:self_harm"
+
+    async def test_streamed_reply_checked_in_job(self, session_factory, recorder: FlagRecorder):
+        """Test that an unfiltered streamed reply is output-checked off the request path."""
+        conversation_id, message_id, response_id = await make_turn(session_factory, "He was shooting hoops")
+        recorder.record_turn(conversation_id, message_id, response_id, reply="He was shooting hoops")
+        await recorder.drain()
+        await recorder.jobs.join()
+
+        conversation, messages = await flag_state(session_factory, conversation_id)
+        assert messages == [(False, None), (True, "output:violence")]
+        assert conversation.flag_reason == "output:violence"
+
+    async def test_clean_turn_writes_nothing(self, session_factory, recorder: FlagRecorder):
+        """Test that a turn with no flags and a safe reply leaves every row untouched."""
+        conversation_id, message_id, response_id = await make_turn(session_factory)
+        recorder.record_turn(conversation_id, message_id, response_id, reply="Let's learn about stars!")
+        await recorder.drain()
+        await recorder.jobs.join()
+
+        conversation, messages = await flag_state(session_factory, conversation_id)
+        assert messages == [(False, None), (False, None)]
+        assert not conversation.is_flagged
+
+    async def test_full_batch_is_one_job(self, session_factory):
+        """Test that verdicts are handed over as one job per FLAG_BATCH_SIZE."""
+        runner = JobRunner(session_factory)  # Not started: jobs wait in the table
+        recorder = FlagRecorder(session_factory, runner, batch_size=3, max_delay_ms=10_000)
+        for i in range(7):
+            recorder.record(i, 1, ["input:pii"])
+        await asyncio.sleep(0.05)
+        async with session_factory() as db:
+            assert len((await db.execute(select(Job.id))).all()) == 2
+        await recorder.drain()
+        async with session_factory() as db:
+            jobs = (await db.execute(select(Job).order_by(Job.id))).scalars().all()
+        assert {(row.name, row.status) for row in jobs} == {(FLAG_JOB, JobStatus.PENDING)}
+        assert [len(row.payload["verdicts"]) for row in jobs] == [3, 3, 1]
+
+    async def test_verdicts_wait_for_a_runner(self, session_factory, monkeypatch):
+        """Test that verdicts handed over while no worker runs are written by the next runner to start."""
+        monkeypatch.setattr(settings, "JOBS_POLL_SECONDS", 0.01)
+        conversation_id, message_id, response_id = await make_turn(session_factory)
+        recorder = FlagRecorder(session_factory, JobRunner(session_factory))  # Never started
+        monkeypatch.setattr(flagging, "_recorder", recorder)
+        recorder.record_turn(conversation_id, message_id, response_id, ["input:pii"])
+        await recorder.drain()
+
+        runner = JobRunner(session_factory, workers=1)
+        runner.start()
+        for _ in range(50):
+            await asyncio.sleep(0.02)
+            conversation, messages = await flag_state(session_factory, conversation_id)
+            if messages[0][0]:
+                break
+        await runner.stop()
+        assert messages[0] == (True, "input:pii")
+        assert conversation.is_flagged
+
+    async def test_unwritten_messages_retried(self, session_factory, recorder: FlagRecorder):
+        """Test that verdicts for rows not yet stored (write-behind) are applied once they are."""
+        conversation_id, message_id, response_id = await make_turn(session_factory)
+        verdicts = [{"message_id": response_id + 1, "conversation_id": conversation_id, "flags": ["input:pii"]}]
+        with pytest.raises(MessagesNotWritten):
+            await recorder.apply(verdicts)
+
+        recorder.record(response_id + 1, conversation_id, ["input:pii"])
+        await asyncio.sleep(0.02)
+        async with session_factory() as db:
+            db.add(Message(id=response_id + 1, conversation_id=conversation_id, role=MessageRole.CHILD, content="555-123-4567"))
+            await db.commit()
+        for _ in range(50):
+            await asyncio.sleep(0.02)
+            conversation, messages = await flag_state(session_factory, conversation_id)
+            if messages[-1][0]:
+                break
+        assert messages[-1] == (True, "input:pii")
+        assert conversation.is_flagged
+
+
+@pytest.mark.asyncio
+async def test_ai_service_reports_flags():
+    """Test that AIService reports what its filters caught instead of discarding it."""
+    service = AIService("mock")
+    response = await service.chat(child_age=8, messages=[ChatMessage(role="user", content="I want to die")])
+    assert response.finish_reason == "filtered"
+    assert response.flags == ["input:self_harm"]
+
+    clean = await service.chat(child_age=8, messages=[ChatMessage(role="user", content="Tell me about dinosaurs")])
+    assert clean.flags == []
@@ -0,0 +1,234 @@
+"""
+Tests for the background job runner.
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app.core import jobs
+from app.core.config import settings
+from app.core.jobs import JobRunner, QueueFull, backoff_seconds, job
+from app.models import Job, JobStatus
+
+
+@pytest.fixture(autouse=True)
+def handlers(monkeypatch):
+    """A clean handler registry and fast backoff for each test."""
+    monkeypatch.setattr(jobs, "_handlers", {})
+    monkeypatch.setattr(settings, "JOBS_BACKOFF_SECONDS", 0.01)
+    return jobs._handlers
+
+
+@pytest.mark.asyncio
+class TestJobRunner:
+    """Tests for in-memory jobs."""
+
+    async def test_runs_job_after_enqueue(self):
+        """Test that a queued job runs with its payload as keyword arguments."""
+        seen = []
+
+        @job("record")
+        async def record(value: int) -> None:
+            seen.append(value)
+
+        runner = JobRunner(workers=2)
+        runner.start()
+        await runner.enqueue("record", {"value": 7})
+        runner.enqueue_nowait("record", {"value": 8})
+        await runner.join()
+        await runner.stop()
+        assert sorted(seen) == [7, 8]
+
+    async def test_unknown_job_rejected(self):
+        """Test that enqueueing a job with no handler fails at the call site."""
+        with pytest.raises(ValueError):
+            await JobRunner().enqueue("missing")
+
+    async def test_retries_with_backoff(self):
+        """Test that a failing job is retried until it succeeds."""
+        attempts = []
+
+        @job("flaky")
+        async def flaky() -> None:
+            attempts.append(asyncio.get_running_loop().time())
+            if len(attempts) < 3:
+                raise RuntimeError("not yet")
+
+        runner = JobRunner(workers=1)
+        runner.start()
+        await runner.enqueue("flaky", max_attempts=5)
+        for _ in range(100):
+            if len(attempts) == 3:
+                break
+            await asyncio.sleep(0.01)
+        await runner.stop()
+        assert len(attempts) == 3
+        assert attempts[2] - attempts[1] >= backoff_seconds(2) * 0.9
+        assert backoff_seconds(2) == 2 * backoff_seconds(1)
+
+    async def test_bounded_queue_refuses(self):
+        """Test that a full queue refuses more in-memory jobs instead of growing."""
+        @job("noop")
+        async def noop() -> None:
+            pass
+
+        runner = JobRunner(max_queue=2)
+        runner.enqueue_nowait("noop")
+        runner.enqueue_nowait("noop")
+        with pytest.raises(QueueFull):
+            runner.enqueue_nowait("noop")
+
+    async def test_worker_limit(self):
+        """Test that no more than `workers` jobs run at once."""
+        running = 0
+        peak = 0
+
+        @job("slow")
+        async def slow() -> None:
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        runner = JobRunner(workers=3)
+        runner.start()
+        for _ in range(12):
+            runner.enqueue_nowait("slow")
+        await runner.join()
+        await runner.stop()
+        assert peak == 3
+
+    async def test_stop_drains_queue(self):
+        """Test that stopping waits for queued jobs, then refuses new ones."""
+        done = []
+
+        @job("work")
+        async def work(i: int) -> None:
+            await asyncio.sleep(0.001)
+            done.append(i)
+
+        runner = JobRunner(workers=1)
+        runner.start()
+        for i in range(5):
+            runner.enqueue_nowait("work", {"i": i})
+        await runner.stop(timeout=5)
+        assert done == list(range(5))
+        with pytest.raises(RuntimeError):
+            runner.enqueue_nowait("work", {"i": 5})
+
+
+@pytest.mark.asyncio
+class TestDurableJobs:
+    """Tests for jobs recorded in the jobs table."""
+
+    async def test_job_survives_restart(self, session_factory):
+        """Test that a durable job left unfinished at shutdown runs on the next start."""
+        started = asyncio.Event()
+        done = []
+
+        @job("report")
+        async def report(child_id: int) -> None:
+            started.set()
+            await asyncio.sleep(10)  # Still running at shutdown
+            done.append(child_id)
+
+        first = JobRunner(session_factory, workers=1)
+        first.start()
+        job_id = await first.enqueue("report", {"child_id": 4}, durable=True)
+        await asyncio.wait_for(started.wait(), 1)
+        await first.stop(timeout=0.01)
+
+        async with session_factory() as db:
+            assert (await db.get(Job, job_id)).status == JobStatus.PENDING
+
+        @job("report")
+        async def report_quickly(child_id: int) -> None:
+            done.append(child_id)
+
+        second = JobRunner(session_factory, workers=1)
+        assert await second.poll_once() == 1
+        assert await second.poll_once() == 0  # Claimed: not handed out twice
+        second.start()
+        await second.join()
+        await second.stop()
+
+        assert done == [4]
+        async with session_factory() as db:
+            row = await db.get(Job, job_id)
+        assert row.status == JobStatus.DONE
+        assert row.attempts == 1
+        assert row.finished_at is not None
+
+    async def test_running_job_keeps_its_lease(self, session_factory, monkeypatch):
+        """Test that a durable job running past its first lease is not claimed again, here or elsewhere."""
+        monkeypatch.setattr(settings, "JOBS_LEASE_SECONDS", 0.2)
+        started, release = asyncio.Event(), asyncio.Event()
+        runs = []
+
+        @job("report")
+        async def report(child_id: int) -> None:
+            runs.append(child_id)
+            started.set()
+            await release.wait()
+
+        runner = JobRunner(session_factory, workers=1)
+        runner.start()
+        job_id = await runner.enqueue("report", {"child_id": 4}, durable=True)
+        await asyncio.wait_for(started.wait(), 1)
+        await asyncio.sleep(0.5)  # Well past the lease taken at enqueue
+
+        assert await runner.poll_once() == 0
+        assert await JobRunner(session_factory).poll_once() == 0
+        release.set()
+        await runner.join()
+        await runner.stop()
+
+        assert runs == [4]
+        async with session_factory() as db:
+            assert (await db.get(Job, job_id)).status == JobStatus.DONE
+
+    async def test_expired_lease_is_not_reclaimed_by_its_holder(self, session_factory):
+        """Test that the poller skips jobs this runner already holds, even once their lease has run out."""
+        @job("report")
+        async def report(child_id: int) -> None:
+            pass
+
+        runner = JobRunner(session_factory, workers=1)
+        async with session_factory() as db:
+            db.add(Job(name="report", payload={"child_id": 4}, max_attempts=1))
+            await db.commit()
+        assert await runner.poll_once() == 1
+        async with session_factory() as db:
+            row = (await db.execute(select(Job))).scalar_one()
+            row.locked_until = row.locked_until.replace(year=2000)
+            await db.commit()
+
+        assert await runner.poll_once() == 0
+        assert runner.pending == 1
+
+    async def test_durable_failure_recorded(self, session_factory):
+        """Test that a durable job out of attempts is marked failed with its error."""
+        @job("broken")
+        async def broken() -> None:
+            raise RuntimeError("boom")
+
+        runner = JobRunner(session_factory, workers=1)
+        runner.start()
+        job_id = await runner.enqueue("broken", durable=True, max_attempts=2)
+        for _ in range(100):
+            await asyncio.sleep(0.02)
+            await runner.poll_once()  # Durable retries wait in the table for the poller
+            async with session_factory() as db:
+                status = await db.scalar(select(Job.status).where(Job.id == job_id))
+            if status == JobStatus.FAILED:
+                break
+        await runner.stop()
+
+        async with session_factory() as db:
+            row = await db.get(Job, job_id)
+        assert row.status == JobStatus.FAILED
+        assert row.attempts == 2
+        assert row.last_error == "boom"
@@ -0,0 +1,53 @@
+"""
+Tests for deferred SDK imports (provider SDKs and Firebase load on first use).
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import ai.providers
+from ai.providers.mock_provider import MockProvider
+from app.services.ai_service import AIService
+from benchmarks.bench_import_time import deferred_loaded
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+STARTUP = """
+import json, sys
+import app.main
+from app.core.firebase import verify_id_token
+from app.services.ai_service import AIService
+
+AIService("mock")
+verify_id_token("not-a-token")  # Firebase not configured: refused without loading the SDK
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def test_startup_defers_sdks():
+    """Test that a mock-mode worker starts and serves without importing provider or Firebase SDKs."""
+    completed = subprocess.run(
+        [sys.executable, "-c", STARTUP],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "DATABASE_URL": "sqlite+aiosqlite:///:memory:", "FIREBASE_PROJECT_ID": ""},
+    )
+    assert deferred_loaded(json.loads(completed.stdout.splitlines()[-1])) == []
+
+
+def test_provider_registry_resolves_on_demand():
+    """Test that registered providers resolve to their classes, and the package exports them lazily."""
+    assert AIService.provider_class("mock") is MockProvider
+    assert ai.providers.MockProvider is MockProvider
+    assert ai.providers.OpenAIProvider.__name__ == "OpenAIProvider"
+    with pytest.raises(ValueError):
+        AIService.provider_class("unknown")
+    with pytest.raises(AttributeError):
+        ai.providers.NoSuchProvider
@@ -0,0 +1,145 @@
+"""
+Tests for the Prometheus metrics registry, middleware and /metrics endpoint.
+"""
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.metrics import (
+    DB_STATEMENTS,
+    FILTER_HITS,
+    HTTP_REQUESTS,
+    QUOTA_REJECTIONS,
+    Counter,
+    Histogram,
+    MetricsMiddleware,
+    Registry,
+)
+from app.core.sql_instrumentation import instrument_engine
+from app.services.ai_service import AIService
+from ai.providers.base import ChatMessage
+
+
+class TestRegistry:
+    """Tests for metric types and text exposition."""
+
+    def test_counter_renders_labels(self):
+        """Test that counters render one line per label set."""
+        registry = Registry()
+        counter = registry.counter("things_total", "Things", ("kind",))
+        counter.inc(("a",))
+        counter.inc(("a",), 2)
+        counter.inc(('say "hi"',))
+
+        output = registry.render()
+        assert "# TYPE things_total counter" in output
+        assert 'things_total{kind="a"} 3' in output
+        assert 'things_total{kind="say \\"hi\\""} 1' in output
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that histogram buckets are cumulative with +Inf, sum and count."""
+        histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value)
+
+        lines = histogram.render()
+        assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+        assert 'latency_seconds_bucket{le="1"} 3' in lines
+        assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+        assert "latency_seconds_sum 6.05" in lines
+        assert "latency_seconds_count 4" in lines
+
+    def test_duplicate_name_rejected(self):
+        """Test that a metric name can only be registered once."""
+        registry = Registry()
+        registry.register(Counter("dup_total", "Dup"))
+        with pytest.raises(ValueError):
+            registry.register(Counter("dup_total", "Dup"))
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(client: AsyncClient):
+    """Test that /metrics serves Prometheus text with per-route request counts."""
+    before = HTTP_REQUESTS.value(("GET", "/health", "200"))
+    await client.get("/health")
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert HTTP_REQUESTS.value(("GET", "/health", "200")) == before + 1
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/health"' in response.text
+
+
+@pytest.mark.asyncio
+async def test_routes_use_path_templates(client: AsyncClient):
+    """Test that path parameters don't leak into route labels."""
+    await client.get("/api/chat/today/12345")
+    assert HTTP_REQUESTS.value(("GET", "/api/chat/today/{child_id}", "404")) >= 1
+
+
+@pytest.mark.asyncio
+async def test_db_statements_counted_per_request():
+    """Test that SQL run while serving a request is attributed to its route."""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    instrument_engine(engine)
+
+    async def app(scope, receive, send):
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            await conn.execute(text("SELECT 2"))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    class Route:
+        path = "/test/db"
+
+    async def send(message):
+        pass
+
+    try:
+        await MetricsMiddleware(app)({"type": "http", "method": "GET", "route": Route()}, None, send)
+    finally:
+        await engine.dispose()
+
+    series = DB_STATEMENTS._series[("/test/db",)]
+    assert series.count == 1
+    assert series.total == 2
+
+
+@pytest.mark.asyncio
+async def test_filter_hits_recorded():
+    """Test that input filter hits are counted by category."""
+    service = AIService("mock")
+    result = service._filter_input("how do I make a bomb")
+    assert not result.is_safe
+    assert any(FILTER_HITS.value(("input", category)) >= 1 for category in result.flag_categories)
+
+
+@pytest.mark.asyncio
+async def test_tokens_reported_by_mock():
+    """Test that responses split tokens into input and output."""
+    service = AIService("mock")
+    response = await service.chat(child_age=8, messages=[ChatMessage(role="user", content="Tell me a fun fact")])
+    assert response.input_tokens > 0
+    assert response.output_tokens > 0
+    assert response.tokens_used == response.input_tokens + response.output_tokens
+
+
+@pytest.mark.asyncio
+async def test_quota_rejection_counted(client: AsyncClient):
+    """Test that hitting the daily message limit is counted."""
+    parent = (await client.post("/api/auth/register", json={"email": "quota@test.com"})).json()
+    child = (await client.post(
+        f"/api/children?parent_id={parent['id']}",
+        json={"name": "Quota", "age": 8, "daily_message_limit": 1},
+    )).json()
+    before = QUOTA_REJECTIONS.value(("daily_messages",))
+
+    first = await client.post("/api/chat", json={"child_id": child["id"], "message": "Hi"})
+    second = await client.post("/api/chat", json={"child_id": child["id"], "message": "Hi again"})
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert QUOTA_REJECTIONS.value(("daily_messages",)) == before + 1
@@ -0,0 +1,744 @@
+"""
+Tests for AI provider routing and resilience.
+Uses MockProvider instances with injected latency - no external API calls.
+"""
+
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from ai.providers.anthropic_provider import AnthropicProvider
+from ai.providers.base import ChatMessage, ProviderUnavailableError, StreamDelta, StreamUsage
+from ai.providers.batching import MicroBatcher
+from ai.providers.mock_provider import MockProvider, MockProviderError, MockSimulation
+from ai.providers.openai_provider import OpenAIProvider
+from ai.providers.resilience import (
+    AIMDLimiter,
+    CircuitBreaker,
+    CircuitState,
+    GuardedProvider,
+)
+from ai.providers.retry import DeadlineExceededError, RetryPolicy, deadline_scope, retry_after
+from ai.providers.router import ProviderRouter
+
+
+class SlowMockProvider(MockProvider):
+    """MockProvider with a fixed injected delay and optional failure."""
+
+    def __init__(self, model: str, delay: float = 0.0, fail: bool = False):
+        super().__init__(model=model)
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def _wait(self):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.model} is down")
+
+    async def chat(self, messages, system_prompt, max_tokens=500, temperature=0.7):
+        await self._wait()
+        return await super().chat(messages, system_prompt, max_tokens, temperature)
+
+    async def chat_stream_events(self, messages, system_prompt, max_tokens=500, temperature=0.7):
+        await self._wait()
+        async for event in super().chat_stream_events(messages, system_prompt, max_tokens, temperature):
+            yield event
+
+
+MESSAGES = [ChatMessage(role="user", content="Tell me a fun fact")]
+
+
+@pytest.mark.asyncio
+class TestProviderRouter:
+    """Tests for hedged requests and failover."""
+
+    async def test_fast_primary_is_not_hedged(self):
+        """Test that a healthy primary answers alone."""
+        primary = SlowMockProvider("primary")
+        secondary = SlowMockProvider("secondary")
+        router = ProviderRouter([primary, secondary], hedge_default_delay=0.2)
+
+        response = await router.chat(MESSAGES, "system")
+
+        assert response.model == "primary"
+        assert secondary.calls == 0
+
+    async def test_slow_primary_is_hedged_and_cancelled(self):
+        """Test that a slow primary is hedged and the loser cancelled."""
+        primary = SlowMockProvider("primary", delay=5.0)
+        secondary = SlowMockProvider("secondary", delay=0.0)
+        router = ProviderRouter([primary, secondary], hedge_default_delay=0.05)
+
+        started = time.monotonic()
+        response = await router.chat(MESSAGES, "system")
+        elapsed = time.monotonic() - started
+
+        assert response.model == "secondary"
+        assert elapsed < 1.0
+        assert primary.cancelled == 1
+
+    async def test_primary_wins_race_after_hedge(self):
+        """Test that the primary still wins if it beats the hedge."""
+        primary = SlowMockProvider("primary", delay=0.1)
+        secondary = SlowMockProvider("secondary", delay=5.0)
+        router = ProviderRouter([primary, secondary], hedge_default_delay=0.05)
+
+        response = await router.chat(MESSAGES, "system")
+
+        assert response.model == "primary"
+        assert secondary.calls == 1
+        assert secondary.cancelled == 1
+
+    async def test_failover_on_error(self):
+        """Test that errors fail over to the next provider."""
+        primary = SlowMockProvider("primary", fail=True)
+        secondary = SlowMockProvider("secondary")
+        router = ProviderRouter([primary, secondary], hedge_default_delay=5.0)
+
+        response = await router.chat(MESSAGES, "system")
+
+        assert response.model == "secondary"
+
+    async def test_all_providers_failing_raises(self):
+        """Test that the last error surfaces when every provider fails."""
+        router = ProviderRouter([
+            SlowMockProvider("primary", fail=True),
+            SlowMockProvider("secondary", fail=True),
+        ])
+
+        with pytest.raises(RuntimeError, match="secondary is down"):
+            await router.chat(MESSAGES, "system")
+
+    async def test_stream_is_hedged_before_first_chunk(self):
+        """Test that streaming hedges on time to first chunk."""
+        primary = SlowMockProvider("primary", delay=5.0)
+        secondary = SlowMockProvider("secondary")
+        router = ProviderRouter([primary, secondary], hedge_default_delay=0.05)
+
+        chunks = [chunk async for chunk in router.chat_stream(MESSAGES, "system")]
+
+        assert "".join(chunks)
+        assert primary.cancelled == 1
+
+    async def test_stream_fails_over_on_error(self):
+        """Test that a stream failing before output fails over."""
+        primary = SlowMockProvider("primary", fail=True)
+        secondary = SlowMockProvider("secondary")
+        router = ProviderRouter([primary, secondary], hedge_default_delay=5.0)
+
+        chunks = [chunk async for chunk in router.chat_stream(MESSAGES, "system")]
+
+        assert "".join(chunks)
+        assert secondary.calls == 1
+
+    async def test_hedge_delay_follows_latency_percentile(self):
+        """Test that the hedge delay tracks the primary's latency percentile."""
+        primary = SlowMockProvider("primary")
+        router = ProviderRouter(
+            [primary, SlowMockProvider("secondary")],
+            hedge_percentile=90.0,
+            hedge_min_delay=0.001,
+            hedge_default_delay=2.0,
+        )
+        assert router.hedge_delay(primary) == 2.0
+
+        tracker = router._latency[id(primary)]
+        for ms in range(1, 101):
+            tracker.record(ms / 1000)
+
+        assert router.hedge_delay(primary) == pytest.approx(0.091)
+
+
+class FakeClock:
+    """Manually advanced clock for breaker timing."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestCircuitBreaker:
+    """Tests for the circuit breaker state machine."""
+
+    def test_opens_after_threshold(self):
+        """Test that consecutive failures open the circuit."""
+        breaker = CircuitBreaker(failure_threshold=3, clock=FakeClock())
+        for _ in range(2):
+            breaker.record_failure()
+        assert breaker.state == CircuitState.CLOSED
+
+        breaker.record_failure()
+        assert breaker.state == CircuitState.OPEN
+        assert breaker.allow_request() is False
+
+    def test_half_open_trial_closes_on_success(self):
+        """Test the open -> half-open -> closed recovery path."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30, clock=clock)
+        breaker.record_failure()
+
+        clock.now = 31
+        assert breaker.state == CircuitState.HALF_OPEN
+        assert breaker.allow_request() is True
+        assert breaker.allow_request() is False  # Only one trial call
+
+        breaker.record_success()
+        assert breaker.state == CircuitState.CLOSED
+
+    def test_half_open_failure_reopens(self):
+        """Test that a failed trial call re-opens the circuit."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30, clock=clock)
+        breaker.record_failure()
+        clock.now = 31
+        breaker.allow_request()
+
+        breaker.record_failure()
+        assert breaker.state == CircuitState.OPEN
+
+
+class TestAIMDLimiter:
+    """Tests for the adaptive concurrency limit."""
+
+    def test_refuses_over_limit(self):
+        """Test that calls over the limit are refused."""
+        limiter = AIMDLimiter(initial_limit=2)
+        assert limiter.try_acquire() is True
+        assert limiter.try_acquire() is True
+        assert limiter.try_acquire() is False
+
+    def test_failure_halves_and_success_grows(self):
+        """Test multiplicative decrease and additive increase."""
+        limiter = AIMDLimiter(initial_limit=10)
+        limiter.try_acquire()
+        limiter.release(success=False)
+        assert limiter.limit == 5
+
+        for _ in range(10):
+            limiter.try_acquire()
+            limiter.release(success=True)
+        assert limiter.limit > 5
+
+
+@pytest.mark.asyncio
+class TestGuardedProvider:
+    """Tests for fail-fast behavior around a provider."""
+
+    async def test_open_circuit_fails_fast(self):
+        """Test that an open circuit refuses without calling the upstream."""
+        inner = SlowMockProvider("sick", fail=True)
+        guarded = GuardedProvider(inner, breaker=CircuitBreaker(failure_threshold=2))
+
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await guarded.chat(MESSAGES, "system")
+
+        with pytest.raises(ProviderUnavailableError):
+            await guarded.chat(MESSAGES, "system")
+        assert inner.calls == 2
+        assert guarded.health()["state"] == "open"
+
+    async def test_client_errors_do_not_trip_breaker(self):
+        """Test that 4xx errors other than 408/429 leave the circuit closed."""
+
+        class BadRequest(Exception):
+            status_code = 400
+
+        class BadRequestProvider(MockProvider):
+            async def chat(self, *args, **kwargs):
+                raise BadRequest("bad request")
+
+        guarded = GuardedProvider(BadRequestProvider(), breaker=CircuitBreaker(failure_threshold=1))
+        with pytest.raises(BadRequest):
+            await guarded.chat(MESSAGES, "system")
+        assert guarded.breaker.state == CircuitState.CLOSED
+
+    async def test_concurrency_limit_fails_fast(self):
+        """Test that calls over the concurrency limit are refused at once."""
+        guarded = GuardedProvider(
+            SlowMockProvider("busy", delay=0.2),
+            limiter=AIMDLimiter(initial_limit=1),
+        )
+        first = asyncio.create_task(guarded.chat(MESSAGES, "system"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(ProviderUnavailableError):
+            await guarded.chat(MESSAGES, "system")
+        await first
+        assert guarded.limiter.in_flight == 0
+
+    async def test_router_fails_over_past_open_circuit(self):
+        """Test that the router skips a provider whose circuit is open."""
+        sick = GuardedProvider(SlowMockProvider("sick"), breaker=CircuitBreaker(failure_threshold=1))
+        sick.breaker.record_failure()
+        router = ProviderRouter([sick, SlowMockProvider("healthy")], hedge_default_delay=5.0)
+
+        response = await router.chat(MESSAGES, "system")
+
+        assert response.model == "healthy"
+
+
+# --- Retries against a mock HTTP transport ---
+
+def completion_body(content: str) -> dict:
+    """OpenAI chat completion payload."""
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-test",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 5, "completion_tokens": 3, "total_tokens": 8},
+    }
+
+
+def stream_frame(content: str) -> bytes:
+    """One OpenAI streaming chunk as an SSE frame."""
+    chunk = {
+        "id": "chatcmpl-test",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "gpt-test",
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n".encode()
+
+
+class FailingByteStream(httpx.AsyncByteStream):
+    """Response body that sends some frames, then drops the connection."""
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    async def __aiter__(self):
+        for frame in self.frames:
+            yield frame
+        raise httpx.ReadError("connection dropped")
+
+
+class FlakyTransport(httpx.AsyncBaseTransport):
+    """Mock transport that replays a script of responses."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        return self.responses.pop(0)
+
+
+def openai_provider(transport: httpx.AsyncBaseTransport, max_attempts: int = 3) -> OpenAIProvider:
+    return OpenAIProvider(
+        api_key="test-key",
+        model="gpt-test",
+        http_client=httpx.AsyncClient(transport=transport),
+        retry_policy=RetryPolicy(max_attempts=max_attempts, base_delay=0.01, max_delay=0.02),
+    )
+
+
+@pytest.mark.asyncio
+class TestRetries:
+    """Tests for deadline-aware retries in providers."""
+
+    async def test_retries_rate_limit_then_succeeds(self):
+        """Test that a 429 is retried after its Retry-After."""
+        transport = FlakyTransport([
+            httpx.Response(429, headers={"retry-after": "0"}, json={"error": {"message": "slow down"}}),
+            httpx.Response(503, json={"error": {"message": "overloaded"}}),
+            httpx.Response(200, json=completion_body("Hello!")),
+        ])
+        provider = openai_provider(transport)
+
+        response = await provider.chat(MESSAGES, "system")
+
+        assert response.content == "Hello!"
+        assert transport.requests == 3
+
+    async def test_client_error_is_not_retried(self):
+        """Test that a 400 fails immediately."""
+        transport = FlakyTransport([
+            httpx.Response(400, json={"error": {"message": "bad request"}}),
+        ])
+        provider = openai_provider(transport)
+
+        with pytest.raises(Exception):
+            await provider.chat(MESSAGES, "system")
+        assert transport.requests == 1
+
+    async def test_retry_after_beyond_deadline_gives_up(self):
+        """Test that a Retry-After past the deadline fails now, not later."""
+        transport = FlakyTransport([
+            httpx.Response(429, headers={"retry-after": "10"}, json={"error": {"message": "slow down"}}),
+            httpx.Response(200, json=completion_body("too late")),
+        ])
+        provider = openai_provider(transport)
+
+        started = time.monotonic()
+        with deadline_scope(1.0):
+            with pytest.raises(Exception):
+                await provider.chat(MESSAGES, "system")
+
+        assert time.monotonic() - started < 0.5
+        assert transport.requests == 1
+
+    async def test_expired_deadline_fails_fast(self):
+        """Test that no attempt is made once the deadline has passed."""
+        transport = FlakyTransport([httpx.Response(200, json=completion_body("unused"))])
+        provider = openai_provider(transport)
+
+        with deadline_scope(0.0):
+            with pytest.raises(DeadlineExceededError):
+                await provider.chat(MESSAGES, "system")
+        assert transport.requests == 0
+
+    async def test_stream_retried_before_first_byte(self):
+        """Test that a stream failing before output is retried."""
+        transport = FlakyTransport([
+            httpx.Response(502, json={"error": {"message": "bad gateway"}}),
+            httpx.Response(
+                200,
+                headers={"content-type": "text/event-stream"},
+                content=stream_frame("Hi ") + stream_frame("there") + b"data: [DONE]\n\n",
+            ),
+        ])
+        provider = openai_provider(transport)
+
+        chunks = [chunk async for chunk in provider.chat_stream(MESSAGES, "system")]
+
+        assert "".join(chunks) == "Hi there"
+        assert transport.requests == 2
+
+    async def test_stream_not_retried_after_output(self):
+        """Test that a stream failing mid-answer is never retried."""
+        transport = FlakyTransport([
+            httpx.Response(
+                200,
+                headers={"content-type": "text/event-stream"},
+                stream=FailingByteStream([stream_frame("Once upon ")]),
+            ),
+            httpx.Response(
+                200,
+                headers={"content-type": "text/event-stream"},
+                content=stream_frame("duplicate") + b"data: [DONE]\n\n",
+            ),
+        ])
+        provider = openai_provider(transport)
+
+        chunks = []
+        with pytest.raises(Exception):
+            async for chunk in provider.chat_stream(MESSAGES, "system"):
+                chunks.append(chunk)
+
+        assert chunks == ["Once upon "]
+        assert transport.requests == 1
+
+
+class TestRetryPolicy:
+    """Tests for backoff and Retry-After parsing."""
+
+    def test_full_jitter_stays_under_cap(self):
+        """Test that backoff is uniform in [0, min(max, base * 2^n)]."""
+        policy = RetryPolicy(base_delay=0.5, max_delay=4.0)
+        for attempt in range(8):
+            cap = min(4.0, 0.5 * 2 ** attempt)
+            assert all(0 <= policy.backoff(attempt) <= cap for _ in range(50))
+
+    def test_retry_after_header_formats(self):
+        """Test seconds, milliseconds and explicit retry_after values."""
+        def error_with(headers):
+            error = Exception()
+            error.response = httpx.Response(429, headers=headers)
+            return error
+
+        assert retry_after(error_with({"retry-after": "2"})) == 2.0
+        assert retry_after(error_with({"retry-after-ms": "1500"})) == 1.5
+        assert retry_after(error_with({})) is None
+
+
+# --- Moderation micro-batching ---
+
+MODERATION_CATEGORIES = [
+    "harassment", "harassment/threatening", "hate", "hate/threatening",
+    "self-harm", "self-harm/instructions", "self-harm/intent",
+    "sexual", "sexual/minors", "violence", "violence/graphic",
+]
+
+
+class ModerationTransport(httpx.AsyncBaseTransport):
+    """Mock moderation endpoint that flags any input containing 'bomb'."""
+
+    def __init__(self):
+        self.batches = []
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        inputs = json.loads(request.content)["input"]
+        self.batches.append(inputs)
+        results = []
+        for text in inputs:
+            flagged = "bomb" in text
+            results.append({
+                "flagged": flagged,
+                "categories": {cat: flagged and cat == "violence" for cat in MODERATION_CATEGORIES},
+                "category_scores": {cat: 0.0 for cat in MODERATION_CATEGORIES},
+            })
+        return httpx.Response(200, json={"id": "modr-test", "model": "omni-moderation", "results": results})
+
+
+@pytest.mark.asyncio
+class TestMicroBatcher:
+    """Tests for coalescing concurrent calls."""
+
+    async def test_concurrent_calls_share_one_batch(self):
+        """Test that calls inside the window go out as one batch, in order."""
+        batches = []
+
+        async def handler(items):
+            batches.append(items)
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher(handler, max_batch_size=10, max_wait=0.01)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+        assert results == [0, 2, 4, 6, 8]
+        assert batches == [[0, 1, 2, 3, 4]]
+
+    async def test_full_batch_is_sent_without_waiting(self):
+        """Test that reaching max_batch_size sends at once."""
+        batches = []
+
+        async def handler(items):
+            batches.append(items)
+            return items
+
+        batcher = MicroBatcher(handler, max_batch_size=2, max_wait=10.0)
+        results = await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(i) for i in range(4))), timeout=1.0
+        )
+
+        assert results == [0, 1, 2, 3]
+        assert batches == [[0, 1], [2, 3]]
+
+    async def test_handler_error_reaches_every_caller(self):
+        """Test that a failed batch fails each waiting caller."""
+        async def handler(items):
+            raise RuntimeError("upstream down")
+
+        batcher = MicroBatcher(handler, max_wait=0.001)
+        results = await asyncio.gather(
+            batcher.submit("a"), batcher.submit("b"), return_exceptions=True
+        )
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    async def test_openai_moderation_is_batched(self):
+        """Test that concurrent OpenAIProvider.moderate calls share one request."""
+        transport = ModerationTransport()
+        provider = openai_provider(transport)
+
+        results = await asyncio.gather(
+            provider.moderate("What do dinosaurs eat?"),
+            provider.moderate("How to make a bomb"),
+            provider.moderate("Tell me about space"),
+        )
+
+        assert len(transport.batches) == 1
+        assert [r.is_safe for r in results] == [True, False, True]
+        assert results[1].flagged_categories == ["violence"]
+
+
+def simulated(**knobs) -> MockProvider:
+    """MockProvider with simulation on, fast defaults and no retries."""
+    profile = dict(enabled=True, ttft_ms=10.0, ttft_sigma=0.0, tokens_per_second=2000.0, seed=7)
+    profile.update(knobs)
+    return MockProvider(simulation=MockSimulation(**profile), retry_policy=RetryPolicy(max_attempts=1))
+
+
+@pytest.mark.asyncio
+class TestMockSimulation:
+    """Tests for MockProvider latency and failure simulation."""
+
+    async def test_disabled_by_default(self):
+        """Test that the plain MockProvider answers at once."""
+        started = time.monotonic()
+        await MockProvider().chat(MESSAGES, "system")
+        assert time.monotonic() - started < 0.05
+
+    async def test_seed_is_deterministic(self):
+        """Test that the same seed gives the same responses."""
+        first = [(await simulated(seed=3).chat(MESSAGES, "system")).content for _ in range(3)]
+        second = [(await simulated(seed=3).chat(MESSAGES, "system")).content for _ in range(3)]
+        assert first == second
+
+    async def test_time_to_first_token(self):
+        """Test that the first chunk arrives after the simulated TTFT."""
+        provider = simulated(ttft_ms=80.0)
+        started = time.monotonic()
+        stream = provider.chat_stream(MESSAGES, "system")
+        await stream.__anext__()
+        assert time.monotonic() - started >= 0.075
+        await stream.aclose()
+
+    async def test_tokens_per_second_paces_stream(self):
+        """Test that the rest of the stream is paced by tokens per second."""
+        provider = simulated(ttft_ms=0.0, tokens_per_second=200.0)
+        started = time.monotonic()
+        content = "".join([chunk async for chunk in provider.chat_stream(MESSAGES, "system")])
+        # Everything after the first word is paced
+        assert time.monotonic() - started >= (len(content) / 4 - 5) / 200
+
+    async def test_rate_limit_carries_retry_after(self):
+        """Test that simulated 429s look like SDK errors to the retry logic."""
+        provider = simulated(rate_limit_rate=1.0, retry_after_seconds=2.5)
+        with pytest.raises(MockProviderError) as exc_info:
+            await provider.chat(MESSAGES, "system")
+        assert exc_info.value.status_code == 429
+        assert retry_after(exc_info.value) == 2.5
+
+    async def test_simulated_errors_are_retried(self):
+        """Test that a partial error rate is absorbed by retries."""
+        provider = simulated(error_rate=0.5, seed=1)
+        provider._retry = RetryPolicy(max_attempts=10, base_delay=0.001)
+        for _ in range(5):
+            response = await provider.chat(MESSAGES, "system")
+            assert response.finish_reason == "stop"
+
+    async def test_timeout_hangs_until_attempt_timeout(self):
+        """Test that a simulated timeout respects the request deadline."""
+        provider = simulated(timeout_rate=1.0, timeout_seconds=30.0)
+        started = time.monotonic()
+        with deadline_scope(0.05):
+            with pytest.raises(asyncio.TimeoutError):
+                await provider.chat(MESSAGES, "system")
+        assert time.monotonic() - started < 1.0
+
+    async def test_tokens_used_counts_prompt_and_completion(self):
+        """Test that tokens_used reflects prompt plus completion size."""
+        system_prompt = "x" * 400  # ~100 tokens
+        response = await MockProvider().chat(MESSAGES, system_prompt)
+        assert response.tokens_used > 100 + len(response.content) // 5
+
+
+def sse_event(data: dict, event: str = None) -> bytes:
+    """One SSE frame, optionally with an event name (as Anthropic sends them)."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n".encode()
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Mock transport returning one response and keeping the request body."""
+
+    def __init__(self, response: httpx.Response):
+        self.response = response
+        self.body = None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.body = json.loads(request.content)
+        return self.response
+
+
+@pytest.mark.asyncio
+class TestStreamUsage:
+    """Tests for typed stream events and final usage."""
+
+    async def test_openai_stream_reports_usage(self):
+        """Test that OpenAI streams ask for usage and end with it."""
+        usage_chunk = {
+            "id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": "gpt-test-0613",
+            "choices": [],
+            "usage": {
+                "prompt_tokens": 40, "completion_tokens": 7, "total_tokens": 47,
+                "prompt_tokens_details": {"cached_tokens": 32},
+            },
+        }
+        finish_chunk = {
+            "id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": "gpt-test-0613",
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "length"}],
+        }
+        transport = RecordingTransport(httpx.Response(
+            200,
+            headers={"content-type": "text/event-stream"},
+            content=stream_frame("Hi ") + stream_frame("there") + sse_event(finish_chunk)
+            + sse_event(usage_chunk) + b"data: [DONE]\n\n",
+        ))
+
+        events = [event async for event in openai_provider(transport).chat_stream_events(MESSAGES, "system")]
+
+        assert transport.body["stream_options"] == {"include_usage": True}
+        assert events[:2] == [StreamDelta("Hi "), StreamDelta("there")]
+        assert events[-1] == StreamUsage(
+            model="gpt-test-0613", input_tokens=40, output_tokens=7, cached_tokens=32, finish_reason="length"
+        )
+
+    async def test_anthropic_stream_reports_usage(self):
+        """Test that Anthropic usage is collected from message_start and message_delta."""
+        frames = [
+            sse_event({"type": "message_start", "message": {
+                "id": "msg_1", "type": "message", "role": "assistant", "model": "claude-test", "content": [],
+                "stop_reason": None, "stop_sequence": None,
+                "usage": {"input_tokens": 25, "output_tokens": 1, "cache_read_input_tokens": 20},
+            }}, "message_start"),
+            sse_event({"type": "content_block_start", "index": 0,
+                       "content_block": {"type": "text", "text": ""}}, "content_block_start"),
+            sse_event({"type": "content_block_delta", "index": 0,
+                       "delta": {"type": "text_delta", "text": "Hello"}}, "content_block_delta"),
+            sse_event({"type": "content_block_delta", "index": 0,
+                       "delta": {"type": "text_delta", "text": " friend"}}, "content_block_delta"),
+            sse_event({"type": "content_block_stop", "index": 0}, "content_block_stop"),
+            sse_event({"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                       "usage": {"output_tokens": 9}}, "message_delta"),
+            sse_event({"type": "message_stop"}, "message_stop"),
+        ]
+        transport = RecordingTransport(httpx.Response(
+            200, headers={"content-type": "text/event-stream"}, content=b"".join(frames)
+        ))
+        provider = AnthropicProvider(
+            api_key="test-key",
+            model="claude-test",
+            http_client=httpx.AsyncClient(transport=transport),
+            retry_policy=RetryPolicy(max_attempts=1),
+        )
+
+        events = [event async for event in provider.chat_stream_events(MESSAGES, "system")]
+
+        assert events == [
+            StreamDelta("Hello"),
+            StreamDelta(" friend"),
+            StreamUsage(model="claude-test", input_tokens=25, output_tokens=9, cached_tokens=20,
+                        finish_reason="end_turn"),
+        ]
+
+    async def test_mock_stream_usage_and_text_adapter(self):
+        """Test that the mock ends with usage and chat_stream still yields plain text."""
+        provider = MockProvider(model="mock-test")
+        events = [event async for event in provider.chat_stream_events(MESSAGES, "system")]
+        usage = events[-1]
+        assert isinstance(usage, StreamUsage)
+        assert usage.model == "mock-test" and usage.input_tokens > 0 and usage.output_tokens > 0
+        assert all(isinstance(event, StreamDelta) for event in events[:-1])
+
+        chunks = [chunk async for chunk in provider.chat_stream(MESSAGES, "system")]
+        assert chunks and all(isinstance(chunk, str) for chunk in chunks)
+
+    async def test_router_passes_usage_through(self):
+        """Test that the router forwards the winning provider's usage event."""
+        router = ProviderRouter([SlowMockProvider("primary")], hedge_default_delay=0.2)
+        events = [event async for event in router.chat_stream_events(MESSAGES, "system")]
+        assert events[-1].model == "primary"
+
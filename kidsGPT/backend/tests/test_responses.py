@@ -0,0 +1,75 @@
+"""
+Tests for fast JSON responses.
+"""
+
+import json
+from datetime import datetime
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from httpx import AsyncClient
+
+from app.core.responses import PydanticResponse
+from app.models import MessageRole
+from app.schemas import ConversationWithMessages, MessageResponse
+
+
+def transcript(messages: int = 3) -> ConversationWithMessages:
+    started = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    return ConversationWithMessages(
+        id=1,
+        child_id=2,
+        title="Dinosaurs",
+        started_at=started,
+        ended_at=None,
+        is_flagged=False,
+        message_count=messages,
+        messages=[
+            MessageResponse(
+                id=i,
+                conversation_id=1,
+                role=MessageRole.CHILD if i % 2 == 0 else MessageRole.ASSISTANT,
+                content=f"Message {i} with \"quotes\" and emoji \U0001F995",
+                is_flagged=False,
+                created_at=started,
+            )
+            for i in range(messages)
+        ],
+    )
+
+
+class TestPydanticResponse:
+    """Tests for serializing validated models without FastAPI's response_model pass."""
+
+    def test_matches_default_encoding(self):
+        """Test that output is identical to FastAPI's default encoding."""
+        model = transcript()
+        fast = json.loads(PydanticResponse(model).body)
+        assert fast == jsonable_encoder(model)
+
+    def test_list_of_models(self):
+        """Test that lists of models render as a JSON array."""
+        models = [transcript(1), transcript(2)]
+        body = json.loads(PydanticResponse(models).body)
+        assert body == jsonable_encoder(models)
+
+    def test_plain_content_uses_orjson(self):
+        """Test that non-model content still renders."""
+        assert json.loads(PydanticResponse({"a": [1, 2]}).body) == {"a": [1, 2]}
+        assert json.loads(PydanticResponse([]).body) == []
+
+
+@pytest.mark.asyncio
+async def test_endpoints_serve_json(client: AsyncClient):
+    """Test that fast-path and default endpoints both return JSON."""
+    parent = (await client.post("/api/auth/register", json={"email": "json@test.com"})).json()
+    await client.post(f"/api/children?parent_id={parent['id']}", json={"name": "Jay", "age": 7})
+
+    response = await client.get("/api/children", params={"parent_id": parent["id"]})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.json()[0]["name"] == "Jay"
+
+    response = await client.get("/health")
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == {"status": "healthy"}
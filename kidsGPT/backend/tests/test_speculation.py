@@ -0,0 +1,197 @@
+"""
+Tests for speculative generation alongside input moderation.
+Uses MockProvider instances with injected latency - no external API calls.
+"""
+
+import asyncio
+
+import pytest
+
+from ai.providers.base import ChatMessage, ModerationResult
+from ai.providers.mock_provider import MockProvider
+from app.core.config import settings
+from app.services.ai_service import AIService
+from app.services.speculation import SpeculationStats, speculate
+
+
+class ModeratedMockProvider(MockProvider):
+    """MockProvider with slow generation and a scripted moderation verdict."""
+
+    def __init__(self, generation_delay: float, moderation_delay: float, flagged: list = None):
+        super().__init__()
+        self.generation_delay = generation_delay
+        self.moderation_delay = moderation_delay
+        self.flagged = flagged or []
+        self.generation_cancelled = False
+
+    async def _generate(self):
+        try:
+            await asyncio.sleep(self.generation_delay)
+        except asyncio.CancelledError:
+            self.generation_cancelled = True
+            raise
+
+    async def chat(self, messages, system_prompt, max_tokens=500, temperature=0.7):
+        await self._generate()
+        return await super().chat(messages, system_prompt, max_tokens, temperature)
+
+    async def chat_stream_events(self, messages, system_prompt, max_tokens=500, temperature=0.7):
+        await self._generate()
+        async for event in super().chat_stream_events(messages, system_prompt, max_tokens, temperature):
+            yield event
+
+    async def moderate(self, text):
+        await asyncio.sleep(self.moderation_delay)
+        return ModerationResult(
+            is_safe=not self.flagged,
+            categories={category: True for category in self.flagged},
+            category_scores={},
+            flagged_categories=self.flagged,
+        )
+
+
+MESSAGES = [ChatMessage(role="user", content="Tell me a fun fact")]
+
+
+@pytest.fixture
+def moderation_on(monkeypatch):
+    monkeypatch.setattr(settings, "AI_INPUT_MODERATION", True)
+    monkeypatch.setattr(settings, "AI_SPECULATIVE_GENERATION", True)
+
+
+def service_with(provider: MockProvider) -> AIService:
+    service = AIService("mock")
+    service._provider = provider
+    return service
+
+
+class TestSpeculate:
+    """Tests for the speculate() primitive."""
+
+    @pytest.mark.asyncio
+    async def test_passing_checks_release_result(self):
+        """Test that the generation result is released once all checks pass."""
+        stats = SpeculationStats()
+
+        async def generation():
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        async def check():
+            await asyncio.sleep(0.05)
+            return None
+
+        started = asyncio.get_running_loop().time()
+        result, verdict = await speculate(generation(), [check(), check()], stats)
+        elapsed = asyncio.get_running_loop().time() - started
+
+        assert (result, verdict) == ("answer", None)
+        assert elapsed < 0.09  # Overlapped, not 0.1s sequential
+        assert stats.released == 1
+        assert stats.latency_saved_seconds > 0
+
+    @pytest.mark.asyncio
+    async def test_blocking_check_cancels_generation(self):
+        """Test that a blocking verdict cancels the in-flight generation."""
+        stats = SpeculationStats()
+        cancelled = asyncio.Event()
+
+        async def generation():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return "answer"
+
+        async def check():
+            await asyncio.sleep(0.01)
+            return "blocked"
+
+        result, verdict = await speculate(generation(), [check()], stats)
+
+        assert (result, verdict) == (None, "blocked")
+        assert cancelled.is_set()
+        assert stats.cancelled == 1
+
+    @pytest.mark.asyncio
+    async def test_failing_check_fails_closed(self):
+        """Test that a check that raises cancels the generation and propagates."""
+        cancelled = asyncio.Event()
+
+        async def generation():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def check():
+            raise RuntimeError("moderation down")
+
+        with pytest.raises(RuntimeError):
+            await speculate(generation(), [check()], SpeculationStats())
+        assert cancelled.is_set()
+
+
+class TestSpeculativeChat:
+    """Tests for AIService wiring of speculative generation."""
+
+    @pytest.mark.asyncio
+    async def test_chat_overlaps_moderation(self, moderation_on):
+        """Test that moderation time is hidden behind generation."""
+        service = service_with(ModeratedMockProvider(generation_delay=0.1, moderation_delay=0.1))
+
+        started = asyncio.get_running_loop().time()
+        response = await service.chat(child_age=7, messages=MESSAGES)
+        elapsed = asyncio.get_running_loop().time() - started
+
+        assert response.finish_reason == "stop"
+        assert elapsed < 0.18
+        assert service.speculation_stats.released == 1
+
+    @pytest.mark.asyncio
+    async def test_chat_flagged_returns_deflection(self, moderation_on):
+        """Test that flagged input deflects and cancels generation."""
+        provider = ModeratedMockProvider(generation_delay=5, moderation_delay=0.01, flagged=["self_harm"])
+        service = service_with(provider)
+
+        response = await service.chat(child_age=7, messages=MESSAGES)
+
+        assert response.finish_reason == "filtered"
+        assert response.content == service.input_filter.DEFLECTION_RESPONSES["self_harm"]
+        assert provider.generation_cancelled
+        assert service.speculation_stats.cancelled == 1
+
+    @pytest.mark.asyncio
+    async def test_sequential_mode_skips_generation(self, moderation_on, monkeypatch):
+        """Test that with speculation off, flagged input never starts generation."""
+        monkeypatch.setattr(settings, "AI_SPECULATIVE_GENERATION", False)
+        provider = ModeratedMockProvider(generation_delay=5, moderation_delay=0.01, flagged=["violence"])
+        service = service_with(provider)
+
+        response = await service.chat(child_age=7, messages=MESSAGES)
+
+        assert response.content == service.input_filter.DEFLECTION_RESPONSES["dangerous"]
+        assert not provider.generation_cancelled
+        assert service.speculation_stats.cancelled == 0
+
+    @pytest.mark.asyncio
+    async def test_stream_holds_first_chunk_until_checks_pass(self, moderation_on):
+        """Test that a stream is released in full once moderation passes."""
+        service = service_with(ModeratedMockProvider(generation_delay=0.01, moderation_delay=0.05))
+
+        chunks = [chunk async for chunk in service.chat_stream(child_age=7, messages=MESSAGES)]
+
+        assert "".join(chunks)
+        assert service.speculation_stats.released == 1
+
+    @pytest.mark.asyncio
+    async def test_stream_flagged_yields_only_deflection(self, moderation_on):
+        """Test that a flagged stream yields the deflection and nothing else."""
+        provider = ModeratedMockProvider(generation_delay=0.01, moderation_delay=0.05, flagged=["sexual"])
+        service = service_with(provider)
+
+        chunks = [chunk async for chunk in service.chat_stream(child_age=7, messages=MESSAGES)]
+
+        assert chunks == [service.input_filter.DEFLECTION_RESPONSES["explicit"]]
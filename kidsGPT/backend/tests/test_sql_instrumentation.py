@@ -0,0 +1,150 @@
+"""
+Tests for SQL statement instrumentation and per-endpoint query budgets.
+"""
+
+import logging
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.sql_instrumentation import (
+    QueryBudgetExceeded,
+    fingerprint,
+    query_budget,
+    track_queries,
+)
+from app.models import Child, Conversation, Message, MessageRole, SubscriptionTier, User, UserRole
+
+
+async def seed_families(db: AsyncSession, parents: int = 3, children_each: int = 3) -> dict:
+    """Admin plus parents with children, each with a flagged conversation of two messages."""
+    admin = User(email="admin@test.com", role=UserRole.ADMIN)
+    db.add(admin)
+    parent_ids = []
+    for p in range(parents):
+        parent = User(email=f"parent{p}@test.com", subscription_tier=SubscriptionTier.PREMIUM)
+        db.add(parent)
+        await db.flush()
+        parent_ids.append(parent.id)
+        for c in range(children_each):
+            child = Child(parent_id=parent.id, name=f"Kid{p}{c}", age=8, login_pin=f"{p}{c}0000")
+            db.add(child)
+            await db.flush()
+            conversation = Conversation(child_id=child.id, title="Hi", is_flagged=True, flag_reason="test")
+            db.add(conversation)
+            await db.flush()
+            db.add_all([
+                Message(conversation_id=conversation.id, role=MessageRole.CHILD, content="Hi"),
+                Message(conversation_id=conversation.id, role=MessageRole.ASSISTANT, content="Hello!"),
+            ])
+    await db.flush()
+    return {"admin_id": admin.id, "parent_ids": parent_ids}
+
+
+class TestFingerprint:
+    """Tests for statement normalization."""
+
+    def test_literals_are_replaced(self):
+        """Test that queries differing only in literals share a fingerprint."""
+        assert fingerprint("SELECT * FROM t WHERE id = 1") == fingerprint("SELECT * FROM t WHERE id = 42")
+        assert fingerprint("SELECT * FROM t WHERE name = 'a'") == fingerprint("SELECT * FROM t WHERE name = 'b''c'")
+
+    def test_in_lists_collapse(self):
+        """Test that IN lists of any length share a fingerprint."""
+        assert fingerprint("SELECT * FROM t WHERE id IN (?, ?)") == fingerprint("SELECT * FROM t WHERE id IN (?,?,?)")
+
+    def test_whitespace_folded(self):
+        """Test that formatting differences are ignored."""
+        assert fingerprint("SELECT *\n  FROM t") == "SELECT * FROM t"
+
+
+@pytest.mark.asyncio
+class TestQueryTracking:
+    """Tests for the tracking scopes and budget helper."""
+
+    async def test_counts_and_fingerprints(self, db_session: AsyncSession):
+        """Test that repeats of one statement are counted under one fingerprint."""
+        with track_queries() as stats:
+            for i in range(3):
+                await db_session.execute(text(f"SELECT {i}"))
+        assert stats.statements == 3
+        assert stats.repeated(2) == [("SELECT ?", 3)]
+
+    async def test_scopes_nest(self, db_session: AsyncSession):
+        """Test that a statement counts towards every enclosing scope."""
+        with track_queries() as outer:
+            with track_queries() as inner:
+                await db_session.execute(text("SELECT 1"))
+            await db_session.execute(text("SELECT 2"))
+        assert (outer.statements, inner.statements) == (2, 1)
+
+    async def test_budget_fails_on_too_many_statements(self, db_session: AsyncSession):
+        """Test that exceeding the statement budget fails."""
+        with pytest.raises(QueryBudgetExceeded, match="2 statements"):
+            with query_budget(max_statements=1):
+                await db_session.execute(text("SELECT 1"))
+                await db_session.execute(text("SELECT 2"))
+
+    async def test_budget_fails_on_repeats(self, db_session: AsyncSession):
+        """Test that repeating a fingerprint past max_repeats fails."""
+        with pytest.raises(QueryBudgetExceeded, match="ran 3 times"):
+            with query_budget(max_repeats=2):
+                for i in range(3):
+                    await db_session.execute(text(f"SELECT {i}"))
+
+    async def test_failed_statement_leaves_no_state(self, db_session: AsyncSession):
+        """Test that a statement that raises leaves nothing behind on the pooled connection."""
+        with pytest.raises(OperationalError):
+            await db_session.execute(text("SELECT * FROM no_such_table"))
+        await db_session.rollback()
+        connection = await db_session.connection()
+        assert not connection.info.get("query_started")
+        with track_queries() as stats:
+            await db_session.execute(text("SELECT 1"))
+        assert stats.statements == 1
+
+    async def test_slow_query_logged(self, db_session: AsyncSession, monkeypatch, caplog):
+        """Test that statements over the threshold are logged."""
+        monkeypatch.setattr(settings, "SQL_SLOW_QUERY_MS", 0.0)
+        with caplog.at_level(logging.WARNING, logger="app.core.sql_instrumentation"):
+            await db_session.execute(text("SELECT 1"))
+        assert "Slow query" in caplog.text
+
+
+@pytest.mark.asyncio
+class TestEndpointQueryBudgets:
+    """Regression tests: list endpoints must not query per row."""
+
+    async def test_list_children(self, client: AsyncClient, db_session: AsyncSession):
+        """Test that listing children costs the same for any number of children."""
+        data = await seed_families(db_session, parents=1, children_each=3)
+        with query_budget(max_statements=4, max_repeats=1):
+            response = await client.get("/api/children", params={"parent_id": data["parent_ids"][0]})
+        assert response.status_code == 200
+        assert [c["total_messages"] for c in response.json()] == [2, 2, 2]
+
+    async def test_admin_list_users(self, client: AsyncClient, db_session: AsyncSession):
+        """Test that the admin user list uses grouped counts."""
+        data = await seed_families(db_session, parents=3, children_each=2)
+        with query_budget(max_statements=5, max_repeats=1):
+            response = await client.get("/api/admin/users", params={"admin_id": data["admin_id"]})
+        assert response.status_code == 200
+        by_email = {u["email"]: u for u in response.json()}
+        assert by_email["parent0@test.com"]["children_count"] == 2
+        assert by_email["parent0@test.com"]["total_messages"] == 4
+
+    async def test_flagged_conversations(self, client: AsyncClient, db_session: AsyncSession):
+        """Test that flagged conversations eager-load children and messages."""
+        data = await seed_families(db_session, parents=2, children_each=2)
+        with query_budget(max_statements=5, max_repeats=1):
+            response = await client.get(
+                "/api/admin/flagged-conversations", params={"admin_id": data["admin_id"]}
+            )
+        assert response.status_code == 200
+        flagged = response.json()
+        assert len(flagged) == 4
+        assert [m["content"] for m in flagged[0]["messages"]] == ["Hi", "Hello!"]
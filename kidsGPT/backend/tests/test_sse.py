@@ -0,0 +1,191 @@
+"""
+Tests for the SSE writer and the streaming chat endpoint.
+"""
+
+import asyncio
+import json
+import time
+from typing import List
+from unittest.mock import patch
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ai.providers.base import StreamDelta
+from app.core.sse import DONE_FRAME, HEARTBEAT_FRAME, SSEWriter
+from app.main import app
+from app.models import FinishReason, Message, MessageRole
+from tests.conftest import make_child
+
+
+def parse_frames(frames: List[bytes]) -> List[dict]:
+    """Decode data frames, skipping comment (heartbeat) frames."""
+    events = []
+    for frame in b"".join(frames).split(b"\n\n"):
+        if frame.startswith(b"data: "):
+            events.append(json.loads(frame[len(b"data: "):]))
+    return events
+
+
+async def words(items: List[str], delay: float = 0.0):
+    for item in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield item
+
+
+async def collect(writer: SSEWriter) -> List[bytes]:
+    return [frame async for frame in writer.frames()]
+
+
+@pytest.mark.asyncio
+class TestSSEWriter:
+    """Tests for coalescing, heartbeats and backpressure."""
+
+    async def test_chunks_are_coalesced(self):
+        """Test that a burst of chunks is sent in fewer frames with the same text."""
+        chunks = [f"word{i} " for i in range(100)]
+        writer = SSEWriter(words(chunks), coalesce_bytes=64, coalesce_ms=1000, heartbeat_seconds=60)
+        frames = await collect(writer)
+
+        events = parse_frames(frames)
+        assert "".join(e["chunk"] for e in events if "chunk" in e) == "".join(chunks)
+        assert events[-1] == {"done": True}
+        assert writer.stats.chunks == 100
+        assert writer.stats.frames < 20
+
+    async def test_first_chunk_is_not_delayed(self):
+        """Test that the first chunk gets its own frame straight away."""
+        frames = await collect(SSEWriter(words(["Hello", " there", " friend"]), coalesce_ms=1000))
+        assert parse_frames(frames)[:2] == [{"chunk": "Hello"}, {"chunk": " there friend"}]
+
+    async def test_time_window_flushes(self):
+        """Test that pending chunks are flushed when the window passes, before the stream ends."""
+        async def slow_tail():
+            yield "a"
+            yield "b"
+            await asyncio.sleep(0.2)
+            yield "c"
+
+        writer = SSEWriter(slow_tail(), coalesce_bytes=1000, coalesce_ms=20, heartbeat_seconds=60)
+        events = parse_frames(await collect(writer))
+        assert events == [{"chunk": "a"}, {"chunk": "b"}, {"chunk": "c"}, {"done": True}]
+
+    async def test_heartbeat_when_idle(self):
+        """Test that a comment frame is sent while the provider is silent."""
+        frames = await collect(SSEWriter(words(["late"], delay=0.15), heartbeat_seconds=0.05))
+        assert HEARTBEAT_FRAME in frames
+        assert frames[-1] == DONE_FRAME
+        assert parse_frames(frames) == [{"chunk": "late"}, {"done": True}]
+
+    async def test_error_frame_after_partial_output(self):
+        """Test that a failing source flushes what it has, then reports the error."""
+        async def failing():
+            yield "Once"
+            yield " upon"
+            raise RuntimeError("provider went away")
+
+        events = parse_frames(await collect(SSEWriter(failing(), coalesce_ms=1000)))
+        assert events == [{"chunk": "Once"}, {"chunk": " upon"}, {"error": "provider went away"}]
+
+    async def test_slow_client_applies_backpressure(self):
+        """Test that the provider is not read far ahead of a client that stopped reading."""
+        produced = 0
+
+        async def endless():
+            nonlocal produced
+            while True:
+                produced += 1
+                yield "x"
+
+        frames = SSEWriter(endless(), coalesce_bytes=1, max_pending=8).frames()
+        await frames.__anext__()
+        await asyncio.sleep(0.05)  # Client stalls
+        assert produced <= 8 + 2
+
+        await frames.aclose()
+        assert produced <= 8 + 2
+
+
+@pytest.mark.asyncio
+async def test_stream_endpoint(client: AsyncClient, db_session: AsyncSession):
+    """Test that the streaming endpoint sends the answer as coalesced frames."""
+    child = await make_child(db_session)
+
+    response = await client.post("/api/chat/stream", json={"child_id": child.id, "message": "Tell me about stars"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [json.loads(line[len("data: "):]) for line in response.text.split("\n\n") if line.startswith("data: ")]
+    assert events[-1] == {"done": True}
+    assert "".join(e["chunk"] for e in events[:-1])
+
+
+class EndlessAIService:
+    """Stand-in AI service whose stream never ends on its own; records when it is closed."""
+
+    def __init__(self):
+        self.provider = type("Provider", (), {"model": "endless"})()
+        self.chunks_sent = 0
+        self.closed_at = None
+
+    async def chat_stream_events(self, **kwargs):
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                self.chunks_sent += 1
+                yield StreamDelta(f"word{self.chunks_sent} ")
+        finally:
+            self.closed_at = time.monotonic()
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_upstream_and_saves_partial(client: AsyncClient, db_session: AsyncSession):
+    """Test that a client disconnect closes the provider stream promptly and records the partial answer."""
+    child = await make_child(db_session)
+
+    body = json.dumps({"child_id": child.id, "message": "Tell me a long story"}).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": "/api/chat/stream", "raw_path": b"/api/chat/stream",
+        "root_path": "", "query_string": b"", "client": ("127.0.0.1", 5000), "server": ("test", 80),
+        "headers": [(b"host", b"test"), (b"content-type", b"application/json")],
+    }
+    received = []
+    disconnected_at = None
+    got_chunks = asyncio.Event()
+    requests = iter([{"type": "http.request", "body": body, "more_body": False}])
+
+    async def receive():
+        nonlocal disconnected_at
+        request = next(requests, None)
+        if request is not None:
+            return request
+        await got_chunks.wait()  # The child closes the app mid-answer
+        disconnected_at = time.monotonic()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            received.append(message["body"])
+            if len(received) >= 2:
+                got_chunks.set()
+                await asyncio.Event().wait()  # The write never completes: the connection is gone
+
+    service = EndlessAIService()
+    with patch("app.services.chat_session.get_ai_service", return_value=service):
+        await asyncio.wait_for(app(scope, receive, send), 5)
+
+    assert service.closed_at is not None
+    assert 0 <= service.closed_at - disconnected_at < 0.5
+    chunks_at_close = service.chunks_sent
+    await asyncio.sleep(0.05)
+    assert service.chunks_sent == chunks_at_close
+
+    saved = (await db_session.execute(
+        select(Message).where(Message.role == MessageRole.ASSISTANT)
+    )).scalar_one()
+    assert saved.finish_reason == FinishReason.CANCELLED
+    assert saved.content.startswith("word1 ")
@@ -0,0 +1,93 @@
+"""
+Tests for request tracing spans, Server-Timing and the JSON-lines exporter.
+"""
+
+import json
+
+import pytest
+from httpx import AsyncClient
+
+from app.core.config import settings
+from app.core.tracing import Trace, _NOOP_SPAN, _current_trace, span
+
+
+@pytest.fixture
+def tracing_on(monkeypatch):
+    monkeypatch.setattr(settings, "TRACING_ENABLED", True)
+
+
+class TestSpans:
+    """Tests for span nesting outside HTTP."""
+
+    def test_span_is_noop_without_trace(self):
+        """Test that span() costs nothing when no trace is active."""
+        assert span("anything") is _NOOP_SPAN
+        with span("anything") as s:
+            s.set_attribute("ignored", True)
+
+    def test_spans_nest_under_current_span(self):
+        """Test that child spans point at their parent and the root."""
+        trace = Trace("test")
+        token = _current_trace.set(trace)
+        try:
+            with span("outer") as outer:
+                with span("inner") as inner:
+                    pass
+        finally:
+            _current_trace.reset(token)
+
+        assert outer.parent_id == trace.root_id
+        assert inner.parent_id == outer.span_id
+        assert [s.name for s in trace.spans] == ["inner", "outer"]
+
+    def test_server_timing_aggregates_by_name(self):
+        """Test that repeated spans are summed into one Server-Timing entry."""
+        trace = Trace("test")
+        trace.record("db", 0, 2_000_000)
+        trace.record("db", 0, 1_000_000)
+
+        header = trace.server_timing()
+        assert 'db;dur=3.00;desc="2x"' in header
+        assert "total;dur=" in header
+
+
+@pytest.mark.asyncio
+async def test_no_header_when_disabled(client: AsyncClient):
+    """Test that tracing is off by default."""
+    response = await client.get("/health")
+    assert "server-timing" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_chat_turn_breakdown(client: AsyncClient, tracing_on):
+    """Test that a chat turn reports filter, prompt, model and DB time."""
+    parent = (await client.post("/api/auth/register", json={"email": "trace@test.com"})).json()
+    child = (await client.post(f"/api/children?parent_id={parent['id']}", json={"name": "Tracy", "age": 9})).json()
+
+    response = await client.post("/api/chat", json={"child_id": child["id"], "message": "Tell me a fun fact"})
+
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    for name in ("prompt.build", "filter.input", "ai.chat", "filter.output", "total"):
+        assert f"{name};dur=" in timing
+
+
+@pytest.mark.asyncio
+async def test_export_writes_otel_json_lines(client: AsyncClient, tracing_on, monkeypatch, tmp_path):
+    """Test that finished traces are exported with parent links."""
+    from app.core import tracing
+
+    path = tmp_path / "spans.jsonl"
+    monkeypatch.setattr(settings, "TRACING_EXPORT_PATH", str(path))
+    monkeypatch.setattr(tracing, "_exporter", None)
+
+    await client.get("/api/chat/today/999")
+    tracing.flush_traces()
+
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    root = spans[0]
+    assert root["name"] == "GET /api/chat/today/999"
+    assert root["attributes"]["http.route"] == "/api/chat/today/{child_id}"
+    assert root["parentSpanId"] == ""
+    assert all(s["traceId"] == root["traceId"] for s in spans)
+    assert root["endTimeUnixNano"] >= root["startTimeUnixNano"]
@@ -0,0 +1,113 @@
+"""
+Tests for the streaming transcript export.
+"""
+
+import csv
+import gzip
+import io
+import json
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import get_session_factory
+from app.main import app
+from app.models import Child, Conversation, Message, MessageRole
+from app.services.transcript_export import export_transcript
+from tests.conftest import make_child
+
+
+async def make_history(db: AsyncSession, conversations: int = 3, turns: int = 2) -> Child:
+    """A child with `conversations` conversations of `turns` turns each, plus one empty conversation."""
+    child = await make_child(db)
+
+    for c in range(conversations):
+        conversation = Conversation(child_id=child.id, title=f"Topic {c}", message_count=turns * 2)
+        db.add(conversation)
+        await db.flush()
+        for t in range(turns):
+            db.add_all([
+                Message(conversation_id=conversation.id, role=MessageRole.CHILD, content=f"Question {c}.{t}"),
+                Message(conversation_id=conversation.id, role=MessageRole.ASSISTANT, content=f"Answer, {c}.{t}"),
+            ])
+    db.add(Conversation(child_id=child.id, title="Nothing said", message_count=0))
+    await db.flush()
+    return child
+
+
+def ndjson(body: bytes) -> list:
+    return [json.loads(line) for line in body.decode().splitlines()]
+
+
+@pytest.mark.asyncio
+class TestTranscriptExport:
+    """Tests for the export endpoint and encoder."""
+
+    async def test_ndjson_in_order(self, client: AsyncClient, db_session: AsyncSession):
+        """Test that each conversation line is followed by its messages, in id order."""
+        child = await make_history(db_session)
+        response = await client.get(f"/api/chat/export/{child.id}", params={"parent_id": child.parent_id})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert 'filename="child-' in response.headers["content-disposition"]
+        records = ndjson(response.content)
+        assert [r["type"] for r in records] == (["conversation"] + ["message"] * 4) * 3 + ["conversation"]
+        assert records[1]["role"] == "child"
+        assert records[2]["content"] == "Answer, 0.0"
+        assert records[-1]["title"] == "Nothing said"
+
+    async def test_csv_rows(self, client: AsyncClient, db_session: AsyncSession):
+        """Test that CSV has one row per message and one for an empty conversation."""
+        child = await make_history(db_session, conversations=2, turns=1)
+        response = await client.get(
+            f"/api/chat/export/{child.id}", params={"parent_id": child.parent_id, "format": "csv"}
+        )
+
+        assert response.status_code == 200
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) == 5
+        assert rows[0]["conversation_title"] == "Topic 0"
+        assert rows[1]["content"] == "Answer, 0.0"
+        assert rows[-1]["conversation_title"] == "Nothing said"
+        assert rows[-1]["message_id"] == ""
+
+    async def test_gzip_round_trip(self, client: AsyncClient, db_session: AsyncSession):
+        """Test that a gzip export decompresses to the plain export."""
+        child = await make_history(db_session)
+        params = {"parent_id": child.parent_id}
+        plain = await client.get(f"/api/chat/export/{child.id}", params=params)
+        packed = await client.get(f"/api/chat/export/{child.id}", params={**params, "gzip": True})
+
+        assert packed.headers["content-type"] == "application/gzip"
+        assert packed.headers["content-disposition"].endswith('.ndjson.gz"')
+        assert gzip.decompress(packed.content) == plain.content
+
+    async def test_small_batches_match_one_batch(self, client: AsyncClient, db_session: AsyncSession):
+        """Test that keyset paging across many small batches yields the same records."""
+        child = await make_history(db_session, conversations=5, turns=3)
+        session_factory = app.dependency_overrides[get_session_factory]()
+
+        async def body(batch_size: int) -> bytes:
+            return b"".join([
+                chunk async for chunk in export_transcript(session_factory, child.id, batch_size=batch_size)
+            ])
+
+        small = await body(2)
+        assert small == await body(1000)
+        assert len(ndjson(small)) == 5 + 5 * 6 + 1
+
+    async def test_other_parent_gets_404(self, client: AsyncClient, db_session: AsyncSession):
+        """Test that a parent cannot export another parent's child."""
+        child = await make_history(db_session)
+        response = await client.get(f"/api/chat/export/{child.id}", params={"parent_id": child.parent_id + 1})
+        assert response.status_code == 404
+
+    async def test_unknown_format(self, client: AsyncClient, db_session: AsyncSession):
+        """Test that an unsupported format is rejected."""
+        child = await make_history(db_session)
+        response = await client.get(
+            f"/api/chat/export/{child.id}", params={"parent_id": child.parent_id, "format": "xml"}
+        )
+        assert response.status_code == 400
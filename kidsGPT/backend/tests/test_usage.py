@@ -0,0 +1,165 @@
+"""
+Tests for the token usage ledger, its aggregates and the daily token budget.
+"""
+
+from datetime import date, datetime
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ai.providers.base import StreamUsage
+from app.core.config import settings
+from app.models import Child, UsageDaily, UsageRecord, User, UserRole
+from app.models import user as user_models
+from app.services import usage as usage_service
+from app.services import write_behind
+from app.services.chat_session import ChatSession, ChatSessionError
+from app.services.usage import estimated_cost, record_usage, usage_entry
+from app.services.write_behind import WriteBehindQueue
+from tests.conftest import make_child
+
+
+def test_estimated_cost(monkeypatch):
+    """Test that cached input is priced separately and dated model snapshots match by prefix."""
+    monkeypatch.setattr(settings, "AI_TOKEN_PRICES", {"gpt-4o": [2.5, 10.0, 1.25], "gpt-4o-mini": [0.15, 0.6]})
+    assert estimated_cost("gpt-4o-2024-08-06", 1_000_000, 100_000, cached_tokens=400_000) == 1.5 + 0.5 + 1.0
+    assert estimated_cost("gpt-4o-mini", 1_000_000, 0) == 0.15
+    assert estimated_cost("claude-3-haiku", 1000, 1000) is None
+
+
+@pytest.mark.asyncio
+class TestRecorded:
+    """Tests for ledger writes on the chat paths."""
+
+    async def test_stream_turns_aggregate(self, session_factory):
+        """Test that each turn gets a ledger row and same-day turns share one aggregate row."""
+        async with session_factory() as db:
+            child = await make_child(db)
+        session = ChatSession(session_factory, child)
+        turns = []
+        for cached in (0, 30):
+            usage = StreamUsage(model="mock", input_tokens=100, output_tokens=20, cached_tokens=cached)
+            turns.append(await session.save_turn("Hi", "Hello!", "mock", tokens_used=usage.tokens_used, usage=usage))
+        # A deflected turn uses no tokens and costs nothing
+        await session.save_turn("Hi", "Let's talk about something else", "mock", tokens_used=0, usage=StreamUsage(model="mock"))
+
+        async with session_factory() as db:
+            records = (await db.execute(select(UsageRecord))).scalars().all()
+            [daily] = (await db.execute(select(UsageDaily))).scalars().all()
+            stored = await db.get(Child, child.id)
+        assert [record.cached_tokens for record in records] == [0, 30]
+        assert [record.message_id for record in records] == [turn.response_id for turn in turns]
+        assert (daily.parent_id, daily.day, daily.model) == (child.parent_id, datetime.utcnow().date(), "mock")
+        assert (daily.turns, daily.input_tokens, daily.output_tokens, daily.cached_tokens) == (2, 200, 40, 30)
+        assert stored.tokens_today == 240
+
+    async def test_write_behind_batches(self, session_factory, monkeypatch):
+        """Test that queued turns reach the ledger and the token budget counter with their batch."""
+        async with session_factory() as db:
+            child = await make_child(db)
+        queue = WriteBehindQueue(session_factory, max_delay_ms=20)
+        queue.start()
+        monkeypatch.setattr(write_behind, "_writer", queue)
+        session = ChatSession(session_factory, child)
+        for i in range(3):
+            usage = StreamUsage(model="mock", input_tokens=50, output_tokens=10)
+            await session.save_turn(f"Question {i}", f"Answer {i}", "mock", tokens_used=usage.tokens_used, usage=usage)
+        await queue.close()
+
+        async with session_factory() as db:
+            [daily] = (await db.execute(select(UsageDaily))).scalars().all()
+            ledger_rows = len((await db.execute(select(UsageRecord))).all())
+            stored = await db.get(Child, child.id)
+        assert (daily.turns, daily.input_tokens, daily.output_tokens) == (3, 150, 30)
+        assert ledger_rows == 3
+        assert stored.tokens_today == 180
+
+    async def test_quota_resets_at_utc_midnight(self, session_factory, monkeypatch):
+        """Test that just past UTC midnight the quotas reset and the turn counts toward the same day as its usage."""
+        class JustPastMidnight(datetime):
+            @classmethod
+            def utcnow(cls):
+                return datetime(2024, 3, 10, 0, 0, 5)
+
+        monkeypatch.setattr(user_models, "datetime", JustPastMidnight)
+        monkeypatch.setattr(usage_service, "datetime", JustPastMidnight)
+        async with session_factory() as db:
+            child = await make_child(
+                db, daily_message_limit=5, messages_today=5, daily_token_limit=100, tokens_today=100,
+                last_message_date=date(2024, 3, 9),
+            )
+        assert child.can_send_message() and child.within_token_budget()
+        session = ChatSession(session_factory, child)
+        session.check_quota()
+        usage = StreamUsage(model="mock", input_tokens=30, output_tokens=10)
+        await session.save_turn("Hi", "Hello!", "mock", tokens_used=usage.tokens_used, usage=usage)
+
+        async with session_factory() as db:
+            stored = await db.get(Child, child.id)
+            [daily] = (await db.execute(select(UsageDaily))).scalars().all()
+        assert (stored.last_message_date, stored.messages_today, stored.tokens_today) == (date(2024, 3, 10), 1, 40)
+        assert daily.day == stored.last_message_date
+
+    async def test_session_token_budget(self, session_factory):
+        """Test that a session refuses turns once the child's token budget is used up."""
+        async with session_factory() as db:
+            child = await make_child(db, daily_token_limit=100)
+        session = ChatSession(session_factory, child)
+        session.check_quota()
+        await session.save_turn("Hi", "Hello!", "mock", tokens_used=120)
+
+        with pytest.raises(ChatSessionError) as refused:
+            session.check_quota()
+        assert (refused.value.status_code, refused.value.quota) == (429, "daily_tokens")
+
+
+@pytest.mark.asyncio
+async def test_http_chat_records_and_enforces_budget(client: AsyncClient, db_session: AsyncSession):
+    """Test that the chat endpoint records the turn's usage and refuses turns over budget."""
+    child = await make_child(db_session, daily_token_limit=1)
+
+    response = await client.post("/api/chat", json={"child_id": child.id, "message": "Why is the sky blue?"})
+    assert response.status_code == 200
+    [record] = (await db_session.execute(select(UsageRecord))).scalars().all()
+    assert record.child_id == child.id
+    assert record.message_id == response.json()["response"]["id"]
+    assert record.input_tokens > 0 and record.output_tokens > 0
+
+    response = await client.post("/api/chat", json={"child_id": child.id, "message": "And sunsets?"})
+    assert response.status_code == 429
+    assert "token budget" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_admin_usage_reports(client: AsyncClient, db_session: AsyncSession, monkeypatch):
+    """Test that the admin reports group the aggregates and estimate their cost."""
+    monkeypatch.setattr(settings, "AI_TOKEN_PRICES", {"gpt-4o": [2.0, 10.0, 1.0]})
+    child = await make_child(db_session)
+    admin = User(email="admin@test.com", role=UserRole.ADMIN)
+    db_session.add(admin)
+    await db_session.flush()
+    await record_usage(db_session, [
+        usage_entry(child.parent_id, child.id, 1, 2, "gpt-4o", 1_000_000, 100_000),
+        usage_entry(child.parent_id, child.id, 1, 4, "gpt-4o", 1_000_000, 100_000, cached_tokens=1_000_000),
+        usage_entry(child.parent_id, child.id, 1, 6, "mock", 10, 5),
+    ])
+    await db_session.commit()
+
+    response = await client.get("/api/admin/usage", params={"admin_id": admin.id, "group_by": "model"})
+    assert response.status_code == 200
+    by_model = {row["key"]: row for row in response.json()}
+    assert by_model["gpt-4o"]["turns"] == 2
+    assert by_model["gpt-4o"]["estimated_cost_usd"] == 2.0 + 1.0 + 2 * 1.0
+    assert by_model["mock"]["estimated_cost_usd"] is None
+
+    response = await client.get("/api/admin/usage", params={"admin_id": admin.id, "group_by": "tier"})
+    assert [(row["key"], row["turns"]) for row in response.json()] == [("basic", 3)]
+
+    response = await client.get(f"/api/admin/usage/parents/{child.parent_id}", params={"admin_id": admin.id})
+    assert response.status_code == 200
+    assert [row["input_tokens"] for row in response.json()["by_day"]] == [2_000_010]
+
+    response = await client.get("/api/admin/usage", params={"admin_id": child.parent_id})
+    assert response.status_code == 403
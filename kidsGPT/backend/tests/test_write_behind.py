@@ -0,0 +1,177 @@
+"""
+Tests for write-behind chat persistence and the hi/lo id allocator.
+"""
+
+import asyncio
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from app.models import Child, Conversation, Message, MessageRole
+from app.services import write_behind
+from app.services.chat_session import ChatSession
+from app.services.write_behind import IdAllocator, PendingTurn, WriteBehindQueue, replay_dead_letters
+from tests.conftest import make_child
+
+
+@pytest.fixture
+async def writer(session_factory, monkeypatch):
+    """A running write-behind queue, installed as the process-wide one."""
+    queue = WriteBehindQueue(session_factory, max_delay_ms=20)
+    queue.start()
+    monkeypatch.setattr(write_behind, "_writer", queue)
+    yield queue
+    await queue.close()
+
+
+@pytest.mark.asyncio
+class TestIdAllocator:
+    """Tests for hi/lo id reservation."""
+
+    async def test_blocks_never_overlap(self, session_factory):
+        """Test that two allocators sharing the table hand out disjoint ids."""
+        first = IdAllocator(session_factory, block_size=3)
+        second = IdAllocator(session_factory, block_size=3)
+        ids = []
+        for _ in range(4):
+            ids += await first.allocate(2)
+            ids += await second.allocate(2)
+        assert len(set(ids)) == len(ids) == 16
+
+    async def test_starts_above_existing_rows(self, session_factory):
+        """Test that reserved ids start above ids already written without the allocator."""
+        async with session_factory() as db:
+            child = await make_child(db)
+        async with session_factory() as db:
+            conversation = Conversation(child_id=child.id)
+            db.add(conversation)
+            await db.flush()
+            db.add(Message(id=41, conversation_id=conversation.id, role=MessageRole.CHILD, content="Hi"))
+            await db.commit()
+        assert min(await IdAllocator(session_factory).allocate(5)) == 42
+
+
+@pytest.mark.asyncio
+class TestWriteBehind:
+    """Tests for queued, batched turn writes."""
+
+    async def test_turns_are_batched(self, session_factory, writer: WriteBehindQueue):
+        """Test that concurrent turns are written in fewer commits, with the ids handed out up front."""
+        async with session_factory() as db:
+            child = await make_child(db)
+        sessions = [ChatSession(session_factory, child) for _ in range(10)]
+        results = await asyncio.gather(*(
+            session.save_turn(f"Question {i}", f"Answer {i}", "mock") for i, session in enumerate(sessions)
+        ))
+        await writer.flush()
+
+        async with session_factory() as db:
+            stored = dict((await db.execute(select(Message.id, Message.content))).all())
+            counts = (await db.execute(select(Conversation.message_count))).scalars().all()
+            saved_child = await db.get(Child, child.id)
+        for i, result in enumerate(results):
+            assert stored[result.message_id] == f"Question {i}"
+            assert stored[result.response_id] == f"Answer {i}"
+        assert counts == [2] * 10
+        assert saved_child.messages_today == 10
+        assert saved_child.last_message_date == date.today()
+        assert writer.turns_written == 10
+        assert writer.batches < 10
+
+    async def test_close_flushes_everything(self, session_factory):
+        """Test that closing the queue (shutdown) writes every queued turn first."""
+        async with session_factory() as db:
+            child = await make_child(db)
+        queue = WriteBehindQueue(session_factory, max_delay_ms=1000)
+        queue.start()
+        session = ChatSession(session_factory, child)
+        with pytest.MonkeyPatch.context() as patch:
+            patch.setattr(write_behind, "_writer", queue)
+            for i in range(5):
+                await session.save_turn(f"Question {i}", f"Answer {i}", "mock")
+        await queue.close()
+
+        async with session_factory() as db:
+            assert await db.scalar(select(func.count(Message.id))) == 10
+        with pytest.raises(RuntimeError):
+            await queue.submit(None)
+
+    async def test_failed_batches_are_retried(self, session_factory, writer: WriteBehindQueue, monkeypatch):
+        """Test that a batch failing a few times in a row is retried until written, not dropped."""
+        monkeypatch.setattr(write_behind, "WRITE_RETRY_BASE_DELAY", 0.01)
+        async with session_factory() as db:
+            child = await make_child(db)
+        write_batch = writer.write_batch
+        failures = []
+
+        async def flaky(batch):
+            if len(failures) < 5:
+                failures.append(batch)
+                raise OperationalError("INSERT", {}, Exception("database is locked"))
+            await write_batch(batch)
+
+        monkeypatch.setattr(writer, "write_batch", flaky)
+        await ChatSession(session_factory, child).save_turn("Hi", "Hello!", "mock")
+        await writer.flush()
+
+        async with session_factory() as db:
+            assert await db.scalar(select(func.count(Message.id))) == 2
+        assert (writer.turns_written, writer.turns_dead_lettered, writer.turns_dropped) == (1, 0, 0)
+
+    async def test_unwritable_turns_are_replayed(self, session_factory, tmp_path, monkeypatch):
+        """Test that turns still failing at shutdown go to the dead-letter file and replay from it."""
+        async with session_factory() as db:
+            child = await make_child(db)
+        dead_letter = tmp_path / "dead_letter.jsonl"
+        queue = WriteBehindQueue(session_factory, max_delay_ms=20, dead_letter_path=str(dead_letter))
+
+        async def down(batch):
+            raise OperationalError("INSERT", {}, Exception("unable to open database file"))
+
+        monkeypatch.setattr(queue, "write_batch", down)
+        queue.start()
+        session = ChatSession(session_factory, child)
+        with pytest.MonkeyPatch.context() as patch:
+            patch.setattr(write_behind, "_writer", queue)
+            results = [await session.save_turn(f"Question {i}", f"Answer {i}", "mock") for i in range(3)]
+        await queue.close()
+        assert (queue.turns_written, queue.turns_dead_lettered, queue.turns_dropped) == (0, 3, 0)
+
+        assert await replay_dead_letters(session_factory, str(dead_letter)) == {"written": 3, "failed": 0}
+        async with session_factory() as db:
+            stored = dict((await db.execute(select(Message.id, Message.content))).all())
+            saved_child = await db.get(Child, child.id)
+        assert [stored[result.response_id] for result in results] == ["Answer 0", "Answer 1", "Answer 2"]
+        assert saved_child.messages_today == 3
+        assert not dead_letter.exists()
+
+    async def test_constraint_failure_dead_letters_only_failing_turns(self, session_factory, tmp_path):
+        """Test that a turn rejected by a constraint is dead-lettered alone, and the rest of its batch written."""
+        async with session_factory() as db:
+            child = await make_child(db)
+        async with session_factory() as db:
+            conversation = Conversation(child_id=child.id)
+            db.add(conversation)
+            await db.commit()
+
+        def turn(first_id: int) -> PendingTurn:
+            common = {"conversation_id": conversation.id, "is_flagged": False, "flag_reason": None,
+                      "created_at": datetime.utcnow(), "ai_model": None, "tokens_used": None, "finish_reason": None}
+            return PendingTurn(conversation_id=conversation.id, child_id=child.id, rows=[
+                {**common, "id": first_id, "role": MessageRole.CHILD, "content": f"Question {first_id}"},
+                {**common, "id": first_id + 1, "role": MessageRole.ASSISTANT, "content": f"Answer {first_id}"},
+            ])
+
+        dead_letter = tmp_path / "dead_letter.jsonl"
+        queue = WriteBehindQueue(session_factory, max_delay_ms=200, dead_letter_path=str(dead_letter))
+        queue.start()
+        for first_id in (1, 3, 5, 1):  # The last turn reuses the first one's ids
+            await queue.submit(turn(first_id))
+        await queue.close()
+
+        assert (queue.turns_written, queue.turns_dead_lettered, queue.turns_dropped) == (3, 1, 0)
+        async with session_factory() as db:
+            assert await db.scalar(select(func.count(Message.id))) == 6
+        assert len(dead_letter.read_bytes().splitlines()) == 1